@@ -1,14 +1,14 @@
-import requests
 import json
 import pprint
 import datetime
 import logging
 import pytz
+from vz_client import VZClient
 
 #######################################################################################################
 # Format URLs
-VZ_GET_URL = "http://vz.wiuhelmtell.ch/middleware.php/data/{}.json?from={}"
-VZ_POST_URL = "http://vz.wiuhelmtell.ch/middleware.php/data/{}.json?operation=add&value={}"
+VZ_BASE_URL = "http://vz.wiuhelmtell.ch/middleware.php"
+VZ = VZClient(VZ_BASE_URL)
 ########################################################################################################
 
 #r_n = Rückspeisung Netz
@@ -50,16 +50,10 @@ UUID = {
 ###########################################################################################################
 
 def get_vals(uuid, duration="-0min"):
-    req = requests.get(VZ_GET_URL.format(uuid, duration))
-    #return(json.loads(req.content))
-    return req.json()
+    return VZ.get_vals(uuid, duration)
 
 def write_vals(uuid, val):
-    poststring = VZ_POST_URL.format(uuid, val)
-    logging.info("Poststring {}".format(poststring))
-    postreq = requests.post(poststring)
-    logging.info("Ok? {}".format(postreq.ok))
- 
+    VZ.write_vals(uuid, val)
     
 def main():
     logging.info("********************************")
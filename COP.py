@@ -1,14 +1,8 @@
-import requests
 import json
 import pprint
 import datetime
 import logging
-
-#######################################################################################################
-# Format URLs
-VZ_GET_URL = "http://192.168.178.49/middleware.php/data/{}.json?from={}"
-VZ_POST_URL = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
-########################################################################################################
+from vz_client import get_vals, write_vals
 
 #######################################################################################################
 # Configuration
@@ -20,17 +14,6 @@ UUID = {
 
 ###########################################################################################################
 
-def get_vals(uuid, duration="-5min"):
-    req = requests.get(VZ_GET_URL.format(uuid, duration))
-    #return(json.loads(req.content))
-    return req.json()
-
-def write_vals(uuid, val):
-    poststring = VZ_POST_URL.format(uuid, val)
-    logging.info("Poststring {}".format(poststring))
-    postreq = requests.post(poststring)
-    logging.info("Ok? {}".format(postreq.ok))
-    
 def main():
     logging.info("********************************")
     logging.info("COP")
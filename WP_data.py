@@ -1,20 +1,18 @@
-import requests
 import json
 import pprint
 import datetime
 import logging
+import os
 import pytz
 from pymodbus.client.sync import ModbusTcpClient
+import vz_client
+from modbus_map import ISG, ModbusIOError
+from modbus_poller import read
+from vz_deadband import Deadband, Rule
 #from pymodbus.constants import Endian
 #from pymodbus.payload import BinaryPayloadDecoder
 #from pymodbus.payload import BinaryPayloadBuilder
 
-#######################################################################################################
-# Format URLs
-VZ_GET_URL = "http://192.168.178.49/middleware.php/data/{}.json?from={}"
-VZ_POST_URL = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
-########################################################################################################
-
 #######################################################################################################
 # Configuration
 UUID = {
@@ -39,77 +37,72 @@ UUID = {
     "T_Quelle": "10e15100-0a4d-11f0-8d05-11e6497c1357",
 }
 
-REGISTER = {
-    "Aussentemp" : 506,
-    "T_VL_HK1_ist" : 507, 
-    "T_VL_HK1_soll" : 509, 
-    "T_VL_HK2_ist": 510, 
-    "T_VL_HK2_soll" : 511,
-    "T_VL_WP_ist": 542,
-    "T_RL_WP_ist" : 541,
-    "Volumenstrom" : 520,
-    "T_WW_ist": 521,
-    "T_WW_soll": 522,
-    "Betriebsart": 1500,
-    "Heissgastemp": 543,
-    "Niederdruck": 544,
-    "Hochdruck": 546,
-    "T_Quelle": 541
+# Gelesene Register (Adresse, Typ, Skalierung und Ziel-UUID in modbus_map.ISG)
+INPUTS = ["Aussentemp", "T_VL_HK1_ist", "T_VL_HK1_soll", "T_VL_HK2_ist", "T_VL_HK2_soll",
+          "Volumenstrom", "T_WW_ist", "T_WW_soll", "T_RL_WP_ist", "T_VL_WP_ist",
+          "Heissgastemp", "Niederdruck", "Hochdruck", "T_Quelle"]
+
+# Report-by-Exception: gesendet wird nur bei Änderung über das Totband oder nach
+# spätestens Rule.heartbeat s (Default 15 min); Default für Temperaturen 0.15 K
+DEADBAND = {
+    "Betriebszustand": Rule(abs=0.0),
+    "Error": Rule(abs=0.0),
+    "T_SOLL_BWW": Rule(abs=0.0),
+    "T_SOLL_HK1": Rule(abs=0.0),
+    "T_SOLL_HK2": Rule(abs=0.0),
+    "Volumenstrom": Rule(abs=0.02),
+    "P_WP_Therm": Rule(abs=20.0, rel=0.02),
+    "P_WP_Therm_WW": Rule(abs=20.0, rel=0.02),
+    "P_WP_Therm_RW": Rule(abs=20.0, rel=0.02),
+    "p_ND": Rule(abs=0.05),
+    "p_HD": Rule(abs=0.05),
 }
 
-IP_ISG = "192.168.178.36"
+IP_ISG = os.environ.get("ISG_HOST", "192.168.178.36")
+PORT_ISG = int(os.environ.get("ISG_PORT", "502"))
 
-CLIENT = ModbusTcpClient(IP_ISG)
-CLIENT.connect()
+# Verbindung erst beim ersten direkten Zugriff (Schreiben oder kein Modbus-Poller)
+CLIENT = ModbusTcpClient(IP_ISG, port=PORT_ISG)
 Error = 0
+DB = Deadband({UUID[k]: r for k, r in DEADBAND.items()}, default=Rule(abs=0.15))
 ############################################################################################################
 
 def get_vals(uuid, duration="-0min"):
-    req = requests.get(VZ_GET_URL.format(uuid, duration))
-    return req.json()
+    return vz_client.get_vals(uuid, duration)
 
 
 def write_vals(uuid, val):
-    poststring = VZ_POST_URL.format(uuid, val)
-    print("POST:", poststring)
-    try:
-        postreq = requests.post(poststring, timeout=10)
-        print("Status:", postreq.status_code)
-        print("OK?:", postreq.ok)
-        print("Antworttext:", postreq.text[:500])  # erste 500 Zeichen
-    except Exception as e:
-        print("Exception beim POST:", e)
-
-
-#def write_vals(uuid, val):
-#    poststring = VZ_POST_URL.format(uuid, val)
-#    #logging.info("Poststring {}".format(poststring))
-#    postreq = requests.post(poststring)
-#    #logging.info("Ok? {}".format(postreq.ok))
-
-#Vorlage read input registers
-raw_value = CLIENT.read_input_registers(REGISTER["Aussentemp"], count=1, unit=1).getRegister(0)
-signed_value = raw_value if raw_value < 32768 else raw_value - 65536
-T_outdoor = signed_value / 10
+    # Nur bei Änderung (vz_deadband); gesendet wird im Hintergrund (vz_queue)
+    if DB.put(uuid, val):
+        print("QUEUE:", uuid, val)
+
+# Vom Modbus-Poller, sonst alle Input-Register in zwei Blockzugriffen (Plan aus modbus_map.ISG)
+try:
+    REGS = read(CLIENT, ISG, INPUTS)
+except ModbusIOError as e:
+    # Kein Traceback; Messung steht in vz_metrics (modbus_request_*)
+    logging.error("ISG nicht erreichbar: %s", e)
+    raise SystemExit(1)
+T_outdoor = REGS["Aussentemp"]
 
 #if T_outdoor > 100:
 #    T_outdoor = get_vals(UUID["Aussentemp"], duration="-5min")["data"]["average"]
 #    Error = 1
 #else:
 #T_outdoor = T_outdoor
-T_vl_wp_ist = (CLIENT.read_input_registers(REGISTER["T_VL_WP_ist"], count=1, unit=1).getRegister(0))/10
-T_rl_wp_ist = (CLIENT.read_input_registers(REGISTER["T_RL_WP_ist"], count=1, unit=1).getRegister(0))/10
-T_vl_hk1_ist = (CLIENT.read_input_registers(REGISTER["T_VL_HK1_ist"], count=1, unit=1).getRegister(0))/10
-T_vl_hk1_soll = (CLIENT.read_input_registers(REGISTER["T_VL_HK1_soll"], count=1, unit=1).getRegister(0))/10
-T_vl_hk2_ist = (CLIENT.read_input_registers(REGISTER["T_VL_HK2_ist"], count=1, unit=1).getRegister(0))/10
-T_vl_hk2_soll = (CLIENT.read_input_registers(REGISTER["T_VL_HK2_soll"], count=1, unit=1).getRegister(0))/10
-T_ww_ist = (CLIENT.read_input_registers(REGISTER["T_WW_ist"], count=1, unit=1).getRegister(0))/10
-T_ww_soll = (CLIENT.read_input_registers(REGISTER["T_WW_soll"], count=1, unit=1).getRegister(0))/10
-Volumenstrom = (CLIENT.read_input_registers(REGISTER["Volumenstrom"], count=1, unit=1).getRegister(0))/100000*60
-T_heissgas = (CLIENT.read_input_registers(REGISTER["Heissgastemp"], count=1, unit=1).getRegister(0))/10
-p_nd = (CLIENT.read_input_registers(REGISTER["Niederdruck"], count=1, unit=1).getRegister(0))/100
-p_hd = (CLIENT.read_input_registers(REGISTER["Hochdruck"], count=1, unit=1).getRegister(0))/100
-t_quelle = (CLIENT.read_input_registers(REGISTER["T_Quelle"], count=1, unit=1).getRegister(0))/10
+T_vl_wp_ist = REGS["T_VL_WP_ist"]
+T_rl_wp_ist = REGS["T_RL_WP_ist"]
+T_vl_hk1_ist = REGS["T_VL_HK1_ist"]
+T_vl_hk1_soll = REGS["T_VL_HK1_soll"]
+T_vl_hk2_ist = REGS["T_VL_HK2_ist"]
+T_vl_hk2_soll = REGS["T_VL_HK2_soll"]
+T_ww_ist = REGS["T_WW_ist"]
+T_ww_soll = REGS["T_WW_soll"]
+Volumenstrom = REGS["Volumenstrom"]
+T_heissgas = REGS["Heissgastemp"]
+p_nd = REGS["Niederdruck"]
+p_hd = REGS["Hochdruck"]
+t_quelle = REGS["T_Quelle"]
 P_WP_therm = Volumenstrom * 1.16 * (T_vl_wp_ist - T_rl_wp_ist) * 1000
 
 
@@ -136,7 +129,11 @@ print(f"Quellentemp = {t_quelle}")
 #print("Aussentemperatur= " + value_2)
 
 #Auslesen Betriebszustand aus ISG und Schreiben auf vz
-betriebszustand = CLIENT.read_holding_registers(1500, count=1, unit= 1).getRegister(0)
+try:
+    betriebszustand = read(CLIENT, ISG, ["Betriebsart"])["Betriebsart"]
+except ModbusIOError as e:
+    logging.error("ISG nicht erreichbar: %s", e)
+    raise SystemExit(1)
 
 if betriebszustand == 1:
     print("Betriebszustand:", "Bereitschaftsbetrieb")
@@ -150,22 +147,11 @@ elif betriebszustand == 5:
     print("Betriebszustand:", "Warmwasserbetrieb")    
     
 write_vals(UUID["Betriebszustand"], betriebszustand)
-write_vals(UUID["Aussentemp"], T_outdoor)
-write_vals(UUID["VL_WP"], T_vl_wp_ist)
-write_vals(UUID["RL_WP"], T_rl_wp_ist)
-write_vals(UUID["Volumenstrom"], Volumenstrom)
-write_vals(UUID["BWW_unten"], T_ww_ist)
-write_vals(UUID["T_ist_Heizgruppe"], T_vl_hk2_ist)
-write_vals(UUID["Puffer_oben"], T_vl_hk1_ist)
-write_vals(UUID["T_SOLL_BWW"], T_ww_soll)
-write_vals(UUID["T_SOLL_HK2"], T_vl_hk2_soll)
-write_vals(UUID["T_SOLL_HK1"], T_vl_hk1_soll)
+# Messwerte 1:1 auf die Ziel-UUID aus der Registerkarte
+for name in INPUTS:
+    write_vals(ISG.reg(name).uuid, REGS[name])
 write_vals(UUID["P_WP_Therm"], P_WP_therm)
 write_vals(UUID["Error"], Error)
-write_vals(UUID["T_Heissgas"], T_heissgas)
-write_vals(UUID["p_ND"], p_nd)
-write_vals(UUID["p_HD"], p_hd)
-write_vals(UUID["T_Quelle"], t_quelle)
 
 if betriebszustand == 5:
     write_vals(UUID["P_WP_Therm_WW"], P_WP_therm)
@@ -1,16 +1,17 @@
 import smtplib 
 from email.message import EmailMessage
 import ssl
-import requests
 import json
 import pprint
 import datetime
 import logging
 #import pytz
+from vz_client import VZClient
 
 #######################################################################################################
 # Format URLs
-VZ_GET_URL = "http://vz.wiuhelmtell.ch/middleware.php/data/{}.json?from={}"
+VZ_BASE_URL = "http://vz.wiuhelmtell.ch/middleware.php"
+VZ = VZClient(VZ_BASE_URL)
 
 #######################################################################################################
 # UUID's
@@ -24,8 +25,7 @@ UUID = {
 #######################################################################################################
 
 def get_vals(uuid, duration="-0sec"):
-    req = requests.get(VZ_GET_URL.format(uuid, duration))
-    return req.json()
+    return VZ.get_vals(uuid, duration)
 
 WP_check = get_vals(UUID["T_Puffer"])["data"]["average"]
 PV_check = get_vals(UUID["PV_Prod"])["data"]["average"]
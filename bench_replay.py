@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Replay-Benchmark: einen aufgezeichneten Tag gegen lokale Ersatzdienste abspielen.
+
+Aufnahme (im Haus, mit Zugriff auf Middleware, Geräte und SRF-API):
+  python3 bench_replay.py record --out day.sqlite --hours 24 --interval 60
+  - Modbus: die von den Skripten gelesenen Registerblöcke von ISG, KEBA und
+    SEL alle --interval s für --hours h (--hours 0: ein Snapshot)
+  - Volkszähler: Rohdaten aller UUIDs aus den Skripten im Fenster
+    [Ende - LOOKBACK_DAYS, Ende + AHEAD_DAYS] (Rückblicke und Forecasts)
+  - SRF Meteo: geolocationNames und forecastpoint (für weather_forecast)
+
+Abspielen (überall):
+  python3 bench_replay.py run --db day.sqlite --repeat 5 [--at 12:00] [--json out.json]
+                              [--baseline base.json --max-regress 0.2]
+  - Volkszähler: vz_fake_middleware mit einer Kopie der Aufnahme, Zeitstempel
+    so verschoben, dass "jetzt" dem Aufnahmezeitpunkt --at entspricht
+  - Modbus: MBAP-Server pro Gerät mit den Registern des Snapshots zu --at
+  - SRF: Token- und Forecast-Endpunkte aus der Aufnahme
+  - Jedes Skript läuft als eigener Prozess mit eigenem HOME/Spool/Cache;
+    gemessen werden Laufzeit (Median), VZ-Requests, Bytes und Fehler
+    (vz_metrics) sowie Peak-RSS
+  - Mit --baseline: Exit-Code 1, wenn Laufzeit, Requests oder Bytes eines
+    Skripts um mehr als --max-regress über der Basis liegen
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import socketserver
+import sqlite3
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from modbus_map import ISG, KEBA, SEL, plan
+from vz_fake_middleware import FakeMiddleware, Store
+
+# ============================== CONFIG ========================================
+REPO = os.path.dirname(os.path.abspath(__file__))
+LOOKBACK_DAYS = 4   # opt_emob: 72h Rückblick auf Cable_State
+AHEAD_DAYS = 3      # Forecast-Reihen reichen bis zu 48h in die Zukunft
+RUN_TIMEOUT = 300.0  # s pro Skriptlauf
+
+# Skript → Argumente; alle laufen mit Umgebung auf die Ersatzdienste
+SCRIPTS: Dict[str, List[str]] = {
+    "regler_wp": [],
+    "keba_tcp": [],
+    "opt_emob": [],
+    "forecast_day": [],
+    "forecast_night": [],
+    "weather_forecast": [],
+    "solar_forecast": [],
+}
+
+# Gerät → (Host, Port, Unit, Umgebungsvariablen-Präfix der Skripte)
+DEVICES: Dict[str, Tuple[str, int, int, str]] = {
+    "isg": ("192.168.178.36", 502, ISG.unit, "ISG"),
+    "keba": ("192.168.178.61", 502, KEBA.unit, "KEBA"),
+    "sel": ("192.168.178.40", 1502, SEL.unit, "SEL"),
+}
+
+# Von den Skripten gelesene Registerblöcke: (Gerät, input/holding, Adresse, Anzahl)
+MODBUS_BLOCKS: List[Tuple[str, str, int, int]] = [
+    (dev.name, b.kind, b.start, b.count) for dev in (ISG, KEBA, SEL) for b in plan(dev)
+]
+
+_UUID = re.compile(r'"([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})"')
+
+Regs = Dict[Tuple[str, int], int]  # (input/holding, Adresse) → Wert
+
+
+class Result(NamedTuple):
+    script: str
+    rc: int
+    wall_s: float
+    max_rss_kb: int
+    requests: int
+    errors: int
+    bytes_out: int
+    bytes_in: int
+
+
+def script_uuids() -> List[str]:
+    """Alle in den Benchmark-Skripten vorkommenden Kanal-UUIDs."""
+    found = set()
+    for name in SCRIPTS:
+        with open(os.path.join(REPO, f"{name}.py"), "r", encoding="utf-8") as f:
+            found.update(_UUID.findall(f.read()))
+    return sorted(found)
+
+
+def _open(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS modbus (ts INTEGER, device TEXT, kind TEXT, addr INTEGER, value INTEGER)")
+    conn.execute("CREATE TABLE IF NOT EXISTS http (path TEXT PRIMARY KEY, body TEXT)")
+    conn.commit()
+    return conn
+
+
+# ============================== AUFNAHME ======================================
+def record_modbus(conn: sqlite3.Connection, hours: float, interval: float) -> None:
+    from pymodbus.client.sync import ModbusTcpClient
+
+    clients = {d: ModbusTcpClient(host, port=port) for d, (host, port, _, _) in DEVICES.items()}
+    end = time.time() + hours * 3600
+    while True:
+        ts = int(time.time() * 1000)
+        rows = []
+        for dev, kind, addr, count in MODBUS_BLOCKS:
+            client, unit = clients[dev], DEVICES[dev][2]
+            read = client.read_input_registers if kind == "input" else client.read_holding_registers
+            try:
+                res = read(addr, count=count, unit=unit)
+            except Exception as e:
+                print(f"Modbus {dev} {kind} {addr}: {e}", file=sys.stderr)
+                continue
+            if res.isError():
+                print(f"Modbus {dev} {kind} {addr}: {res}", file=sys.stderr)
+                continue
+            rows += [(ts, dev, kind, addr + i, v) for i, v in enumerate(res.registers)]
+        with conn:
+            conn.executemany("INSERT INTO modbus VALUES (?, ?, ?, ?, ?)", rows)
+        print(f"{datetime.now():%H:%M:%S} Modbus-Snapshot: {len(rows)} Register")
+        if time.time() + interval > end:
+            break
+        time.sleep(interval)
+    for c in clients.values():
+        c.close()
+
+
+def record_vz(path: str, end_ms: int) -> None:
+    import vz_client
+
+    store = Store(path)
+    frm, to = end_ms - LOOKBACK_DAYS * 86_400_000, end_ms + AHEAD_DAYS * 86_400_000
+    for uuid in script_uuids():
+        try:
+            rows = [(ts, v) for ts, v, _ in vz_client.get_tuples(uuid, frm, to, timeout=60)]
+        except Exception as e:
+            print(f"VZ {uuid}: {e}", file=sys.stderr)
+            continue
+        if rows:
+            store.delete(uuid, frm, to)
+            store.add(uuid, rows)
+        print(f"VZ {uuid}: {len(rows)} Tupel")
+
+
+def record_srf(conn: sqlite3.Connection) -> None:
+    import weather_forecast as wf
+
+    try:
+        token = wf.get_token(*wf.get_credentials())
+        geo = wf.api_get("/geolocationNames", token, params={"zip": wf.ZIP, "limit": 20})
+        _lat, _lon, geo_id = wf.find_geolocation_by_zip_and_name(token, wf.ZIP, wf.PLACE_NAME)
+        fc = wf.api_get(f"/forecastpoint/{geo_id}", token)
+    except (Exception, SystemExit) as e:
+        print(f"SRF-Aufnahme übersprungen: {e}", file=sys.stderr)
+        return
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO http VALUES (?, ?)", ("/geolocationNames", json.dumps(geo)))
+        conn.execute("INSERT OR REPLACE INTO http VALUES (?, ?)", ("/forecastpoint", json.dumps(fc)))
+    print("SRF: geolocationNames und forecastpoint aufgezeichnet")
+
+
+def cmd_record(args: argparse.Namespace) -> int:
+    conn = _open(args.out)
+    start_ms = int(time.time() * 1000)
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('start_ms', ?)", (str(start_ms),))
+    if not args.no_modbus:
+        record_modbus(conn, args.hours, args.interval)
+    if not args.no_srf:
+        record_srf(conn)
+    end_ms = int(time.time() * 1000)
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('end_ms', ?)", (str(end_ms),))
+    conn.close()
+    record_vz(args.out, end_ms)
+    return 0
+
+
+# ============================== ERSATZ: MODBUS ================================
+class _MbapHandler(socketserver.BaseRequestHandler):
+    server: "RegisterServer"
+
+    def _recv(self, n: int) -> bytes:
+        buf = b""
+        while len(buf) < n:
+            chunk = self.request.recv(n - len(buf))
+            if not chunk:
+                return b""
+            buf += chunk
+        return buf
+
+    def handle(self) -> None:
+        while True:
+            hdr = self._recv(7)
+            if not hdr:
+                return
+            tid, _pid, length, unit = struct.unpack(">HHHB", hdr)
+            pdu = self._recv(length - 1)
+            if not pdu:
+                return
+            resp = self.server.handle_pdu(pdu)
+            self.request.sendall(struct.pack(">HHHB", tid, 0, len(resp) + 1, unit) + resp)
+
+
+class RegisterServer(socketserver.ThreadingTCPServer):
+    """Modbus-TCP-Ersatz mit fester Registertabelle (FC 3, 4, 6, 16)."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, regs: Regs, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), _MbapHandler)
+        self.regs = dict(regs)
+        self.lock = threading.Lock()
+
+    def handle_pdu(self, pdu: bytes) -> bytes:
+        fc = pdu[0]
+        with self.lock:
+            if fc in (3, 4) and len(pdu) >= 5:
+                addr, count = struct.unpack(">HH", pdu[1:5])
+                kind = "holding" if fc == 3 else "input"
+                vals = [self.regs.get((kind, addr + i), 0) & 0xFFFF for i in range(count)]
+                return struct.pack(f">BB{count}H", fc, 2 * count, *vals)
+            if fc == 6 and len(pdu) >= 5:
+                addr, val = struct.unpack(">HH", pdu[1:5])
+                self.regs[("holding", addr)] = val
+                return pdu[:5]
+            if fc == 16 and len(pdu) >= 6:
+                addr, count, _nbytes = struct.unpack(">HHB", pdu[1:6])
+                for i, v in enumerate(struct.unpack(f">{count}H", pdu[6:6 + 2 * count])):
+                    self.regs[("holding", addr + i)] = v
+                return struct.pack(">BHH", fc, addr, count)
+        return struct.pack(">BB", fc | 0x80, 1)  # Illegal Function
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, name="modbus-replay", daemon=True).start()
+
+
+def modbus_snapshot(conn: sqlite3.Connection, device: str, at_ms: int) -> Regs:
+    """Letzter aufgezeichneter Wert je Register bis at_ms (sonst der früheste)."""
+    rows = conn.execute("SELECT kind, addr, value FROM modbus WHERE device = ? AND ts <= ? ORDER BY ts",
+                        (device, at_ms)).fetchall()
+    if not rows:
+        rows = conn.execute("SELECT kind, addr, value FROM modbus WHERE device = ? ORDER BY ts DESC",
+                            (device,)).fetchall()[::-1]
+    return {(k, a): v for k, a, v in rows}
+
+
+# ============================== ERSATZ: SRF METEO =============================
+def _shift_iso(value: str, offset: timedelta) -> str:
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return (dt + offset).isoformat()
+
+
+def _shift_hours(body: Any, offset: timedelta) -> Any:
+    hours = body.get("hours") if isinstance(body, dict) else None
+    if hours is None and isinstance(body, dict):
+        hours = (body.get("data") or {}).get("hours")
+    for h in hours or []:
+        if isinstance(h, dict) and isinstance(h.get("date_time"), str):
+            h["date_time"] = _shift_iso(h["date_time"], offset)
+    return body
+
+
+class _SrfHandler(BaseHTTPRequestHandler):
+    server: "SrfServer"
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        pass
+
+    def _reply(self, status: int, body: Any) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        if self.path.startswith("/oauth/"):
+            self._reply(200, {"access_token": "replay", "expires_in": 3600})
+        else:
+            self._reply(404, {})
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/srf-meteo/v2/geolocationNames") and "/geolocationNames" in self.server.bodies:
+            self._reply(200, self.server.bodies["/geolocationNames"])
+        elif path.startswith("/srf-meteo/v2/forecastpoint/") and "/forecastpoint" in self.server.bodies:
+            self._reply(200, self.server.bodies["/forecastpoint"])
+        else:
+            self._reply(404, {})
+
+
+class SrfServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, bodies: Dict[str, Any]) -> None:
+        super().__init__(("127.0.0.1", 0), _SrfHandler)
+        self.bodies = bodies
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, name="srf-replay", daemon=True).start()
+
+
+# ============================== ABSPIELEN ======================================
+def _prepare_vz(src: str, dst: str, offset_ms: int) -> None:
+    shutil.copyfile(src, dst)
+    conn = sqlite3.connect(dst)
+    with conn:
+        conn.execute("UPDATE data SET ts = ts + ?", (offset_ms,))
+    conn.close()
+
+
+def _metrics(json_dir: str, script: str) -> Tuple[int, int, int, int]:
+    try:
+        with open(os.path.join(json_dir, f"vz_{script}.json"), "r", encoding="utf-8") as f:
+            series = json.load(f)["series"]
+    except (OSError, ValueError, KeyError):
+        return 0, 0, 0, 0
+    return (sum(s["count"] for s in series), sum(s["errors"] for s in series),
+            sum(s["bytes_out"] for s in series), sum(s["bytes_in"] for s in series))
+
+
+def run_script(script: str, env: Dict[str, str], log_path: str, timeout: float = RUN_TIMEOUT) -> Result:
+    with open(log_path, "ab") as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(REPO, f"{script}.py")] + SCRIPTS[script],
+                                cwd=REPO, env=env, stdout=log, stderr=subprocess.STDOUT)
+        timer = threading.Timer(timeout, proc.kill)
+        timer.start()
+        try:
+            _pid, status, usage = os.wait4(proc.pid, 0)
+        finally:
+            timer.cancel()
+        wall = time.perf_counter() - t0
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    requests, errors, bytes_out, bytes_in = _metrics(env["VZ_METRICS_JSON"], script)
+    return Result(script, proc.returncode, wall, usage.ru_maxrss, requests, errors, bytes_out, bytes_in)
+
+
+def replay_once(conn: sqlite3.Connection, db: str, at_ms: int, scripts: List[str], work: str) -> List[Result]:
+    offset_ms = int(time.time() * 1000) - at_ms
+    vz_db = os.path.join(work, "vz.sqlite")
+    _prepare_vz(db, vz_db, offset_ms)
+    vz = FakeMiddleware(port=0, db=vz_db)
+    vz.start()
+    modbus = {dev: RegisterServer(modbus_snapshot(conn, dev, at_ms)) for dev in DEVICES}
+    for srv in modbus.values():
+        srv.start()
+    bodies = {p: json.loads(b) for p, b in conn.execute("SELECT path, body FROM http")}
+    if "/forecastpoint" in bodies:
+        _shift_hours(bodies["/forecastpoint"], timedelta(milliseconds=offset_ms))
+    srf = SrfServer(bodies)
+    srf.start()
+
+    results = []
+    try:
+        for script in scripts:
+            home = tempfile.mkdtemp(prefix=f"{script}-", dir=work)
+            env = dict(os.environ, HOME=home, VZ_BASE_URL=vz.base_url,
+                       VZ_CACHE=os.path.join(work, "vz_cache.sqlite"),
+                       VZ_METRICS_DIR="", VZ_METRICS_JSON=os.path.join(home, "metrics"),
+                       MODBUS_POLLER_SOCK=os.path.join(work, "modbus_poller.sock"),
+                       SRF_API_BASE=f"{srf.base}/srf-meteo/v2",
+                       SRF_OAUTH_URL=f"{srf.base}/oauth/v1/accesstoken?grant_type=client_credentials",
+                       SRG_CLIENT_ID="replay", SRG_CLIENT_SECRET="replay")
+            for env_prefix, srv in ((DEVICES[d][3], s) for d, s in modbus.items()):
+                env[f"{env_prefix}_HOST"], env[f"{env_prefix}_PORT"] = "127.0.0.1", str(srv.server_address[1])
+            results.append(run_script(script, env, os.path.join(work, f"{script}.log")))
+    finally:
+        vz.shutdown()
+        vz.server_close()
+        srf.shutdown()
+        for srv in modbus.values():
+            srv.shutdown()
+            srv.server_close()
+    return results
+
+
+def summarize(runs: List[List[Result]]) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for script in [r.script for r in runs[0]]:
+        rs = [r for run in runs for r in run if r.script == script]
+        out[script] = {
+            "wall_s": statistics.median(r.wall_s for r in rs),
+            "requests": statistics.median(r.requests for r in rs),
+            "bytes": statistics.median(r.bytes_out + r.bytes_in for r in rs),
+            "errors": max(r.errors for r in rs),
+            "max_rss_kb": max(r.max_rss_kb for r in rs),
+            "failed_runs": sum(1 for r in rs if r.rc != 0),
+        }
+    return out
+
+
+def regressions(summary: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                max_regress: float) -> List[str]:
+    found = []
+    for script, cur in summary.items():
+        base = baseline.get(script)
+        if not base:
+            continue
+        for key in ("wall_s", "requests", "bytes"):
+            if base.get(key) and cur[key] > base[key] * (1.0 + max_regress):
+                found.append(f"{script}: {key} {cur[key]:.3f} > {base[key]:.3f} (+{max_regress:.0%})")
+    return found
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    conn = _open(args.db)
+    meta = dict(conn.execute("SELECT key, value FROM meta"))
+    end_ms = int(meta.get("end_ms") or time.time() * 1000)
+    at_ms = end_ms
+    if args.at:
+        hh, mm = (int(x) for x in args.at.split(":"))
+        end_local = datetime.fromtimestamp(end_ms / 1000).astimezone()
+        at_local = end_local.replace(hour=hh, minute=mm, second=0, microsecond=0)
+        if at_local > end_local:
+            at_local -= timedelta(days=1)
+        at_ms = int(at_local.timestamp() * 1000)
+    scripts = args.scripts or list(SCRIPTS)
+
+    work = tempfile.mkdtemp(prefix="bench_replay-")
+    runs = []
+    for i in range(args.repeat):
+        rep = os.path.join(work, f"run{i}")
+        os.makedirs(rep)
+        runs.append(replay_once(conn, args.db, at_ms, scripts, rep))
+        print(f"Lauf {i + 1}/{args.repeat} fertig")
+    summary = summarize(runs)
+
+    at_str = datetime.fromtimestamp(at_ms / 1000, tz=timezone.utc).astimezone().strftime("%Y-%m-%d %H:%M")
+    print(f"\nReplay {at_str}, {args.repeat} Läufe (Median), Logs: {work}")
+    print(f"{'Skript':<18} {'Zeit s':>8} {'Requests':>9} {'Bytes':>10} {'Fehler':>7} {'RSS MB':>7} {'rc!=0':>6}")
+    for script, s in summary.items():
+        print(f"{script:<18} {s['wall_s']:>8.3f} {s['requests']:>9.0f} {s['bytes']:>10.0f} "
+              f"{s['errors']:>7} {s['max_rss_kb'] / 1024:>7.1f} {s['failed_runs']:>6}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            found = regressions(summary, json.load(f), args.max_regress)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            return 1
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Aufgezeichneten Tag gegen lokale Ersatzdienste abspielen.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    rec = sub.add_parser("record", help="Tag aufzeichnen (Modbus, Volkszähler, SRF)")
+    rec.add_argument("--out", required=True, help="SQLite-Datei der Aufnahme")
+    rec.add_argument("--hours", type=float, default=24.0, help="Dauer der Modbus-Aufnahme [h]")
+    rec.add_argument("--interval", type=float, default=60.0, help="Abstand der Modbus-Snapshots [s]")
+    rec.add_argument("--no-modbus", action="store_true")
+    rec.add_argument("--no-srf", action="store_true")
+    rec.set_defaults(func=cmd_record)
+
+    run = sub.add_parser("run", help="Aufnahme abspielen und messen")
+    run.add_argument("--db", required=True, help="SQLite-Datei der Aufnahme")
+    run.add_argument("--at", default=None, help="Aufnahmezeitpunkt HH:MM (default: Ende der Aufnahme)")
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--scripts", nargs="*", choices=list(SCRIPTS), help="nur diese Skripte")
+    run.add_argument("--json", default=None, help="Zusammenfassung als JSON schreiben")
+    run.add_argument("--baseline", default=None, help="JSON eines früheren Laufs zum Vergleich")
+    run.add_argument("--max-regress", type=float, default=0.2, help="erlaubte Verschlechterung (Anteil)")
+    run.set_defaults(func=cmd_run)
+
+    args = ap.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
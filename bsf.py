@@ -4,11 +4,11 @@
 import requests 
 import json
 import logging
+from vz_client import write_vals
 
 #UUID_P = "ad5c809"
 UUID_P = "aaace450-80c5-11ef-a7f9-1b20677336e0"
 IP_VENTI = "192.168.178.37"
-URL_VZ = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
 
 Offset = -2.1
 
@@ -21,13 +21,11 @@ def main():
     print("Actual Power {}".format(decoded_data["power"]))
     print("Actual Temperature {}".format(decoded_data["temperature"]+ Offset))
     print("Posting to VZ")
-    poststring_p = URL_VZ.format(UUID_P, decoded_data["power"])
     #poststring_t = URL_VZ.format(UUID_T, decoded_data["temperature"]+ Offset)
-    postreq_p = requests.post(poststring_p)
+    ok_p = write_vals(UUID_P, decoded_data["power"])
     #postreq_t = requests.post(poststring_t)
-    print(poststring_p)
     #print(poststring_t)
-    print(postreq_p.ok)
+    print(ok_p)
     #print(postreq_t.ok)
 
 
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import requests
 import json
 import datetime
 import logging
@@ -9,12 +8,7 @@ import pytz
 import time
 import math
 from collections import defaultdict
-
-#######################################################################################################
-# Format URLs
-VZ_GET_URL = "http://192.168.178.49/middleware.php/data/{}.json?from={}"
-VZ_POST_URL = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
-#######################################################################################################
+import vz_client
 
 #######################################################################################################
 # Configuration
@@ -31,9 +25,7 @@ UUID = {
 
 def get_vals(uuid, duration="-0min"):
     """Daten von vz lesen (JSON)."""
-    req = requests.get(VZ_GET_URL.format(uuid, duration), timeout=10)
-    req.raise_for_status()
-    return req.json()
+    return vz_client.get_vals(uuid, duration)
 
 def write_vals(uuid, val, as_int=True, decimals=1):
     """
@@ -45,51 +37,27 @@ def write_vals(uuid, val, as_int=True, decimals=1):
         out_val = int(val)
     else:
         out_val = round(float(val), decimals)
+    return vz_client.write_vals(uuid, out_val)
 
-    url = VZ_POST_URL.format(uuid, out_val)
-    postreq = requests.post(url, timeout=10)
-    if not postreq.ok:
-        logging.error("POST failed (server time): %s %s", postreq.status_code, postreq.text)
-    else:
-        logging.debug("POST ok (server time): %s", postreq.text)
-    return postreq.ok
-
-def write_vals_at(uuid, val, ts_epoch_sec, as_int=True, decimals=1):
+def sync_hours(uuid, values_by_sec, from_epoch_sec, to_epoch_sec, as_int=True, decimals=1):
     """
-    Daten mit explizitem Zeitstempel auf vz schreiben.
-    WICHTIG: Volkszähler erwartet ts i.d.R. in MILLISEKUNDEN!
+    Gleicht {ts_sec: wert} im Bereich [from, to] (inklusive) mit dem Bestand ab:
+    nur geänderte Stunden werden gelöscht bzw. geschrieben.
+    Erwartet Sekunden, API benötigt Millisekunden.
     as_int=True  -> int schreiben (z.B. 0/1)
     as_int=False -> float schreiben (gerundet auf 'decimals')
+    Rückgabe: SyncResult oder None.
     """
-    ts_ms = int(ts_epoch_sec * 1000)  # Sekunden -> Millisekunden
-
     if as_int:
-        out_val = int(val)
+        points = [(int(ts * 1000), int(v)) for ts, v in sorted(values_by_sec.items())]
     else:
-        out_val = round(float(val), decimals)
-
-    url = VZ_POST_URL.format(uuid, out_val) + f"&ts={ts_ms}"
-    postreq = requests.post(url, timeout=10)
-    if not postreq.ok:
-        logging.error("POST failed: %s %s", postreq.status_code, postreq.text)
-    else:
-        logging.debug("POST ok: %s", postreq.text)
-    return postreq.ok
-
-def delete_range(uuid, from_epoch_sec, to_epoch_sec):
-    """
-    Löscht alle Werte im Bereich [from, to] (inklusive) beim gegebenen Kanal.
-    Erwartet Sekunden, API benötigt Millisekunden.
-    """
-    f_ms = int(from_epoch_sec * 1000)
-    t_ms = int(to_epoch_sec * 1000)
-    url = f"http://192.168.178.49/middleware.php/data/{uuid}.json?operation=delete&from={f_ms}&to={t_ms}"
-    r = requests.post(url, timeout=10)
-    if not r.ok:
-        logging.error("DELETE failed: %s %s", r.status_code, r.text)
-    else:
-        logging.debug("DELETE ok: %s %s", r.status_code, r.text)
-    return r.ok
+        points = [(int(ts * 1000), round(float(v), decimals)) for ts, v in sorted(values_by_sec.items())]
+    try:
+        return vz_client.sync_series(uuid, points, int(from_epoch_sec * 1000), int(to_epoch_sec * 1000),
+                                     tolerance=0.5 * 10 ** -decimals if not as_int else 1e-6)
+    except Exception as e:
+        logging.warning("Abgleich %s fehlgeschlagen: %s", uuid, e)
+        return None
 
 # ---------- Zeitstempel-Helper (robust gegen ms/sek) ----------
 
@@ -200,26 +168,20 @@ def main():
     next_hours    = [int((start_hour_dt + datetime.timedelta(hours=i)).timestamp()) for i in range(horizon_hours)]
     last_hour_end = int(end_hour_dt.timestamp())
 
-    # *** Wichtig: vor dem Schreiben alle zukünftigen Werte im Zielbereich löschen ***
-    logging.info("Lösche vorhandene zukünftige Werte [%s, %s] ...",
-                 start_hour_dt.isoformat(), end_hour_dt.isoformat())
-    delete_ok = delete_range(UUID["Freigabe_WP_Nacht"], start_hour_dt.timestamp(), end_hour_dt.timestamp())
-    if not delete_ok:
-        logging.warning("Löschen des Zielbereichs fehlgeschlagen – schreibe trotzdem weiter.")
-    delete_ok_ratio = delete_range(UUID["Tarif_COP_Stunde"], start_hour_dt.timestamp(), end_hour_dt.timestamp())
-    if not delete_ok_ratio:
-        logging.warning("Löschen des Zielbereichs für Tarif_COP_Stunde fehlgeschlagen – schreibe trotzdem weiter.")
+    # Zielbereich [start, end] wird am Ende mit dem Bestand abgeglichen (nur Änderungen)
+    win_from = start_hour_dt.timestamp()
+    win_to = end_hour_dt.timestamp()
 
     if not ratio_by_ts:
         logging.warning(f"Keine gültigen tarif/cop-Paare für die nächsten {horizon_hours}h gefunden. Schreibe 0 für alle Stunden.")
-        # 0 für die nächsten 24 Stunden schreiben (explizit int) – ts in ms
-        for h in next_hours:
-            ok = write_vals_at(UUID["Freigabe_WP_Nacht"], 0, h, as_int=True)
-            logging.info(f"Freigabe_WP_Nacht {_from_epoch_seconds(h, tz).isoformat()} -> 0 (ok={ok})")
+        # 0 für die nächsten 24 Stunden (explizit int) – ts in ms
+        res = sync_hours(UUID["Freigabe_WP_Nacht"], {h: 0 for h in next_hours}, win_from, win_to, as_int=True)
+        logging.info(f"Freigabe_WP_Nacht [{start_hour_dt.isoformat()}, {end_hour_dt.isoformat()}] -> 0 ({res})")
 
-            # Optional: auch Tarif_COP_Stunde auf 0.0 setzen (Float, 1 Dezimalstelle)
-            ok_ratio = write_vals_at(UUID["Tarif_COP_Stunde"], 0.0, h, as_int=False, decimals=1)
-            logging.info(f"Tarif_COP_Stunde {_from_epoch_seconds(h, tz).isoformat()} -> 0.0 (ok={ok_ratio})")
+        # Optional: auch Tarif_COP_Stunde auf 0.0 setzen (Float, 1 Dezimalstelle)
+        res_ratio = sync_hours(UUID["Tarif_COP_Stunde"], {h: 0.0 for h in next_hours}, win_from, win_to,
+                               as_int=False, decimals=1)
+        logging.info(f"Tarif_COP_Stunde [{start_hour_dt.isoformat()}, {end_hour_dt.isoformat()}] -> 0.0 ({res_ratio})")
 
         logging.info("********************************")
         return
@@ -242,8 +204,9 @@ def main():
         else:
             hourly_ratio[h] = float("inf")  # keine Daten in der Stunde -> extrem teuer
 
-    # Werte für die nächsten 24 Stunden in der Konsole ausgeben + schreiben
+    # Werte für die nächsten 24 Stunden in der Konsole ausgeben + abgleichen
     logging.info(f"Tarif/COP (stündlicher Mittelwert) für die nächsten {horizon_hours} Stunden:")
+    ratio_to_write = {}
     for h in next_hours:
         dt = _from_epoch_seconds(h, tz)
         val = hourly_ratio[h]
@@ -254,15 +217,10 @@ def main():
             logging.info(f"  {dt.isoformat()} -> {val:.1f}")
 
             # FIX: als Float schreiben, gerundet auf 1 Kommastelle, min bei 0.0
-            val_to_write = max(0.0, val)
-            ok_ratio = write_vals_at(
-                UUID["Tarif_COP_Stunde"],
-                val_to_write,
-                h,
-                as_int=False,
-                decimals=1
-            )
-            logging.info(f"Tarif_COP_Stunde {dt.isoformat()} -> {val_to_write:.1f} (ok={ok_ratio})")
+            ratio_to_write[h] = max(0.0, val)
+
+    res_ratio = sync_hours(UUID["Tarif_COP_Stunde"], ratio_to_write, win_from, win_to, as_int=False, decimals=1)
+    logging.info(f"Tarif_COP_Stunde abgeglichen: {res_ratio}")
 
     # hour_wp Stunden mit den niedrigsten Werten auswählen
     n_hours = max(0, int(round(hour_wp)))  # als Anzahl ganze Stunden
@@ -283,12 +241,15 @@ def main():
             if v <= cutoff_val:
                 selected_hours.add(h)
 
-    # Schreiben: ausgewählte Stunden -> 1, andere -> 0 (immer Integer) – ts in ms
+    # Abgleichen: ausgewählte Stunden -> 1, andere -> 0 (immer Integer) – ts in ms
+    freigabe = {}
     for h in next_hours:
         val = 1 if (h in selected_hours and not math.isinf(hourly_ratio[h])) else 0
-        ok = write_vals_at(UUID["Freigabe_WP_Nacht"], val, h, as_int=True)
+        freigabe[h] = val
         dt = _from_epoch_seconds(h, tz)
-        logging.info(f"Freigabe_WP_Nacht {dt.isoformat()} -> {int(val)} (ok={ok})")
+        logging.info(f"Freigabe_WP_Nacht {dt.isoformat()} -> {int(val)}")
+    res = sync_hours(UUID["Freigabe_WP_Nacht"], freigabe, win_from, win_to, as_int=True)
+    logging.info(f"Freigabe_WP_Nacht abgeglichen: {res}")
 
     logging.info("********************************")
 
@@ -1,20 +1,21 @@
-import requests
 import json
 import pprint
 import datetime
 import logging
+import os
 import pytz
 import time
-import struct
-from pymodbus.client.sync import ModbusTcpClient
-from pymodbus.constants import Endian
-from pymodbus.payload import BinaryPayloadDecoder
+import argparse
+import asyncio
+import aiohttp
 from gpiozero import Button
-
-#######################################################################################################
-# Format URLs
-VZ_GET_URL = "http://192.168.178.49/middleware.php/data/{}.json?from={}"
-VZ_POST_URL = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
+from vz_client import Channel
+from vz_async import AsyncVZClient
+from vz_queue import put_vals
+from modbus_async import AsyncModbus
+from modbus_map import KEBA, SEL, ModbusIOError
+from modbus_poller import acquire, skew
+import vz_metrics
 
 #######################################################################################################
 # Configuration
@@ -35,235 +36,282 @@ UUID = {
 }
 
 #Network KEBA
-server_ip_keba = "192.168.178.61"
-server_port_keba = 502
-unit_id_keba = 255
+server_ip_keba = os.environ.get("KEBA_HOST", "192.168.178.61")
+server_port_keba = int(os.environ.get("KEBA_PORT", "502"))
 
 #Network SEL
-server_ip_sel = "192.168.178.40"
-server_port_sel = 1502
-
-#Register KEBA
-charge_state = 1000
-cable_state = 1004
-error_code = 1006
-char_curr_1 = 1008
-active_p = 1020
-vol_ph = 1040
-switch = 1550
-power_f = 1046
-i_max = 1100
-char_curr_v = 1040
+server_ip_sel = os.environ.get("SEL_HOST", "192.168.178.40")
+server_port_sel = int(os.environ.get("SEL_PORT", "1502"))
+
+#Register KEBA (schreiben; Leseregister in modbus_map.KEBA)
 set_curr = 5004
-failsafe_curr = 1600
-failsafe_timeout = 1602
 keba_state = 5014
 set_fail_curr = 5016
 set_fail_time = 5018
 set_fail = 5020
 
-#Register SEL
-reg_bil = 10
-
 # Max / Min Values
 keba_max_i = 32
 keba_min_i = 10
 bil_offset = 0 
 
+# Dauerbetrieb (python3 keba_tcp.py --loop): PI-Regler auf den PV-Überschuss statt Cron-Lauf
+LOOP_INTERVAL = float(os.environ.get("KEBA_LOOP_INTERVAL", "2"))  # s, Regeltakt (1–5 s)
+LOOP_VZ_INTERVAL = 60.0   # s, VZ-Eingänge lesen und Telemetrie schreiben
+FAILSAFE_REFRESH = 60.0   # s, Failsafe-Register erneuern (Timeout KEBA: 300 s)
+# Regelstrecke: 1 A mehr Sollstrom ändert die Bilanz um KEBA_PHASES A (bezogen auf eine
+# Phasenspannung); das Fahrzeug folgt innerhalb eines Takts bis etwa 5 s (Zeitkonstante).
+# Die Regelabweichung wird deshalb durch die Phasenzahl geteilt: Kreisverstärkung = PI_KP,
+# bei schnell folgendem Fahrzeug stabil, solange 2 * PI_KP + PI_KI * LOOP_INTERVAL < 2.
+KEBA_PHASES = int(os.environ.get("KEBA_PHASES", "3"))  # vom Fahrzeug genutzte Phasen
+PI_KP = float(os.environ.get("KEBA_PI_KP", "0.4"))   # A Sollstrom pro A Überschuss je Phase
+PI_KI = float(os.environ.get("KEBA_PI_KI", "0.1"))  # A Sollstrom pro A Überschuss je Phase und s
+
 ###########################################################################################################
 
-def get_vals(uuid, duration="-0min"):
-    # Daten von vz lesen. 
-    req = requests.get(VZ_GET_URL.format(uuid, duration))
-    return req.json()
-
-def write_vals(uuid, val):
-    # Daten auf vz schreiben.
-    poststring = VZ_POST_URL.format(uuid, val)
-    #logging.info("Poststring {}".format(poststring))
-    postreq = requests.post(poststring)
-    #logging.info("Ok? {}".format(postreq.ok))
-   
-def main():  
-    # Create a Modbus TCP client
-    client_keba = ModbusTcpClient(server_ip_keba, port=server_port_keba)
-    client_sel = ModbusTcpClient(server_ip_sel, port=server_port_sel)
-
-    # Connect to the Modbus device
-    client_keba.connect()
-    client_sel.connect()
-   
-    # Read Charge State
-    char_state_unpars = client_keba.read_holding_registers(charge_state, 2, unit=1)
-    char_state_pars = BinaryPayloadDecoder.fromRegisters(char_state_unpars.registers, byteorder=Endian.Big, wordorder=Endian.Big)
-    char_state_val = char_state_pars.decode_32bit_uint()
-
-    # Read Cable State
-    cable_state_unpars = client_keba.read_holding_registers(cable_state, 2, unit=1)
-    cable_state_pars = BinaryPayloadDecoder.fromRegisters(cable_state_unpars.registers, byteorder=Endian.Big, wordorder=Endian.Big)
-    cable_state_val = cable_state_pars.decode_32bit_uint()
-
-    # Read current phase 1
-    curr_i_unpars = client_keba.read_holding_registers(char_curr_1, 2, unit=1)
-    curr_i_pars = BinaryPayloadDecoder.fromRegisters(curr_i_unpars.registers, byteorder=Endian.Big, wordorder=Endian.Big)
-    curr_i_val = curr_i_pars.decode_32bit_uint()/1000
-
-    # Read active power
-    act_p_unpars = client_keba.read_holding_registers(active_p, 2, unit=1)
-    act_p_pars = BinaryPayloadDecoder.fromRegisters(act_p_unpars.registers, byteorder=Endian.Big, wordorder=Endian.Big)
-    act_p_val = act_p_pars.decode_32bit_uint()/1000
-
-    # Read active power factor
-    power_f_unpars = client_keba.read_holding_registers(power_f, 2, unit=1)
-    power_f_pars = BinaryPayloadDecoder.fromRegisters(power_f_unpars.registers, byteorder=Endian.Big, wordorder=Endian.Big)
-    power_f_val = power_f_pars.decode_32bit_uint()/1000
-
-    # Read active current max
-    curr_i_max_unpars = client_keba.read_holding_registers(i_max, 2, unit=1)
-    curr_i_max_pars = BinaryPayloadDecoder.fromRegisters(curr_i_max_unpars.registers, byteorder=Endian.Big, wordorder=Endian.Big)
-    curr_i_max_val = curr_i_max_pars.decode_32bit_uint()/1000
-
-    # Read active voltage phase 1
-    curr_v_unpars = client_keba.read_holding_registers(char_curr_v, 2, unit=1)
-    curr_v_pars = BinaryPayloadDecoder.fromRegisters(curr_v_unpars.registers, byteorder=Endian.Big, wordorder=Endian.Big)
-    curr_v_val = curr_v_pars.decode_32bit_uint()
-
-    if curr_v_val == 0:
-        curr_v_val = 230
-    else:
-        curr_v_val = curr_v_val
-    
-    # Read error Code
-    error_unpars = client_keba.read_holding_registers(error_code, 2, unit=1)
-    error_pars = BinaryPayloadDecoder.fromRegisters(error_unpars.registers, byteorder=Endian.Big, wordorder=Endian.Big)
-    error_val = error_pars.decode_32bit_uint()
-
-    # Read Failsafe Current
-    fail_c_unpars = client_keba.read_holding_registers(failsafe_curr, 2, unit=1)
-    fail_c_pars = BinaryPayloadDecoder.fromRegisters(fail_c_unpars.registers, byteorder=Endian.Big, wordorder=Endian.Big)
-    fail_c_val = fail_c_pars.decode_32bit_uint()
-
-    # Read Failsafe Timeout
-    fail_t_unpars = client_keba.read_holding_registers(failsafe_timeout, 2, unit=1)
-    fail_t_pars = BinaryPayloadDecoder.fromRegisters(fail_t_unpars.registers, byteorder=Endian.Big, wordorder=Endian.Big)
-    fail_t_val = fail_t_pars.decode_32bit_uint()
-    
-    # Read Wagenrain SEL Bilanz
-    #try:
-    #    res_bil = client_sel.read_input_registers(reg_bil, count=2, unit=1)
-    #    if res_bil.isError():
-    #        raise Exception("Modbus error response")
-    #    val_bil = res_bil.registers
-    #    byte_string_bil = struct.pack('>HH', val_bil[0], val_bil[1])     
-    #    parsed_val_bil = int((struct.unpack('>i', byte_string_bil)[0])/100) - 500
-    #except Exception as e:
-    #    print(f"Fehler beim Lesen von SEL Modbus: {e}")
-    #    parsed_val_bil = 0  # Fallback-Wert bei Fehler
-    
-    res_bil = client_sel.read_input_registers(reg_bil, count=2, unit=1)
-    val_bil = res_bil.registers
-    byte_string_bil = struct.pack('>HH', val_bil[0], val_bil[1])     
-    parsed_val_bil = int((struct.unpack('>i', byte_string_bil)[0])/100)-500
-
-    # Berechne Bilanz Wagenrain in A
-    val_bil_i = ((parsed_val_bil-bil_offset) / (curr_v_val))*-1
-    
-    # Berechne optimaler Ladestrom
-    i_balance = get_vals(UUID["I_opt"], duration="-0min")["data"]["average"]
-    print(f"Old I opt: {i_balance}")
-    print(f"actual bilance: {val_bil_i}")
-
-    if val_bil_i > 0:  # Bezug von Netz
-        i_balance_new = i_balance + val_bil_i/3
-    else: # Überschuss ins Netz
-        i_balance_new = i_balance + val_bil_i/5
-    print(f"New I opt: {i_balance_new}")
-
-    if i_balance_new < keba_min_i:
-        i_opt = keba_min_i 
-    elif i_balance_new > keba_max_i:
-        i_opt = keba_max_i
-    else:
-        i_opt = int(i_balance_new)
+# Eingänge aus dem Volkszähler (ein Snapshot pro Lauf)
+INPUTS = [
+    Channel("I_opt", UUID["I_opt"], "-0min"),
+    Channel("PV_Prod", UUID["PV_Prod"], "-30min", "now"),
+    Channel("Freigabe_EMob", UUID["Freigabe_EMob"], "0min"),
+]
 
-    # Prüfe Position Wahlschalter Schnellladung / Optimierung
-    switch = Button(2)
-    switch_state = 0
+# KEBA-Register (je 32 Bit, Skalierung in modbus_map.KEBA); KEBA beantwortet nur einen
+# Request gleichzeitig, deshalb werden sie nacheinander gelesen – parallel zu SEL und VZ.
+KEBA_READS = ["char_state", "cable_state", "curr_i", "act_p", "power_f",
+              "curr_i_max", "curr_v", "error", "fail_c", "fail_t"]
 
-    if switch.is_pressed:
-        switch_state = 1
-    else:
-        switch_state = 0
 
-    # Prüfe ob Anlage in Betrieb 
-    if char_state_val < 3:
-        i_opt = 10
+# Pro Regeltakt gelesen; der Rest nur für die Telemetrie
+LOOP_READS = ["char_state", "curr_v"]
 
-    #Prüfen PV-Ertrag & Freitage Stromtarif
-    freigabe_pv = get_vals(UUID["PV_Prod"], duration="-30min&to=now")["data"]["average"]
-    freigabe_emob = get_vals(UUID["Freigabe_EMob"], duration="0min")["data"]["average"]
-    
-    # Schreibe auf KEBA
-    if switch_state == 0 and freigabe_pv < 2000 and freigabe_emob == 0:
-        client_keba.write_register(keba_state, 0, unit=1)
-        client_keba.write_register(set_curr, 0, unit=1)
-        write_vals(UUID["I_opt"], 0)
-        print(f"Actual Set Ampere: {0}")
 
+class PI:
+    """PI-Regler mit Anti-Windup: der Integrator hält an, solange der Ausgang in der Begrenzung liegt."""
+
+    def __init__(self, kp, ki, lo, hi, start):
+        self.kp, self.ki, self.lo, self.hi = kp, ki, lo, hi
+        self.integral = min(max(start, lo), hi)
+
+    def reset(self, value):
+        self.integral = min(max(value, self.lo), self.hi)
+
+    def update(self, error, dt):
+        integral = self.integral + self.ki * error * dt
+        out = self.kp * error + integral
+        if out > self.hi and error > 0:  # nur so weit integrieren, bis der Ausgang die Grenze erreicht
+            integral = max(self.integral, self.hi - self.kp * error)
+        elif out < self.lo and error < 0:
+            integral = min(self.integral, self.lo - self.kp * error)
+        self.integral = min(max(integral, self.lo), self.hi)
+        return min(max(self.kp * error + self.integral, self.lo), self.hi)
+
+
+def bilanz(sel, curr_v_val):
+    """SEL-Netzbilanz [W] (mit Reserve) und Überschuss in A (positiv = Einspeisung)."""
+    parsed_val_bil = int(sel["P_Bilanz"])-500
+    val_bil_i = ((parsed_val_bil-bil_offset) / (curr_v_val))*-1
+    return parsed_val_bil, val_bil_i
+
+
+def sollwert(switch_state, freigabe_pv, freigabe_emob, i_opt):
+    """(Ladefreigabe, Strom in A) aus Wahlschalter, PV-Ertrag und Tariffreigabe."""
+    if switch_state == 0 and freigabe_pv < 2000 and freigabe_emob == 0:
+        return 0, 0
     elif switch_state == 0 and freigabe_pv > 2000:
-        client_keba.write_register(keba_state, 1, unit=1)
-        client_keba.write_register(set_curr, i_opt*1000, unit=1)
-        write_vals(UUID["I_opt"], i_opt)
-        print(f"Actual Set Ampere: {i_opt}")
-
-    elif switch_state == 0 and freigabe_pv < 2000 and freigabe_emob == 1:
-        client_keba.write_register(keba_state, 1, unit=1)
-        client_keba.write_register(set_curr, 32000, unit=1)
-        write_vals(UUID["I_opt"], 32)
-        print(f"Actual Set Ampere: {32}")
-        
-    else:
-        client_keba.write_register(keba_state, 1, unit=1)
-        client_keba.write_register(set_curr, 32000, unit=1)
-        write_vals(UUID["I_opt"], 32)
-        print(f"Actual Set Ampere: 32 ")
-
-    # Schreibe Failsafe Register KEBA
-    client_keba.write_register(set_fail_curr, 10000, unit=1)
-    client_keba.write_register(set_fail_time, 300, unit=1)
-    client_keba.write_register(set_fail, 1, unit=1)
-
-    # Schreibe UUID's vz
-    write_vals(UUID["Charge_State"], char_state_val)
-    write_vals(UUID["I_Lade"], curr_i_val)
-    write_vals(UUID["P_Aktiv"], act_p_val)
-    write_vals(UUID["Power_F"], power_f_val)
-    write_vals(UUID["I_Lade_max"], curr_i_max_val)
-    write_vals(UUID["V_act"], curr_v_val)
-    write_vals(UUID["I_bil"], val_bil_i)
-    write_vals(UUID["Error"], error_val)
-    write_vals(UUID["Switch"], switch_state)
-    write_vals(UUID["Cable_State"], cable_state_val)
-
-    
-    # Schreibe Rückmeldung Terminal
-    print(f"Charge State: {char_state_val}")
-    print(f"Cable State: {cable_state_val}")
-    print(f"Switch State: {switch_state}")
-    print(f"Actual Charging Current 1: {curr_i_val}")
-    print(f"Actual max. Charging Current: {curr_i_max_val}")
-    print(f"Actual Charging Power: {act_p_val}")
-    print(f"Actual Power Factor: {power_f_val}")
-    print(f"Actual Voltage: {curr_v_val}")
-    print(f"Actual Bilance Watt: {parsed_val_bil}")
-    print(f"Actual Bilance Ampere: {val_bil_i}")
-    print(f"Actual Error Code: {error_val}")
-    print(f"Failsafe Current: {fail_c_val}")
-    print(f"Failsafe timeout: {fail_t_val}")
-       
-    client_keba.close()
-    client_sel.close()
+        return 1, i_opt
+    else:  # Freigabe Stromtarif oder Schnellladung
+        return 1, 32
+
+
+async def write_failsafe(client_keba):
+    await client_keba.write_register(set_fail_curr, 10000)
+    await client_keba.write_register(set_fail_time, 300)
+    await client_keba.write_register(set_fail, 1)
+
+
+def publish(keba_s, sel_s, i_set, val_bil_i, switch_state):
+    """VZ-Telemetrie; Messwerte mit dem Zeitpunkt ihrer Erfassung, Sollwerte mit jetzt."""
+    keba = keba_s.values
+    for key, val, ts_ms in (("I_opt", i_set, None),
+                            ("Charge_State", keba["char_state"], keba_s.ts_ms),
+                            ("I_Lade", keba["curr_i"], keba_s.ts_ms),
+                            ("P_Aktiv", keba["act_p"], keba_s.ts_ms),
+                            ("Power_F", keba["power_f"], keba_s.ts_ms),
+                            ("I_Lade_max", keba["curr_i_max"], keba_s.ts_ms),
+                            ("V_act", keba["curr_v"] or 230, keba_s.ts_ms),
+                            ("I_bil", val_bil_i, sel_s.ts_ms),
+                            ("Error", keba["error"], keba_s.ts_ms),
+                            ("Switch", switch_state, None),
+                            ("Cable_State", keba["cable_state"], keba_s.ts_ms)):
+        put_vals(UUID[key], val, ts_ms)
+
+
+async def main():
+    async with AsyncVZClient() as vz, \
+            AsyncModbus(server_ip_keba, port=server_port_keba, unit=KEBA.unit) as client_keba, \
+            AsyncModbus(server_ip_sel, port=server_port_sel, unit=SEL.unit) as client_sel:
+
+        # Messwerte parallel lesen: KEBA, SEL Bilanz (vom Modbus-Poller, sonst direkt) und Volkszähler
+        (keba_s, sel_s), snap = await asyncio.gather(
+            acquire((client_keba, KEBA, KEBA_READS), (client_sel, SEL, ["P_Bilanz"]), max_age=5),
+            vz.read_snapshot(INPUTS),
+        )
+        keba, sel = keba_s.values, sel_s.values
+        print(f"Zeitversatz KEBA/SEL: {skew((keba_s, sel_s))*1000:.0f} ms ({keba_s.source}/{sel_s.source})")
+
+        char_state_val = keba["char_state"]
+        cable_state_val = keba["cable_state"]
+        curr_i_val = keba["curr_i"]
+        act_p_val = keba["act_p"]
+        power_f_val = keba["power_f"]
+        curr_i_max_val = keba["curr_i_max"]
+        curr_v_val = keba["curr_v"]
+        error_val = keba["error"]
+        fail_c_val = keba["fail_c"]
+        fail_t_val = keba["fail_t"]
+
+        if curr_v_val == 0:
+            curr_v_val = 230
+
+        # Wagenrain SEL Bilanz und Bilanz in A
+        parsed_val_bil, val_bil_i = bilanz(sel, curr_v_val)
+
+        # Berechne optimaler Ladestrom
+        i_balance = snap.average("I_opt")
+        print(f"Old I opt: {i_balance}")
+        print(f"actual bilance: {val_bil_i}")
+
+        if val_bil_i > 0:  # Bezug von Netz
+            i_balance_new = i_balance + val_bil_i/3
+        else: # Überschuss ins Netz
+            i_balance_new = i_balance + val_bil_i/5
+        print(f"New I opt: {i_balance_new}")
+
+        if i_balance_new < keba_min_i:
+            i_opt = keba_min_i
+        elif i_balance_new > keba_max_i:
+            i_opt = keba_max_i
+        else:
+            i_opt = int(i_balance_new)
+
+        # Prüfe Position Wahlschalter Schnellladung / Optimierung
+        switch = Button(2)
+        switch_state = 0
+
+        if switch.is_pressed:
+            switch_state = 1
+        else:
+            switch_state = 0
+
+        # Prüfe ob Anlage in Betrieb
+        if char_state_val < 3:
+            i_opt = 10
+
+        #Prüfen PV-Ertrag & Freitage Stromtarif
+        freigabe_pv = snap.average("PV_Prod")
+        freigabe_emob = snap.average("Freigabe_EMob")
+
+        # Sollwert bestimmen
+        state_set, i_set = sollwert(switch_state, freigabe_pv, freigabe_emob, i_opt)
+
+        # Schreibe auf KEBA (Aktor zuerst, Telemetrie danach über die Queue)
+        await client_keba.write_register(keba_state, state_set)
+        await client_keba.write_register(set_curr, i_set*1000)
+        print(f"Actual Set Ampere: {i_set}")
+
+        # Schreibe Failsafe Register KEBA
+        await write_failsafe(client_keba)
+
+        # Schreibe UUID's vz (Write-behind-Queue, Versand im Hintergrund)
+        publish(keba_s, sel_s, i_set, val_bil_i, switch_state)
+
+        # Schreibe Rückmeldung Terminal
+        print(f"Charge State: {char_state_val}")
+        print(f"Cable State: {cable_state_val}")
+        print(f"Switch State: {switch_state}")
+        print(f"Actual Charging Current 1: {curr_i_val}")
+        print(f"Actual max. Charging Current: {curr_i_max_val}")
+        print(f"Actual Charging Power: {act_p_val}")
+        print(f"Actual Power Factor: {power_f_val}")
+        print(f"Actual Voltage: {curr_v_val}")
+        print(f"Actual Bilance Watt: {parsed_val_bil}")
+        print(f"Actual Bilance Ampere: {val_bil_i}")
+        print(f"Actual Error Code: {error_val}")
+        print(f"Failsafe Current: {fail_c_val}")
+        print(f"Failsafe timeout: {fail_t_val}")
+
+async def loop(interval=LOOP_INTERVAL):
+    """Dauerbetrieb: Überschussregelung im Takt interval, VZ nur alle LOOP_VZ_INTERVAL s."""
+    switch = Button(2)
+    pi, snap, last_set = None, None, None
+    t_inputs = t_vz = t_failsafe = float("-inf")
+    async with AsyncVZClient() as vz, \
+            AsyncModbus(server_ip_keba, port=server_port_keba, unit=KEBA.unit) as client_keba, \
+            AsyncModbus(server_ip_sel, port=server_port_sel, unit=SEL.unit) as client_sel:
+        t_prev = time.monotonic()
+        while True:
+            t0 = time.monotonic()
+            try:
+                if t0 - t_inputs >= LOOP_VZ_INTERVAL:
+                    try:
+                        snap, t_inputs = await vz.read_snapshot(INPUTS), t0
+                    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+                        # Freigaben ändern sich selten: mit dem letzten Snapshot weiterregeln
+                        logging.warning("VZ-Eingänge nicht lesbar: %s", e)
+                        if snap is None:
+                            raise
+                telemetry = t0 - t_vz >= LOOP_VZ_INTERVAL
+                keba_s, sel_s = await acquire((client_keba, KEBA, KEBA_READS if telemetry else LOOP_READS),
+                                              (client_sel, SEL, ["P_Bilanz"]), max_age=interval)
+                keba = keba_s.values
+                _, val_bil_i = bilanz(sel_s.values, keba["curr_v"] or 230)
+
+                if pi is None:  # Start beim zuletzt geschriebenen Sollstrom
+                    pi = PI(PI_KP, PI_KI, keba_min_i, keba_max_i, snap.average("I_opt") or keba_min_i)
+                if keba["char_state"] < 3:  # nicht in Betrieb: Integrator auf Minimum
+                    pi.reset(keba_min_i)
+                    i_opt = keba_min_i
+                else:
+                    i_opt = int(pi.update(val_bil_i / KEBA_PHASES, t0 - t_prev))
+
+                switch_state = 1 if switch.is_pressed else 0
+                state_set, i_set = sollwert(switch_state, snap.average("PV_Prod"),
+                                            snap.average("Freigabe_EMob"), i_opt)
+                if (state_set, i_set) != last_set:
+                    await client_keba.write_register(keba_state, state_set)
+                    await client_keba.write_register(set_curr, i_set*1000)
+                    logging.info("KEBA: Freigabe %s, %s A (Überschuss %.1f A)", state_set, i_set, val_bil_i)
+                    last_set = (state_set, i_set)
+                if t0 - t_failsafe >= FAILSAFE_REFRESH:
+                    await write_failsafe(client_keba)
+                    t_failsafe = t0
+                if telemetry:
+                    publish(keba_s, sel_s, i_set, val_bil_i, switch_state)
+                    vz_metrics.flush()  # Dauerbetrieb: Metriken nicht erst beim Beenden
+                    t_vz = t0
+            except (ModbusIOError, aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError, KeyError) as e:
+                # Neu verbinden im nächsten Takt; bei längerem Ausfall greift der Failsafe der KEBA
+                logging.warning("KEBA-Regelung: %s", e)
+                client_keba.close()
+                client_sel.close()
+                last_set, t_failsafe = None, float("-inf")
+            t_prev = t0
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - t0)))
+
 
 if __name__ == "__main__":
-    main()
-    
+    parser = argparse.ArgumentParser(description="KEBA Ladestrom nach PV-Überschuss")
+    parser.add_argument("--loop", action="store_true",
+                        help="Dauerbetrieb mit PI-Regler statt einem Lauf (Cron-Eintrag dann entfernen)")
+    parser.add_argument("--interval", type=float, default=LOOP_INTERVAL, help="Regeltakt [s]")
+    args = parser.parse_args()
+    if args.loop:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+        asyncio.run(loop(args.interval))
+    else:
+        try:
+            asyncio.run(main())
+        except (ModbusIOError, asyncio.TimeoutError) as e:
+            logging.error("KEBA/SEL nicht erreichbar: %s", e)
+            raise SystemExit(1)
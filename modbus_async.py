@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Asynchroner Modbus-TCP-Zugriff (pymodbus 2.x, asyncio) für die Regler.
+
+Dünner Wrapper um den Sync-Client von pymodbus mit den Zugriffen, die die
+Skripte brauchen, plus Decoder für die 32-Bit-Werte (Big-Endian, High-Word
+zuerst).
+
+- Jeder Request läuft per asyncio.to_thread in einem Worker-Thread; das
+  asyncio-Modul von pymodbus 2.5 (AsyncioModbusTcpClient) lässt sich ab
+  Python 3.11 nicht mehr importieren (@asyncio.coroutine)
+- Requests einer Verbindung laufen nacheinander (der Sync-Client ist nicht
+  threadsicher); mehrere Geräte werden parallel abgefragt
+- Fehler: ModbusIOError bei Exception-Antwort, ModbusNoResponse bei Timeout
+  oder Verbindungsfehler (danach wird beim nächsten Request neu verbunden)
+
+Verwendung:
+  async with AsyncModbus(server_ip_keba, server_port_keba) as keba:
+      regs = await keba.read_holding(1000, 2)
+      await keba.write_register(5004, 16000)
+"""
+
+import asyncio
+import struct
+import threading
+from typing import Any, List, Optional
+
+from pymodbus.client.sync import ModbusTcpClient
+
+from modbus_map import ModbusIOError, ModbusNoResponse
+
+
+def u32(regs: List[int]) -> int:
+    """Zwei Register → 32-Bit unsigned (Big-Endian, Big-Word)."""
+    return (regs[0] << 16) | regs[1]
+
+
+def s32(regs: List[int]) -> int:
+    """Zwei Register → 32-Bit signed (Big-Endian, Big-Word)."""
+    return struct.unpack(">i", struct.pack(">HH", regs[0], regs[1]))[0]
+
+
+class AsyncModbus:
+    """Eine Modbus-TCP-Verbindung; Requests laufen im Worker-Thread, awaitbar aus der asyncio-Loop."""
+
+    def __init__(self, host: str, port: int = 502, unit: int = 1, timeout: float = 3.0) -> None:
+        self.host = host
+        self.port = port
+        self.unit = unit
+        self.timeout = timeout
+        self.client: Any = None
+        self._lock = threading.Lock()  # ein Request gleichzeitig pro Verbindung
+
+    async def __aenter__(self) -> "AsyncModbus":
+        # Verbunden wird erst beim ersten Request (entfällt, wenn der Modbus-Poller antwortet)
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _connect(self) -> Any:
+        if self.client is None:
+            client = ModbusTcpClient(self.host, port=self.port, timeout=self.timeout)
+            if not client.connect():
+                raise ModbusNoResponse(f"Keine Verbindung zu {self.host}:{self.port}")
+            self.client = client
+        return self.client
+
+    async def connect(self) -> None:
+        def run() -> None:
+            with self._lock:
+                self._connect()
+        await asyncio.to_thread(run)
+
+    def close(self) -> None:
+        client, self.client = self.client, None
+        if client is not None:
+            client.close()
+
+    def _request(self, method: str, address: int, arg: int, unit: Optional[int], what: str) -> Any:
+        with self._lock:
+            try:
+                rr = getattr(self._connect(), method)(address, arg, unit=self.unit if unit is None else unit)
+            except ModbusIOError:
+                raise
+            except Exception as e:  # ConnectionException u.a.
+                self.close()
+                raise ModbusNoResponse(f"{self.host}:{self.port} {what}: {e}") from e
+            if rr.isError():
+                if not hasattr(rr, "exception_code"):  # ModbusIOException: keine Antwort
+                    self.close()
+                    raise ModbusNoResponse(f"{self.host}:{self.port} {what}: {rr}")
+                raise ModbusIOError(f"{self.host}:{self.port} {what}: {rr}")
+            return rr
+
+    async def _call(self, method: str, address: int, arg: int, unit: Optional[int], what: str) -> Any:
+        return await asyncio.to_thread(self._request, method, address, arg, unit, what)
+
+    async def read_holding(self, address: int, count: int = 1, unit: Optional[int] = None) -> List[int]:
+        rr = await self._call("read_holding_registers", address, count, unit, f"read_holding {address}")
+        return rr.registers
+
+    async def read_input(self, address: int, count: int = 1, unit: Optional[int] = None) -> List[int]:
+        rr = await self._call("read_input_registers", address, count, unit, f"read_input {address}")
+        return rr.registers
+
+    async def write_register(self, address: int, value: int, unit: Optional[int] = None) -> None:
+        await self._call("write_register", address, value, unit, f"write_register {address}")
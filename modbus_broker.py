@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Modbus-TCP-Broker für die ISG: lokale Clients (regler_wp, WP_data,
+modbus_poller) verbinden sich mit dem Broker statt mit der ISG, der Broker
+hält genau eine Verbindung zur ISG.
+
+- Alle Requests gehen nacheinander über die eine Upstream-Verbindung; die ISG
+  sieht nie mehr als einen offenen Request
+- Lesezugriffe (FC 1–4) werden CACHE_TTL s lang aus dem Cache beantwortet;
+  wartet ein Client auf denselben Request, den ein anderer gerade stellt,
+  bekommt er danach dessen Antwort (kein zweiter Zugriff auf die ISG)
+- Schreibzugriffe gehen immer durch und leeren den Cache der Unit, damit ein
+  anschließendes Rücklesen (modbus_shadow.confirm) den neuen Stand sieht
+- Antwortet die ISG nicht, wird einmal neu verbunden; danach erhält der Client
+  die Gateway-Exception 0x0B statt eines Verbindungsabbruchs
+- Transaktions-IDs der Clients bleiben erhalten; Unit und PDU gehen unverändert
+  durch
+
+Start (z.B. als systemd-Dienst):
+  python3 modbus_broker.py [--listen 127.0.0.1:5502] [--upstream 192.168.178.36:502] [--verbose]
+
+Skripte auf den Broker zeigen lassen (Crontab / Dienst):
+  ISG_HOST=127.0.0.1 ISG_PORT=5502 python3 regler_wp.py
+
+Umgebungsvariablen (optional):
+  MODBUS_BROKER_LISTEN    (default: 127.0.0.1:5502)
+  MODBUS_BROKER_UPSTREAM  (default: 192.168.178.36:502)
+  MODBUS_BROKER_TTL       (default: 2 s)
+"""
+
+import argparse
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# ============================== CONFIG ========================================
+LISTEN = os.environ.get("MODBUS_BROKER_LISTEN", "127.0.0.1:5502")
+UPSTREAM = os.environ.get("MODBUS_BROKER_UPSTREAM", "192.168.178.36:502")
+CACHE_TTL = float(os.environ.get("MODBUS_BROKER_TTL", "2"))  # s
+UPSTREAM_TIMEOUT = 3.0  # s pro Request
+STATS_EVERY = 600.0     # s zwischen zwei Statistik-Zeilen im Log
+
+READ_FC = (1, 2, 3, 4)
+GATEWAY_NO_RESPONSE = 0x0B  # Modbus-Exception "Gateway Target Device Failed to Respond"
+
+
+def _addr(value: str) -> Tuple[str, int]:
+    host, _, port = value.rpartition(":")
+    return host, int(port)
+
+
+def _recv(sock: socket.socket, n: int) -> bytes:
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return b""
+        buf += chunk
+    return buf
+
+
+# ============================== UPSTREAM ======================================
+class Upstream:
+    """Eine Verbindung zur ISG; request() ist threadsicher und serialisiert."""
+
+    def __init__(self, addr: Tuple[str, int], timeout: float = UPSTREAM_TIMEOUT, ttl: float = CACHE_TTL) -> None:
+        self.addr = addr
+        self.timeout = timeout
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.sock: Optional[socket.socket] = None
+        self.tid = 0
+        self.cache: Dict[Tuple[int, bytes], Tuple[float, bytes]] = {}
+        self.stats = {"requests": 0, "cache": 0, "upstream": 0, "errors": 0, "reconnects": 0}
+
+    def _cached(self, key: Tuple[int, bytes]) -> Optional[bytes]:
+        hit = self.cache.get(key)
+        if hit is not None and time.monotonic() - hit[0] < self.ttl:
+            return hit[1]
+        return None
+
+    def _connect(self) -> socket.socket:
+        if self.sock is None:
+            self.sock = socket.create_connection(self.addr, timeout=self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            logging.info("Verbunden mit %s:%s", *self.addr)
+        return self.sock
+
+    def close(self) -> None:
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _exchange(self, unit: int, pdu: bytes) -> bytes:
+        sock = self._connect()
+        self.tid = (self.tid + 1) & 0xFFFF
+        sock.sendall(struct.pack(">HHHB", self.tid, 0, len(pdu) + 1, unit) + pdu)
+        while True:
+            hdr = _recv(sock, 7)
+            if not hdr:
+                raise ConnectionError("Verbindung von der ISG geschlossen")
+            tid, _pid, length, _unit = struct.unpack(">HHHB", hdr)
+            body = _recv(sock, length - 1)
+            if not body:
+                raise ConnectionError("Verbindung von der ISG geschlossen")
+            if tid == self.tid:
+                return body
+            logging.debug("Verspätete Antwort tid %s verworfen", tid)  # nach Timeout eines früheren Requests
+
+    def request(self, unit: int, pdu: bytes) -> bytes:
+        """Antwort-PDU für pdu an unit: aus dem Cache oder über die ISG."""
+        self.stats["requests"] += 1
+        read = pdu[0] in READ_FC
+        key = (unit, pdu)
+        if read:
+            hit = self._cached(key)
+            if hit is not None:
+                self.stats["cache"] += 1
+                return hit
+        with self.lock:
+            if read:
+                # derselbe Request kann gerade von einem anderen Client beantwortet worden sein
+                hit = self._cached(key)
+                if hit is not None:
+                    self.stats["cache"] += 1
+                    return hit
+            else:
+                for k in [k for k in self.cache if k[0] == unit]:
+                    del self.cache[k]
+            for attempt in (1, 2):
+                try:
+                    self.stats["upstream"] += 1
+                    resp = self._exchange(unit, pdu)
+                    break
+                except OSError as e:
+                    self.close()
+                    if attempt == 2:
+                        self.stats["errors"] += 1
+                        logging.warning("ISG %s:%s: %s", self.addr[0], self.addr[1], e)
+                        return struct.pack(">BB", pdu[0] | 0x80, GATEWAY_NO_RESPONSE)
+                    self.stats["reconnects"] += 1
+            if read and not resp[0] & 0x80:
+                self.cache[key] = (time.monotonic(), resp)
+            return resp
+
+
+# ============================== SERVER ========================================
+class _BrokerHandler(socketserver.BaseRequestHandler):
+    server: "BrokerServer"
+
+    def handle(self) -> None:
+        while True:
+            try:
+                hdr = _recv(self.request, 7)
+                if not hdr:
+                    return
+                tid, pid, length, unit = struct.unpack(">HHHB", hdr)
+                pdu = _recv(self.request, length - 1)
+                if not pdu:
+                    return
+                resp = self.server.upstream.request(unit, pdu)
+                self.request.sendall(struct.pack(">HHHB", tid, pid, len(resp) + 1, unit) + resp)
+            except OSError:
+                return
+
+
+class BrokerServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, listen: Tuple[str, int], upstream: Upstream) -> None:
+        super().__init__(listen, _BrokerHandler)
+        self.upstream = upstream
+
+
+def _log_stats(upstream: Upstream, stop: threading.Event) -> None:
+    while not stop.wait(STATS_EVERY):
+        logging.info("Broker: %s", ", ".join(f"{k} {v}" for k, v in upstream.stats.items()))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Modbus-TCP-Broker für die ISG")
+    ap.add_argument("--listen", default=LISTEN, help="HOST:PORT für lokale Clients")
+    ap.add_argument("--upstream", default=UPSTREAM, help="HOST:PORT der ISG")
+    ap.add_argument("--ttl", type=float, default=CACHE_TTL, help="Cache-Dauer für Lesezugriffe [s]")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+
+    upstream = Upstream(_addr(args.upstream), ttl=args.ttl)
+    server = BrokerServer(_addr(args.listen), upstream)
+    stop = threading.Event()
+    threading.Thread(target=_log_stats, args=(upstream, stop), daemon=True).start()
+    logging.info("Modbus-Broker bereit: %s → %s", args.listen, args.upstream)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        upstream.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Deklarative Modbus-Registerkarte für ISG, KEBA und SEL und gemeinsamer Lesepfad.
+
+- Reg: Name, Adresse, Registerart (input/holding), Typ (u16/s16/u32/s32),
+  Wortreihenfolge der 32-Bit-Werte, Skalierung (Rohwert / scale + offset)
+  und optional die Ziel-UUID im Volkszähler
+- plan() fasst die gewünschten Register eines Geräts zu möglichst wenigen
+  Blockzugriffen zusammen (max. Register pro Request und max. mitgelesene
+  Lücke je Gerät)
+- Pro Block wird einmal ein struct-Format vorbereitet; decode() zerlegt eine
+  Antwort mit einem einzigen unpack in alle Werte des Blocks
+- read() (pymodbus sync) und read_async() (modbus_async.AsyncModbus) liefern
+  {Name: Wert}; read_async() hält bis zu max_inflight Requests je Gerät offen.
+  Dieses Modul selbst importiert kein pymodbus
+- Jeder Request wird pro (Gerät, Block) gemessen (vz_metrics: Latenz, Bytes,
+  Exception-Antworten, Timeouts); Fehler kommen immer als ModbusIOError,
+  nie als Fehlerobjekt, auf das die Skripte .registers anwenden würden
+
+Verwendung:
+  from modbus_map import ISG, read
+  vals = read(CLIENT, ISG, ["Aussentemp", "T_VL_WP_ist"])
+"""
+
+import asyncio
+import struct
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import vz_metrics
+
+Value = Any  # int (unskaliert) oder float
+
+# Modbus-TCP-ADU: MBAP-Header 7 Byte + PDU
+ADU_REQUEST = 12          # FC 3/4/6: Funktion, Adresse, Anzahl/Wert
+ADU_EXCEPTION = 9         # Funktion | 0x80, Exception-Code
+ADU_READ_RESPONSE = 9     # + 2 Byte pro Register
+
+# Typ → (struct-Code, Anzahl Register)
+TYPES: Dict[str, Tuple[str, int]] = {
+    "u16": ("H", 1),
+    "s16": ("h", 1),
+    "u32": ("I", 2),
+    "s32": ("i", 2),
+}
+
+
+class ModbusIOError(IOError):
+    """Fehlerantwort oder Verbindungsproblem beim Modbus-Zugriff."""
+
+
+class ModbusNoResponse(ModbusIOError):
+    """Keine Antwort des Geräts (Timeout oder Verbindungsfehler)."""
+
+
+class Reg(NamedTuple):
+    name: str
+    address: int
+    kind: str = "input"         # input / holding
+    type: str = "u16"           # u16 / s16 / u32 / s32
+    word_order: str = "big"     # 32 Bit: big = High-Word zuerst, little = Low-Word zuerst
+    scale: float = 1.0          # Wert = Rohwert / scale + offset
+    offset: float = 0.0
+    uuid: Optional[str] = None  # Ziel-Kanal im Volkszähler
+
+    @property
+    def width(self) -> int:
+        return TYPES[self.type][1]
+
+
+class Device(NamedTuple):
+    name: str
+    regs: Tuple[Reg, ...]
+    unit: int = 1
+    max_regs: int = 125  # Register pro Request (Modbus-PDU: max. 125)
+    max_gap: int = 0     # ungenutzte Register, die für einen gemeinsamen Block mitgelesen werden dürfen
+    max_inflight: int = 1  # gleichzeitig offene Requests (read_async)
+
+    def reg(self, name: str) -> Reg:
+        for r in self.regs:
+            if r.name == name:
+                return r
+        raise KeyError(f"{self.name}: kein Register '{name}'")
+
+
+class Block(NamedTuple):
+    kind: str
+    start: int
+    count: int
+    regs: Tuple[Reg, ...]
+
+
+# ============================== REGISTERKARTEN ================================
+ISG = Device("isg", unit=1, max_gap=16, regs=(
+    # Input-Register (WP_data, regler_wp)
+    Reg("Aussentemp", 506, type="s16", scale=10, uuid="308e0d90-6521-11ee-8b08-a34757253caf"),
+    Reg("T_VL_HK1_ist", 507, scale=10, uuid="59bd6680-6523-11ee-b354-998ee384c361"),
+    Reg("T_VL_HK1_soll", 509, scale=10, uuid="a2197880-6523-11ee-88a3-950f5e8f1efc"),
+    Reg("T_VL_HK2_ist", 510, scale=10, uuid="d9ad7d10-6522-11ee-bcaa-e7b07cee865b"),
+    Reg("T_VL_HK2_soll", 511, scale=10, uuid="911a3ea0-6523-11ee-8114-1fa309bb814a"),
+    Reg("Volumenstrom", 520, scale=100000 / 60, uuid="41084bd0-6522-11ee-920f-d32bfefe5b1f"),
+    Reg("T_WW_ist", 521, scale=10, uuid="c19c6e00-6522-11ee-9a6c-b7d9e43c93c8"),
+    Reg("T_WW_soll", 522, scale=10, uuid="82392af0-6523-11ee-876f-d3acf6a8c4a0"),
+    Reg("T_RL_WP_ist", 541, scale=10, uuid="7c634270-6522-11ee-b368-f7dd1ec956fb"),
+    Reg("T_Quelle", 541, scale=10, uuid="10e15100-0a4d-11f0-8d05-11e6497c1357"),  # wie bisher Register 541
+    Reg("T_VL_WP_ist", 542, scale=10, uuid="a2b81400-6522-11ee-bd47-039fc6f8c20c"),
+    Reg("Heissgastemp", 543, scale=10, uuid="01cddb40-0a14-11f0-94d8-29f192f3b0d0"),
+    Reg("Niederdruck", 544, scale=100, uuid="0e274e80-0a16-11f0-86e4-4d85645aa355"),
+    Reg("Hochdruck", 546, scale=100, uuid="9aba8a50-0a4b-11f0-9f74-298f9eadd1ee"),
+    Reg("RT_IST_OG", 587, scale=10),
+    Reg("Taupunkt", 590, scale=10),
+    # Holding-Register (Sollwerte, von regler_wp geschrieben)
+    Reg("Betriebsart", 1500, kind="holding", uuid="b8b10bd0-6523-11ee-910d-a13553f16887"),
+    Reg("Komfort_HK1", 1501, kind="holding", scale=10),
+    Reg("Eco_HK1", 1502, kind="holding", scale=10),
+    Reg("Steigung_HK1", 1503, kind="holding"),
+    Reg("Komfort_HK2", 1504, kind="holding", scale=10),
+    Reg("Eco_HK2", 1505, kind="holding", scale=10),
+    Reg("Steigung_HK2", 1506, kind="holding"),
+    Reg("WW_Eco", 1510, kind="holding", scale=10),
+    Reg("RT_SOLL_KK2", 1604, kind="holding", scale=10),
+))
+
+# KEBA P30: Holding-Register je 32 Bit; die Wallbox beantwortet nur Requests mit 2 Registern.
+# Unit 1 wie seit jeher im Betrieb (die Doku nennt 255, die Wallbox antwortet auf 1).
+KEBA = Device("keba", unit=1, max_regs=2, regs=(
+    Reg("char_state", 1000, kind="holding", type="u32", uuid="84d69ec0-6e76-11ee-9931-11a6e3c1cc33"),
+    Reg("cable_state", 1004, kind="holding", type="u32", uuid="58163cf0-95ff-11f0-b79d-252564addda6"),
+    Reg("error", 1006, kind="holding", type="u32", uuid="a23a3510-6ea6-11ee-a52a-650ae6b78585"),
+    Reg("curr_i", 1008, kind="holding", type="u32", scale=1000, uuid="6e768290-6e5e-11ee-bd91-fd7700aa25ee"),
+    Reg("act_p", 1020, kind="holding", type="u32", scale=1000, uuid="6cb255a0-6e5f-11ee-b899-c791d8058d25"),
+    Reg("curr_v", 1040, kind="holding", type="u32", uuid="3cd2a490-6e7a-11ee-8790-ab29c7762bfa"),
+    Reg("power_f", 1046, kind="holding", type="u32", scale=1000, uuid="ac06a530-6e5f-11ee-b968-65b0d8af2151"),
+    Reg("curr_i_max", 1100, kind="holding", type="u32", scale=1000, uuid="5d090380-6e79-11ee-80be-0b05d0846b56"),
+    Reg("fail_c", 1600, kind="holding", type="u32"),
+    Reg("fail_t", 1602, kind="holding", type="u32"),
+))
+
+# SEL Wagenrain: Leistungen in 0.01 W, 32 Bit signed; PV wird negativ geliefert.
+# Beantwortet mehrere Requests gleichzeitig (Transaktions-ID); modbus_async stellt sie über eine
+# Verbindung derzeit nacheinander, parallel läuft die SEL aber zu ISG und KEBA.
+SEL = Device("sel", unit=1, max_inflight=3, regs=(
+    Reg("P_PV", 0, type="s32", scale=-100, uuid="0ece9080-6732-11ee-92bb-d5c31bcb9442"),
+    Reg("P_Bilanz", 10, type="s32", scale=100, uuid="e3fc7a80-6731-11ee-8571-5bf96a498b43"),
+    Reg("P_WP", 20, type="s32", scale=100, uuid="1b029800-6732-11ee-ae2e-9715cbeba615"),
+))
+
+
+# ============================== PLANUNG / DECODER =============================
+def _block(kind: str, regs: List[Reg]) -> Block:
+    start = regs[0].address
+    end = max(r.address + r.width for r in regs)
+    return Block(kind, start, end - start, tuple(regs))
+
+
+@lru_cache(maxsize=None)
+def _plan(device: Device, names: Optional[Tuple[str, ...]]) -> Tuple[Block, ...]:
+    regs = device.regs if names is None else tuple(device.reg(n) for n in names)
+    blocks: List[Block] = []
+    for kind in ("input", "holding"):
+        cur: List[Reg] = []
+        for r in sorted((r for r in regs if r.kind == kind), key=lambda r: r.address):
+            if cur:
+                start = cur[0].address
+                end = max(c.address + c.width for c in cur)
+                if r.address - end <= device.max_gap and r.address + r.width - start <= device.max_regs:
+                    cur.append(r)
+                    continue
+                blocks.append(_block(kind, cur))
+            cur = [r]
+        if cur:
+            blocks.append(_block(kind, cur))
+    return tuple(blocks)
+
+
+def plan(device: Device, names: Optional[Iterable[str]] = None) -> Tuple[Block, ...]:
+    """Minimale Blockzugriffe für names (default: alle Register des Geräts)."""
+    return _plan(device, None if names is None else tuple(dict.fromkeys(names)))
+
+
+@lru_cache(maxsize=None)
+def _layout(block: Block) -> Tuple[struct.Struct, Tuple[int, ...], Tuple[int, ...]]:
+    """struct-Format über den ganzen Block, Feldindex je Register, zu tauschende Wortpositionen."""
+    fields = sorted({(r.address, r.type, r.word_order) for r in block.regs})
+    fmt, pos, swaps = ">", block.start, []
+    for addr, typ, order in fields:
+        if addr < pos:
+            raise ValueError(f"Register {addr} überlappt ein anderes Feld im Block ab {block.start}")
+        code, width = TYPES[typ]
+        fmt += "x" * (2 * (addr - pos)) + code
+        if width == 2 and order == "little":
+            swaps.append(addr - block.start)
+        pos = addr + width
+    fmt += "x" * (2 * (block.start + block.count - pos))
+    index = {f: i for i, f in enumerate(fields)}
+    return (struct.Struct(fmt), tuple(index[(r.address, r.type, r.word_order)] for r in block.regs),
+            tuple(swaps))
+
+
+def decode(block: Block, registers: List[int]) -> Dict[str, Value]:
+    """Antwort eines Blockzugriffs → {Name: skalierter Wert}."""
+    if len(registers) < block.count:
+        raise ModbusIOError(f"Block {block.kind} {block.start}: {len(registers)} statt {block.count} Register")
+    st, idx, swaps = _layout(block)
+    words = list(registers[:block.count])
+    for i in swaps:
+        words[i], words[i + 1] = words[i + 1], words[i]
+    raw = st.unpack(struct.pack(f">{block.count}H", *words))
+    out: Dict[str, Value] = {}
+    for r, i in zip(block.regs, idx):
+        v = raw[i]
+        out[r.name] = v if r.scale == 1.0 and r.offset == 0.0 else v / r.scale + r.offset
+    return out
+
+
+def encode(reg: Reg, value: Value) -> List[int]:
+    """Skalierten Wert → Rohregister (Umkehrung von decode, z.B. für den Simulator)."""
+    raw = int(value) if reg.scale == 1.0 and reg.offset == 0.0 else int(round((value - reg.offset) * reg.scale))
+    code, width = TYPES[reg.type]
+    words = list(struct.unpack(f">{width}H", struct.pack(">" + code, raw)))
+    if width == 2 and reg.word_order == "little":
+        words.reverse()
+    return words
+
+
+# ============================== LESEPFAD ======================================
+def label(block: Block) -> str:
+    """Block-Label der Metriken, z.B. input:506+17."""
+    return f"{block.kind}:{block.start}+{block.count}"
+
+
+def _observe(device: Device, what: str, t0: float, bytes_in: int = 0,
+             error: bool = False, timeout: bool = False) -> None:
+    vz_metrics.observe_modbus(device.name, what, time.monotonic() - t0, ADU_REQUEST, bytes_in, error, timeout)
+
+
+def _bytes_in(rr: Any) -> int:
+    regs = getattr(rr, "registers", None)
+    return ADU_READ_RESPONSE + 2 * len(regs) if regs is not None else ADU_REQUEST
+
+
+def call(device: Device, what: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """pymodbus-Sync-Request ausführen und messen; ModbusIOError statt Fehlerantwort oder Exception."""
+    t0 = time.monotonic()
+    try:
+        rr = fn(*args, **kwargs)
+    except Exception as e:  # ConnectionException u.a. (pymodbus wird hier nicht importiert)
+        _observe(device, what, t0, timeout=True)
+        raise ModbusNoResponse(f"{device.name} {what}: {e}") from e
+    if rr.isError():
+        # ExceptionResponse: das Gerät hat geantwortet; ModbusIOException: keine Antwort
+        if not hasattr(rr, "exception_code"):
+            _observe(device, what, t0, timeout=True)
+            raise ModbusNoResponse(f"{device.name} {what}: {rr}")
+        _observe(device, what, t0, ADU_EXCEPTION, error=True)
+        raise ModbusIOError(f"{device.name} {what}: {rr}")
+    _observe(device, what, t0, _bytes_in(rr))
+    return rr
+
+
+def read(client: Any, device: Device, names: Optional[Iterable[str]] = None) -> Dict[str, Value]:
+    """Register über einen pymodbus-Sync-Client lesen (ein Request pro Block)."""
+    vals: Dict[str, Value] = {}
+    for b in plan(device, names):
+        fn = client.read_input_registers if b.kind == "input" else client.read_holding_registers
+        rr = call(device, label(b), fn, b.start, count=b.count, unit=device.unit)
+        vals.update(decode(b, rr.registers))
+    return vals
+
+
+async def read_async(modbus: Any, device: Device, names: Optional[Iterable[str]] = None) -> Dict[str, Value]:
+    """Wie read(), über modbus_async.AsyncModbus; höchstens device.max_inflight Blöcke gleichzeitig."""
+    sem = asyncio.Semaphore(device.max_inflight)
+
+    async def one(b: Block) -> Dict[str, Value]:
+        async with sem:
+            fn = modbus.read_input if b.kind == "input" else modbus.read_holding
+            t0 = time.monotonic()
+            try:
+                regs = await fn(b.start, b.count, unit=device.unit)
+            except (ModbusNoResponse, asyncio.TimeoutError):
+                _observe(device, label(b), t0, timeout=True)
+                raise
+            except ModbusIOError:
+                _observe(device, label(b), t0, ADU_EXCEPTION, error=True)
+                raise
+            _observe(device, label(b), t0, ADU_READ_RESPONSE + 2 * len(regs))
+            return decode(b, regs)
+
+    vals: Dict[str, Value] = {}
+    for part in await asyncio.gather(*(one(b) for b in plan(device, names))):
+        vals.update(part)
+    return vals
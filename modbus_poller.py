@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Modbus-Poller: ein dauerhaft laufender Prozess hält pro Gerät (ISG, KEBA, SEL)
+eine Verbindung offen, fragt die Register der Karte (modbus_map) nach Zeitplan
+ab und liefert die letzten Werte über einen Unix-Socket an die Skripte.
+
+- Zeitplan pro Gerät mit Default-Intervall und Abweichungen pro Register;
+  Register mit gleichem Intervall werden gemeinsam geplant (plan())
+- Protokoll: eine JSON-Zeile pro Anfrage
+    {"device": "isg", "names": ["Aussentemp", …], "max_age": 30}
+  Antwort: {"values": {…}, "age": s, "ts": ältester Messzeitpunkt} oder
+  {"error": "…"} wenn ein Wert fehlt oder älter als max_age ist
+- Skripte verwenden read() / read_async(): erst den Poller fragen, ohne Poller
+  (oder bei zu alten Werten) direkt über den übergebenen Client lesen
+- acquire() liest mehrere Geräte parallel (asyncio) und liefert je Gerät ein
+  Sample mit Messzeitpunkt, damit zusammengehörige Werte (KEBA-Strom, SEL-Bilanz)
+  zeitlich eng beieinander liegen und mit ihrem Zeitstempel geschrieben werden
+
+Start (z.B. als systemd-Dienst):
+  python3 modbus_poller.py [--socket PATH] [--verbose]
+
+Verwendung in den Skripten:
+  import modbus_poller
+  vals = modbus_poller.read(CLIENT, ISG, ["Aussentemp"], max_age=30)
+
+Umgebungsvariablen (optional):
+  MODBUS_POLLER_SOCK   (default: /dev/shm/modbus_poller.sock)
+  ISG_HOST / ISG_PORT, KEBA_HOST / KEBA_PORT, SEL_HOST / SEL_PORT
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import modbus_map
+import vz_metrics
+from modbus_map import ISG, KEBA, SEL, Device, ModbusIOError
+
+# ============================== CONFIG ========================================
+_SHM = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SOCKET_PATH = os.environ.get("MODBUS_POLLER_SOCK", os.path.join(_SHM, "modbus_poller.sock"))
+CLIENT_TIMEOUT = 0.5  # s, danach wird direkt gelesen
+MAX_AGE = 30.0        # s, Default für read()
+RETRY = 10.0          # s Pause nach Verbindungsfehler
+METRICS_EVERY = 60.0  # s, Modbus-Metriken (vz_metrics) exportieren
+
+# Gerät → (Host, Port)
+HOSTS: Dict[str, Tuple[str, int]] = {
+    "isg": (os.environ.get("ISG_HOST", "192.168.178.36"), int(os.environ.get("ISG_PORT", "502"))),
+    "keba": (os.environ.get("KEBA_HOST", "192.168.178.61"), int(os.environ.get("KEBA_PORT", "502"))),
+    "sel": (os.environ.get("SEL_HOST", "192.168.178.40"), int(os.environ.get("SEL_PORT", "1502"))),
+}
+
+# Gerät → (Default-Intervall [s], {Register: Intervall})
+SCHEDULE: Dict[str, Tuple[float, Dict[str, float]]] = {
+    "isg": (10.0, {"Komfort_HK1": 60.0, "Eco_HK1": 60.0, "Steigung_HK1": 60.0, "Komfort_HK2": 60.0,
+                   "Eco_HK2": 60.0, "Steigung_HK2": 60.0, "WW_Eco": 60.0}),
+    "keba": (2.0, {"fail_c": 60.0, "fail_t": 60.0, "curr_i_max": 30.0}),
+    "sel": (2.0, {}),
+}
+
+DEVICES: Tuple[Device, ...] = (ISG, KEBA, SEL)
+
+
+class Sample(NamedTuple):
+    device: str
+    values: Dict[str, Any]
+    ts: float    # Messzeitpunkt (time.time()): direkt Mitte des Zugriffs, vom Poller ältester Wert
+    span: float  # Dauer des direkten Zugriffs [s], 0.0 vom Poller
+    source: str  # "poller" / "direct"
+
+    @property
+    def ts_ms(self) -> int:
+        return int(self.ts * 1000)
+
+
+# ============================== CLIENT ========================================
+def _request(device: Device, names: List[str], max_age: float) -> Dict[str, Any]:
+    return {"device": device.name, "names": names, "max_age": max_age}
+
+
+def fetch(device: Device, names: Iterable[str], max_age: float = MAX_AGE,
+          path: str = SOCKET_PATH) -> Optional[Dict[str, Any]]:
+    """Antwort des Pollers ({"values", "age", "ts"}) oder None (kein Poller, Fehler, zu alt)."""
+    names = list(names)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(CLIENT_TIMEOUT)
+            s.connect(path)
+            s.sendall(json.dumps(_request(device, names, max_age)).encode() + b"\n")
+            buf = b""
+            while not buf.endswith(b"\n"):
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+        resp = json.loads(buf)
+    except (OSError, ValueError):
+        return None
+    if "error" in resp or "values" not in resp:
+        logging.debug("Modbus-Poller %s: %s", device.name, resp.get("error"))
+        return None
+    return resp
+
+
+async def fetch_async(device: Device, names: Iterable[str], max_age: float = MAX_AGE,
+                      path: str = SOCKET_PATH) -> Optional[Dict[str, Any]]:
+    """Wie fetch(), über die asyncio-Loop."""
+    names = list(names)
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(path), CLIENT_TIMEOUT)
+        try:
+            writer.write(json.dumps(_request(device, names, max_age)).encode() + b"\n")
+            resp = json.loads(await asyncio.wait_for(reader.readline(), CLIENT_TIMEOUT))
+        finally:
+            writer.close()
+    except (OSError, ValueError, asyncio.TimeoutError):
+        return None
+    if "error" in resp or "values" not in resp:
+        logging.debug("Modbus-Poller %s: %s", device.name, resp.get("error"))
+        return None
+    return resp
+
+
+def read(client: Any, device: Device, names: Optional[Iterable[str]] = None,
+         max_age: float = MAX_AGE) -> Dict[str, Any]:
+    """Vom Poller, sonst direkt über client (modbus_map.read)."""
+    names = [r.name for r in device.regs] if names is None else list(names)
+    resp = fetch(device, names, max_age)
+    if resp is not None:
+        return resp["values"]
+    return modbus_map.read(client, device, names)
+
+
+async def read_async(modbus: Any, device: Device, names: Optional[Iterable[str]] = None,
+                     max_age: float = MAX_AGE) -> Dict[str, Any]:
+    """Vom Poller, sonst direkt über modbus (modbus_async.AsyncModbus)."""
+    return (await sample_async(modbus, device, names, max_age)).values
+
+
+async def sample_async(modbus: Any, device: Device, names: Optional[Iterable[str]] = None,
+                       max_age: float = MAX_AGE) -> Sample:
+    """Wie read_async(), mit Messzeitpunkt und Quelle."""
+    names = [r.name for r in device.regs] if names is None else list(names)
+    resp = await fetch_async(device, names, max_age)
+    if resp is not None:
+        return Sample(device.name, resp["values"], float(resp.get("ts") or time.time()), 0.0, "poller")
+    t0 = time.time()
+    vals = await modbus_map.read_async(modbus, device, names)
+    t1 = time.time()
+    return Sample(device.name, vals, (t0 + t1) / 2, t1 - t0, "direct")
+
+
+async def acquire(*reads: Tuple[Any, Device, Optional[Iterable[str]]],
+                  max_age: float = MAX_AGE) -> List[Sample]:
+    """Alle Geräte parallel lesen: reads = (AsyncModbus, Device, Namen); Ergebnis in gleicher Reihenfolge."""
+    return list(await asyncio.gather(*(sample_async(m, d, n, max_age) for m, d, n in reads)))
+
+
+def skew(samples: Iterable[Sample]) -> float:
+    """Zeitlicher Abstand [s] zwischen ältestem und jüngstem Sample."""
+    ts = [s.ts for s in samples]
+    return max(ts) - min(ts) if ts else 0.0
+
+
+# ============================== DAEMON ========================================
+class Store:
+    """Letzter Wert und Zeitpunkt (time.time()) pro (Gerät, Register)."""
+
+    def __init__(self) -> None:
+        self._vals: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, device: str, vals: Dict[str, Any], ts: float) -> None:
+        with self._lock:
+            for name, v in vals.items():
+                self._vals[(device, name)] = (v, ts)
+
+    def get(self, device: str, names: List[str], max_age: float) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            found = {n: self._vals.get((device, n)) for n in names}
+        missing = [n for n, e in found.items() if e is None]
+        if missing:
+            return {"error": f"keine Werte für {', '.join(missing)}"}
+        oldest = min(ts for _, ts in found.values())
+        if now - oldest > max_age:
+            return {"error": f"Werte {now - oldest:.1f}s alt (max_age {max_age:g})"}
+        return {"values": {n: v for n, (v, _) in found.items()}, "age": round(now - oldest, 3), "ts": oldest}
+
+
+def groups(device: Device) -> List[Tuple[float, List[str]]]:
+    """Register nach Intervall gruppiert: [(Intervall, [Namen])]."""
+    default, special = SCHEDULE.get(device.name, (10.0, {}))
+    by_iv: Dict[float, List[str]] = {}
+    for r in device.regs:
+        by_iv.setdefault(special.get(r.name, default), []).append(r.name)
+    return sorted(by_iv.items())
+
+
+class DevicePoller(threading.Thread):
+    """Eine Verbindung pro Gerät; fragt fällige Gruppen ab und hält sie offen."""
+
+    def __init__(self, device: Device, store: Store, stop: threading.Event) -> None:
+        super().__init__(name=f"poll-{device.name}", daemon=True)
+        self.device = device
+        self.store = store
+        self.stop = stop
+        self.groups = groups(device)
+        self.client: Any = None
+
+    def _connect(self) -> Any:
+        from pymodbus.client.sync import ModbusTcpClient
+
+        host, port = HOSTS[self.device.name]
+        client = ModbusTcpClient(host, port=port)
+        if not client.connect():
+            raise ModbusIOError(f"Keine Verbindung zu {host}:{port}")
+        logging.info("%s: verbunden mit %s:%s", self.device.name, host, port)
+        return client
+
+    def _close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def run(self) -> None:
+        due = [0.0] * len(self.groups)
+        while not self.stop.is_set():
+            now = time.monotonic()
+            try:
+                if self.client is None:
+                    self.client = self._connect()
+                for i, (interval, names) in enumerate(self.groups):
+                    if now >= due[i]:
+                        t0 = time.time()
+                        vals = modbus_map.read(self.client, self.device, names)
+                        self.store.update(self.device.name, vals, (t0 + time.time()) / 2)
+                        due[i] = now + interval
+            except Exception as e:
+                logging.warning("%s: %s – neuer Versuch in %.0fs", self.device.name, e, RETRY)
+                self._close()
+                self.stop.wait(RETRY)
+                continue
+            self.stop.wait(max(0.0, min(due) - time.monotonic()))
+        self._close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "PollerServer"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+                resp = self.server.store.get(str(req["device"]), [str(n) for n in req["names"]],
+                                             float(req.get("max_age", MAX_AGE)))
+            except (ValueError, KeyError, TypeError) as e:
+                resp = {"error": f"ungültige Anfrage: {e}"}
+            self.wfile.write(json.dumps(resp).encode() + b"\n")
+
+
+class PollerServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, store: Store) -> None:
+        if os.path.exists(path):
+            os.unlink(path)  # Überbleibsel eines früheren Laufs
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o660)
+        self.store = store
+
+
+def _export_metrics(stop: threading.Event) -> None:
+    while not stop.wait(METRICS_EVERY):
+        vz_metrics.flush()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Modbus-Poller für ISG, KEBA und SEL")
+    ap.add_argument("--socket", default=SOCKET_PATH)
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+
+    store, stop = Store(), threading.Event()
+    pollers = [DevicePoller(d, store, stop) for d in DEVICES]
+    for p in pollers:
+        p.start()
+    threading.Thread(target=_export_metrics, args=(stop,), name="metrics", daemon=True).start()
+    server = PollerServer(args.socket, store)
+    logging.info("Modbus-Poller bereit: %s", args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        os.unlink(args.socket)
+        for p in pollers:
+            p.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Schattenkopie von Holding-Registern (Sollwerte der ISG): geschrieben wird nur,
+was vom aktuellen Stand des Geräts abweicht.
+
+- refresh() liest die Register einmal pro Lauf in Blöcken (modbus_map.plan);
+  danach merkt sich die Kopie jeden geschriebenen Wert
+- write() überspringt identische Werte; das schont Modbus-Verkehr und die
+  persistenten Einstellungen der ISG
+- confirm() wartet per Rücklesen (mit Timeout), bis ein Wert übernommen ist;
+  settle hält zusätzlich eine Mindestzeit nach dem Schreiben ein, wenn das
+  Gerät den Wert sofort zurückliest, ihn aber erst später umsetzt
+
+Verwendung:
+  isg_set = Shadow(CLIENT, ISG, ["Betriebsart", "WW_Eco"])
+  isg_set.refresh()
+  if isg_set.write("Betriebsart", 5):
+      isg_set.confirm("Betriebsart", 5, settle=5.0)
+  isg_set.write("WW_Eco", 560)
+"""
+
+import logging
+import time
+from typing import Any, Dict, Iterable, List
+
+from modbus_map import Device, Value, call, label, plan
+
+# ============================== CONFIG ========================================
+CONFIRM_TIMEOUT = 10.0  # s
+CONFIRM_INTERVAL = 0.5  # s zwischen zwei Rücklesungen
+
+
+class Shadow:
+    """Bekannter Rohwert je Holding-Register (16 Bit) eines Geräts."""
+
+    def __init__(self, client: Any, device: Device, names: Iterable[str]) -> None:
+        self.client = client
+        self.device = device
+        self.names: List[str] = list(names)
+        for name in self.names:
+            r = device.reg(name)
+            if r.kind != "holding" or r.width != 1:
+                raise ValueError(f"{device.name} {name}: nur 16-Bit-Holding-Register")
+        self.raw: Dict[str, int] = {}
+        self.written_at: Dict[str, float] = {}  # time.monotonic() des letzten Schreibzugriffs
+        self.written = 0
+        self.skipped = 0
+
+    def _read_raw(self, names: Iterable[str]) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for b in plan(self.device, names):
+            rr = call(self.device, label(b), self.client.read_holding_registers,
+                      b.start, count=b.count, unit=self.device.unit)
+            for r in b.regs:
+                out[r.name] = rr.registers[r.address - b.start]
+        return out
+
+    def refresh(self) -> None:
+        """Aktuellen Stand aller Register vom Gerät lesen."""
+        self.raw.update(self._read_raw(self.names))
+
+    def value(self, name: str) -> Value:
+        """Bekannter Wert, skaliert wie in der Registerkarte."""
+        r = self.device.reg(name)
+        raw = self.raw[name]
+        return raw if r.scale == 1.0 and r.offset == 0.0 else raw / r.scale + r.offset
+
+    def write(self, name: str, raw: int) -> bool:
+        """Rohwert schreiben, falls er vom bekannten Stand abweicht; True wenn geschrieben."""
+        raw = int(raw)
+        if self.raw.get(name) == raw:
+            self.skipped += 1
+            logging.debug("%s %s = %s unverändert, nicht geschrieben", self.device.name, name, raw)
+            return False
+        r = self.device.reg(name)
+        call(self.device, f"write:{r.address}", self.client.write_register, r.address, raw, unit=self.device.unit)
+        logging.info("%s %s: %s → %s", self.device.name, name, self.raw.get(name), raw)
+        self.raw[name] = raw
+        self.written_at[name] = time.monotonic()
+        self.written += 1
+        return True
+
+    def confirm(self, name: str, raw: int, timeout: float = CONFIRM_TIMEOUT,
+                interval: float = CONFIRM_INTERVAL, settle: float = 0.0) -> bool:
+        """Zurücklesen, bis das Register raw enthält, frühestens settle s nach dem Schreiben; False nach timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self._read_raw([name])[name]
+            self.raw[name] = current
+            if current == int(raw):
+                rest = self.written_at.get(name, float("-inf")) + settle - time.monotonic()
+                if rest > 0:
+                    time.sleep(rest)
+                return True
+            if time.monotonic() >= deadline:
+                logging.warning("%s %s: %s nach %.0fs nicht übernommen (gelesen: %s)",
+                                self.device.name, name, raw, timeout, current)
+                return False
+            time.sleep(interval)
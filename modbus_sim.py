@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Modbus-Simulator für ISG, KEBA und SEL: ein pymodbus-Server pro Gerät mit dem
+Registerlayout aus modbus_map, damit WP_data, regler_wp, keba_tcp und sel (und
+modbus_poller) ohne die echten Geräte laufen und sich Durchsatz und Latenz der
+Mess- und Regelpfade offline messen lassen.
+
+- Simulierte Uhr: Startzeit --start, Zeitraffer --speed (1 = Echtzeit)
+- Modell (Profil als JSON, sonst DEFAULT_PROFILE):
+  - PV als Sinus-Tagesgang zwischen sunrise und sunset mit Wolken (Zufallspfad)
+  - Wärmepumpe: Leistung je Betriebsart (ISG-Register 1500, von regler_wp
+    geschrieben), Warmwasser heizt im WW-Betrieb auf und kühlt sonst ab
+  - KEBA: Fahrzeug (ev_plugged, ev_kwh) folgt Freigabe (5014) und Sollstrom
+    (5004) mit Verzögerung EV_TAU; Failsafe (5016/5018/5020) wie die Wallbox
+  - SEL: P_PV, P_WP und P_Bilanz = Last + WP + Fahrzeug − PV
+- Ereignisse im Profil zu Uhrzeiten, z.B. Ein-/Ausstecken oder ein manueller
+  Wechsel der Betriebsart; Schlüssel ohne Punkt sind Modellparameter, "gerät.name"
+  setzt ein Register (Holding: einmalig wie ein Schreibzugriff, Input: fest bis
+  null)
+- Aufnahme statt Modell (--db): Registerwerte aus bench_replay record im Takt
+  der simulierten Uhr; Schreibzugriffe der Skripte bleiben stehen, bis sich der
+  aufgezeichnete Wert ändert
+- --latency verzögert jede Antwort (Geräte sind langsamer als localhost);
+  beim Beenden werden Requests pro Gerät ausgegeben
+
+Start:
+  python3 modbus_sim.py [--profile tag.json] [--start 06:00] [--speed 60] [--latency 0.02]
+  python3 modbus_sim.py --db day.sqlite --start 06:00 --speed 60
+  Die Umgebungsvariablen für die Skripte (ISG_HOST/ISG_PORT, …, MODBUS_POLLER_SOCK)
+  werden beim Start ausgegeben.
+
+Profil:
+  {"pv_peak_w": 9000, "sunrise": "06:30", "sunset": "20:30", "clouds": 0.3,
+   "load_w": 400, "t_out_min": 8, "t_out_max": 22, "seed": 1,
+   "events": [{"at": "09:00", "set": {"ev_plugged": true, "ev_kwh": 20}},
+              {"at": "13:00", "set": {"isg.Betriebsart": 5}},
+              {"at": "18:00", "set": {"ev_plugged": false}}]}
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymodbus.datastore import ModbusSequentialDataBlock, ModbusServerContext, ModbusSlaveContext
+from pymodbus.server.sync import ModbusTcpServer
+
+from modbus_map import ISG, KEBA, SEL, Block, Device, Value, decode, encode
+
+# ============================== CONFIG ========================================
+HOST = os.environ.get("MODBUS_SIM_HOST", "127.0.0.1")
+PORTS: Dict[str, int] = {"isg": 5020, "keba": 5021, "sel": 5022}
+ENV_PREFIX: Dict[str, str] = {"isg": "ISG", "keba": "KEBA", "sel": "SEL"}
+TICK = 1.0          # s Echtzeit zwischen zwei Modellschritten
+STATUS_EVERY = 900  # s simulierte Zeit zwischen zwei Statuszeilen
+EV_TAU = 5.0        # s, Zeitkonstante des Fahrzeugs auf einen neuen Sollstrom
+NETZ_V = 230.0
+
+# Schreibregister der KEBA (keba_tcp); Rückmeldung in fail_c / fail_t / curr_i_max
+KEBA_SET_CURR = 5004   # mA
+KEBA_ENABLE = 5014     # 0 / 1
+KEBA_FAIL_CURR = 5016  # mA
+KEBA_FAIL_TIME = 5018  # s
+KEBA_FAIL = 5020       # 1 = Failsafe aktiv
+
+# Betriebsart ISG → elektrische Leistung WP [W]
+WP_POWER: Dict[int, float] = {1: 0.0, 2: 900.0, 3: 1400.0, 4: 700.0, 5: 2200.0}
+
+DEFAULT_PROFILE: Dict[str, Any] = {
+    "pv_peak_w": 9000, "sunrise": "06:30", "sunset": "20:30", "clouds": 0.2,
+    "load_w": 400, "t_out_min": 8, "t_out_max": 22, "seed": 1,
+    "ev_plugged": False, "ev_kwh": 20,
+    "events": [
+        {"at": "09:00", "set": {"ev_plugged": True, "ev_kwh": 20}},
+        {"at": "18:30", "set": {"ev_plugged": False}},
+    ],
+}
+
+# Startwerte der Holding-Register (skaliert)
+HOLDING_INIT: Dict[str, Dict[str, Value]] = {
+    "isg": {"Betriebsart": 2, "Komfort_HK1": 21.0, "Eco_HK1": 19.0, "Steigung_HK1": 35,
+            "Komfort_HK2": 21.0, "Eco_HK2": 19.0, "Steigung_HK2": 35, "WW_Eco": 48.0,
+            "RT_SOLL_KK2": 22.0},
+    "keba": {"fail_c": 0, "fail_t": 0, "curr_i_max": 32.0},
+}
+
+DEVICES: Tuple[Device, ...] = (ISG, KEBA, SEL)
+
+
+def _hhmm(value: str) -> float:
+    hh, mm = (int(x) for x in value.split(":"))
+    return hh * 3600.0 + mm * 60.0
+
+
+# ============================== DATENSPEICHER =================================
+class _Context(ModbusSlaveContext):
+    """Registerspeicher eines Geräts: zählt Requests, verzögert Antworten, merkt Schreibzeitpunkte."""
+
+    def __init__(self, size: int, latency: float) -> None:
+        super().__init__(hr=ModbusSequentialDataBlock(0, [0] * size),
+                         ir=ModbusSequentialDataBlock(0, [0] * size), zero_mode=True)
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self.written: Dict[int, float] = {}  # Adresse → time.monotonic() des letzten Schreibzugriffs
+
+    def getValues(self, fx: int, address: int, count: int = 1) -> List[int]:
+        self.reads += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return super().getValues(fx, address, count)
+
+    def setValues(self, fx: int, address: int, values: List[int]) -> None:
+        self.writes += 1
+        if self.latency:
+            time.sleep(self.latency)
+        super().setValues(fx, address, values)
+        now = time.monotonic()
+        for i in range(len(values)):
+            self.written[address + i] = now
+
+    # Zugriffe des Simulators selbst: ohne Zähler und Verzögerung
+    def raw(self, kind: str, address: int, count: int = 1) -> List[int]:
+        return self.store["h" if kind == "holding" else "i"].getValues(address, count)
+
+    def put(self, kind: str, address: int, words: List[int]) -> None:
+        self.store["h" if kind == "holding" else "i"].setValues(address, words)
+
+
+class Registers:
+    """Skalierte Sicht auf die Register eines Geräts (Layout aus modbus_map)."""
+
+    def __init__(self, device: Device, latency: float) -> None:
+        self.device = device
+        top = max(r.address + r.width for r in device.regs)
+        if device is KEBA:
+            top = max(top, KEBA_FAIL + 1)
+        self.ctx = _Context(top + 1, latency)
+
+    def get(self, name: str) -> Value:
+        r = self.device.reg(name)
+        return decode(Block(r.kind, r.address, r.width, (r,)), self.ctx.raw(r.kind, r.address, r.width))[name]
+
+    def set(self, name: str, value: Value) -> None:
+        r = self.device.reg(name)
+        self.ctx.put(r.kind, r.address, encode(r, value))
+
+    def word(self, address: int) -> int:
+        return self.ctx.raw("holding", address)[0]
+
+
+# ============================== QUELLEN =======================================
+class Model:
+    """Einfaches Haus: PV, Grundlast, Wärmepumpe, Fahrzeug an der KEBA."""
+
+    def __init__(self, profile: Dict[str, Any]) -> None:
+        self.p = {k: v for k, v in dict(DEFAULT_PROFILE, **profile).items() if k != "events"}
+        self.rng = random.Random(self.p.get("seed"))
+        self.cloud = 0.0
+        self.curr_i = 0.0
+        self.t_ww = 45.0
+
+    def _pv(self, t: float) -> float:
+        rise, sset = _hhmm(self.p["sunrise"]), _hhmm(self.p["sunset"])
+        if not rise < t < sset:
+            return 0.0
+        clouds = float(self.p["clouds"])
+        self.cloud = min(1.0, max(0.0, self.cloud + self.rng.gauss(0.0, 0.05)))
+        return self.p["pv_peak_w"] * math.sin(math.pi * (t - rise) / (sset - rise)) * (1.0 - clouds * self.cloud)
+
+    def _t_out(self, t: float) -> float:
+        lo, hi = self.p["t_out_min"], self.p["t_out_max"]
+        return lo + (hi - lo) * (1.0 - math.cos(2.0 * math.pi * (t - 5 * 3600.0) / 86400.0)) / 2.0
+
+    def _keba(self, keba: Registers, t_sim: float, dt: float, speed: float) -> float:
+        ctx = keba.ctx
+        i_set = keba.word(KEBA_SET_CURR) / 1000.0
+        enabled = keba.word(KEBA_ENABLE) == 1
+        keba.set("fail_c", keba.word(KEBA_FAIL_CURR))
+        keba.set("fail_t", keba.word(KEBA_FAIL_TIME))
+        if keba.word(KEBA_FAIL) == 1 and keba.word(KEBA_FAIL_TIME) and KEBA_SET_CURR in ctx.written:
+            silent = (time.monotonic() - ctx.written[KEBA_SET_CURR]) * speed
+            if silent > keba.word(KEBA_FAIL_TIME):
+                i_set = keba.word(KEBA_FAIL_CURR) / 1000.0
+        plugged = bool(self.p["ev_plugged"])
+        target = i_set if plugged and enabled and i_set >= 6.0 and self.p["ev_kwh"] > 0 else 0.0
+        self.curr_i += (target - self.curr_i) * min(1.0, dt / EV_TAU)
+        if target == 0.0 and self.curr_i < 0.5:
+            self.curr_i = 0.0
+        p_ev = 3 * NETZ_V * self.curr_i
+        self.p["ev_kwh"] = max(0.0, self.p["ev_kwh"] - p_ev * dt / 3.6e6)
+        keba.set("cable_state", 7 if plugged else 1)
+        keba.set("char_state", (3 if self.curr_i > 0 else 2) if plugged else 1)
+        keba.set("curr_i", self.curr_i)
+        keba.set("act_p", p_ev)
+        keba.set("curr_v", NETZ_V)
+        keba.set("power_f", 0.99 if self.curr_i > 0 else 0.0)
+        keba.set("curr_i_max", i_set)
+        return p_ev
+
+    def _isg(self, isg: Registers, t: float, dt: float) -> float:
+        mode = int(isg.get("Betriebsart"))
+        p_wp = WP_POWER.get(mode, 0.0)
+        t_out = self._t_out(t)
+        if mode == 5 and self.t_ww < 55.0:
+            self.t_ww += dt * 15.0 / 3600.0
+        else:
+            self.t_ww -= dt * 1.0 / 3600.0
+        t_vl = 20.0 + max(0.0, 20.0 - t_out) * isg.get("Steigung_HK1") / 35.0 if p_wp else 22.0
+        isg.set("Aussentemp", t_out)
+        for name in ("T_VL_HK1_ist", "T_VL_HK1_soll", "T_VL_HK2_ist", "T_VL_HK2_soll"):
+            isg.set(name, t_vl)
+        isg.set("Volumenstrom", 18.0 if p_wp else 0.0)
+        isg.set("T_WW_ist", self.t_ww)
+        isg.set("T_WW_soll", isg.get("WW_Eco"))
+        isg.set("T_RL_WP_ist", t_vl - (5.0 if p_wp else 0.0))
+        isg.set("T_VL_WP_ist", t_vl + (2.0 if p_wp else 0.0))
+        isg.set("Heissgastemp", 70.0 if p_wp else t_vl)
+        isg.set("Niederdruck", 5.0 if p_wp else 8.0)
+        isg.set("Hochdruck", 22.0 if p_wp else 8.0)
+        isg.set("RT_IST_OG", 21.5)
+        isg.set("Taupunkt", 12.0)
+        return p_wp
+
+    def step(self, regs: Dict[str, Registers], t: float, dt: float, speed: float) -> None:
+        t %= 86400.0
+        p_pv = self._pv(t)
+        p_wp = self._isg(regs["isg"], t, dt)
+        p_ev = self._keba(regs["keba"], t, dt, speed)
+        sel = regs["sel"]
+        sel.set("P_PV", p_pv)
+        sel.set("P_WP", p_wp)
+        sel.set("P_Bilanz", self.p["load_w"] + p_wp + p_ev - p_pv)
+
+
+class Recording:
+    """Registerwerte aus einer Aufnahme von bench_replay (Tabelle modbus)."""
+
+    def __init__(self, path: str) -> None:
+        self.conn = sqlite3.connect(path)
+        first = self.conn.execute("SELECT MIN(ts) FROM modbus").fetchone()[0]
+        if first is None:
+            raise SystemExit(f"{path}: keine Modbus-Aufnahme")
+        day = datetime.fromtimestamp(first / 1000).astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.day_ms = int(day.timestamp() * 1000)
+        self.last_ms = -1
+        self.applied: Dict[Tuple[str, str, int], int] = {}
+
+    def step(self, regs: Dict[str, Registers], t: float, dt: float, speed: float) -> None:
+        at_ms = self.day_ms + int(t * 1000)
+        rows = self.conn.execute("SELECT device, kind, addr, value FROM modbus WHERE ts > ? AND ts <= ? ORDER BY ts",
+                                 (self.last_ms, at_ms))
+        for dev, kind, addr, value in rows:
+            # nur Änderungen der Aufnahme übernehmen, Schreibzugriffe der Skripte bleiben sonst stehen
+            if dev in regs and self.applied.get((dev, kind, addr)) != value:
+                regs[dev].ctx.put(kind, addr, [value & 0xFFFF])
+                self.applied[(dev, kind, addr)] = value
+        self.last_ms = max(self.last_ms, at_ms)
+
+
+# ============================== SIMULATOR =====================================
+class Simulator:
+    def __init__(self, source: Any, events: List[Dict[str, Any]], start: float, speed: float,
+                 latency: float, host: str = HOST, ports: Optional[Dict[str, int]] = None) -> None:
+        self.source = source
+        self.events = sorted(events, key=lambda e: _hhmm(e["at"]))
+        self.start_s = start
+        self.speed = speed
+        self.regs = {d.name: Registers(d, latency) for d in DEVICES}
+        self.pins: Dict[Tuple[str, str], Value] = {}
+        self.servers: Dict[str, ModbusTcpServer] = {}
+        self.host = host
+        self.ports = dict(PORTS, **(ports or {}))
+        self._next_event = 0
+        self._stop = threading.Event()
+        for dev, values in HOLDING_INIT.items():
+            for name, value in values.items():
+                self.regs[dev].set(name, value)
+        # Ereignisse vor dem Start gelten als schon eingetreten
+        while self._next_event < len(self.events) and _hhmm(self.events[self._next_event]["at"]) <= start:
+            self._apply(self.events[self._next_event])
+            self._next_event += 1
+
+    def _apply(self, event: Dict[str, Any]) -> None:
+        for key, value in event.get("set", {}).items():
+            if "." not in key:
+                if isinstance(self.source, Model):
+                    self.source.p[key] = value
+                continue
+            dev, name = key.split(".", 1)
+            if self.regs[dev].device.reg(name).kind == "holding":
+                self.regs[dev].set(name, value)
+            elif value is None:
+                self.pins.pop((dev, name), None)
+            else:
+                self.pins[(dev, name)] = value
+        logging.info("Ereignis %s: %s", event["at"], event.get("set"))
+
+    def clock(self, elapsed: float) -> float:
+        return self.start_s + elapsed * self.speed
+
+    def step(self, t: float, dt: float) -> None:
+        while self._next_event < len(self.events) and _hhmm(self.events[self._next_event]["at"]) <= t % 86400.0:
+            self._apply(self.events[self._next_event])
+            self._next_event += 1
+        self.source.step(self.regs, t, dt, self.speed)
+        for (dev, name), value in self.pins.items():
+            self.regs[dev].set(name, value)
+
+    def status(self, t: float) -> str:
+        sel, keba, isg = self.regs["sel"], self.regs["keba"], self.regs["isg"]
+        hh, mm = divmod(int(t % 86400.0) // 60, 60)
+        return (f"{hh:02d}:{mm:02d} PV {sel.get('P_PV'):.0f} W, Bilanz {sel.get('P_Bilanz'):.0f} W, "
+                f"WP {sel.get('P_WP'):.0f} W (Betriebsart {isg.get('Betriebsart')}), "
+                f"KEBA {keba.get('curr_i'):.1f} A (Status {keba.get('char_state')})")
+
+    def start(self) -> None:
+        for name, r in self.regs.items():
+            context = ModbusServerContext(slaves={r.device.unit: r.ctx}, single=False)
+            srv = ModbusTcpServer(context, address=(self.host, self.ports[name]), allow_reuse_address=True)
+            threading.Thread(target=srv.serve_forever, name=f"modbus-sim-{name}", daemon=True).start()
+            self.servers[name] = srv
+
+    def stop(self) -> None:
+        self._stop.set()
+        for srv in self.servers.values():
+            srv.shutdown()
+            srv.server_close()
+
+    def env(self) -> Dict[str, str]:
+        """Umgebungsvariablen, mit denen die Skripte auf den Simulator zeigen."""
+        # eigener Poller-Socket: ein laufender modbus_poller der Anlage darf nicht antworten
+        out = {"MODBUS_POLLER_SOCK": os.path.join(tempfile.gettempdir(), "modbus_sim_poller.sock")}
+        for name, prefix in ENV_PREFIX.items():
+            out[f"{prefix}_HOST"], out[f"{prefix}_PORT"] = self.host, str(self.ports[name])
+        return out
+
+    def run(self, duration: Optional[float] = None) -> None:
+        """Modell im Takt TICK fortschreiben, bis stop() oder duration (simuliert) erreicht ist."""
+        t0 = time.monotonic()
+        t_prev = self.clock(0.0)
+        next_status = t_prev
+        self.step(t_prev, 0.0)
+        while not self._stop.wait(TICK):
+            t = self.clock(time.monotonic() - t0)
+            self.step(t, t - t_prev)
+            t_prev = t
+            if t >= next_status:
+                logging.info("%s", self.status(t))
+                next_status = t + STATUS_EVERY
+            if duration is not None and t - self.start_s >= duration:
+                break
+
+    def counters(self) -> Dict[str, Tuple[int, int]]:
+        return {name: (r.ctx.reads, r.ctx.writes) for name, r in self.regs.items()}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Modbus-Simulator für ISG, KEBA und SEL.")
+    ap.add_argument("--profile", default=None, help="Profil (JSON), default: eingebautes Tagesprofil")
+    ap.add_argument("--db", default=None, help="Aufnahme von bench_replay record statt Modell")
+    ap.add_argument("--start", default=None, help="simulierte Startzeit HH:MM (default: jetzt)")
+    ap.add_argument("--speed", type=float, default=1.0, help="Zeitraffer (1 = Echtzeit)")
+    ap.add_argument("--hours", type=float, default=None, help="nach so vielen simulierten Stunden beenden")
+    ap.add_argument("--latency", type=float, default=0.0, help="Antwortverzögerung je Request [s]")
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+
+    profile: Dict[str, Any] = DEFAULT_PROFILE
+    if args.profile:
+        with open(args.profile, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+    now = datetime.now()
+    start = _hhmm(args.start) if args.start else now.hour * 3600.0 + now.minute * 60.0 + now.second
+    source = Recording(args.db) if args.db else Model(profile)
+    events = profile.get("events", []) if (args.profile or not args.db) else []
+
+    sim = Simulator(source, events, start, args.speed, args.latency, host=args.host)
+    sim.start()
+    print(" ".join(f"{k}={v}" for k, v in sim.env().items()))
+    try:
+        sim.run(None if args.hours is None else args.hours * 3600.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+        for name, (reads, writes) in sim.counters().items():
+            print(f"{name}: {reads} Lese-, {writes} Schreibrequests")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,10 +1,10 @@
 import requests 
 import json
 import logging
+from vz_client import write_vals
 
 UUID_P = "d92bc9e0-80c5-11ef-8443-b5ad123097e5"
 IP_VENTI = "192.168.178.41"
-URL_VZ = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
 
 
 
@@ -15,10 +15,8 @@ def main():
     print(decoded_data)
     print("Actual Power {}".format(decoded_data["power"]))
     print("Posting to VZ")
-    poststring_p = URL_VZ.format(UUID_P, decoded_data["power"])
-    postreq_p = requests.post(poststring_p)
-    print(poststring_p)
-    print(postreq_p.ok)
+    ok_p = write_vals(UUID_P, decoded_data["power"])
+    print(ok_p)
 
 
 
@@ -2,14 +2,18 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import json
 import math
 import statistics
-from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-import requests
 from datetime import datetime, timedelta, timezone
 
+import numpy as np
+
+import vz_client
+import vz_columns
+import vz_transitions
+
 try:
     from zoneinfo import ZoneInfo  # Python 3.9+
 except Exception:
@@ -19,11 +23,6 @@ except Exception:
 # =========================
 # Konfiguration
 # =========================
-BASE_URL = "http://192.168.178.49/middleware.php"
-VZ_GET_URL_FROM = BASE_URL + "/data/{}.json?from={}"            # from als Dauer/ISO/ms
-VZ_GET_URL_BETWEEN = BASE_URL + "/data/{}.json?from={}&to={}"   # from & to
-VZ_POST_URL = BASE_URL + "/data/{}.json"                        # ts & value als params
-
 UUIDS: Dict[str, str] = {
     "Freigabe_EMob": "756356f0-9396-11f0-a24e-add622cac6cb",
     "Cable_State":   "58163cf0-95ff-11f0-b79d-252564addda6",     # tuples: [ts, value, quality]
@@ -81,178 +80,50 @@ def ceil_to_step_minutes(minutes: float, step: int = 15) -> int:
 # =========================
 # HTTP / Volkszähler I/O
 # =========================
-def _get_json(url: str) -> Any:
-    r = requests.get(url, timeout=15, headers={"Accept": "application/json"})
-    _d(f"[DEBUG] GET {url} -> {r.status_code}, bytes={len(r.content)}")
-    r.raise_for_status()
-    try:
-        return r.json()
-    except Exception:
-        return json.loads(r.text)
-
-
 def get_vals(uuid: str, duration: str) -> Any:
-    return _get_json(VZ_GET_URL_FROM.format(uuid, duration))
+    payload = vz_client.get_vals(uuid, duration, timeout=15)
+    _d(f"[DEBUG] GET {uuid} from={duration}")
+    return payload
 
 
 def get_vals_between(uuid: str, frm: str, to: str = "now") -> Any:
-    return _get_json(VZ_GET_URL_BETWEEN.format(uuid, frm, to))
+    payload = vz_client.get_between(uuid, frm, to, timeout=15)
+    _d(f"[DEBUG] GET {uuid} from={frm} to={to}")
+    return payload
 
 
 def post_point(uuid: str, ts_ms: int, value: Union[int, float]) -> None:
     """Schreibt einen Punkt minütlich (operation=add, ts in ms UTC)."""
-    params = {"operation": "add", "ts": str(int(ts_ms)), "value": str(value)}
-    r = requests.post(VZ_POST_URL.format(uuid), params=params, timeout=15)
-    if not r.ok:
-        raise RuntimeError(f"POST failed {uuid}@{ts_ms}: {r.status_code} {r.text[:200]}")
+    if not vz_client.write_vals(uuid, value, ts_ms, timeout=15):
+        raise RuntimeError(f"POST failed {uuid}@{ts_ms}")
 
 
-def delete_range(uuid: str, from_ms: int, to_ms: int) -> None:
-    """Löscht existierende Werte im Bereich (inklusive)."""
-    params = {"operation": "delete", "from": str(int(from_ms)), "to": str(int(to_ms))}
-    r = requests.get(VZ_POST_URL.format(uuid), params=params, timeout=20)
-    if not r.ok:
-        raise RuntimeError(f"DELETE failed {uuid} [{from_ms}..{to_ms}]: {r.status_code} {r.text[:200]}")
+def post_series(uuid: str, points: List[Tuple[int, Union[int, float]]]) -> int:
+    """Schreibt eine ganze Reihe (ts_ms, value) gebündelt; Rückgabe: Anzahl geschriebener Punkte."""
+    written = vz_client.write_many(uuid, points, timeout=15)
+    _d(f"[DEBUG] Bulk-POST {uuid}: {written}/{len(points)} Punkte")
+    return written
 
 
-# =========================
-# Payload-Normalisierung
-# =========================
-def _normalize_sections(payload: Any) -> List[dict]:
-    """
-    Rückgabe als Liste von „sections“ mit jeweils mindestens „tuples“ (Liste).
-    Falls die API bereits direkt eine Liste von Tupeln liefert, kapseln wir das.
-    """
-    if isinstance(payload, list):
-        if payload and isinstance(payload[0], (list, tuple)):
-            return [{"tuples": payload}]
-        if payload and isinstance(payload[0], dict):
-            return payload
-        return []
-
-    if isinstance(payload, dict):
-        # Häufig: {"data": {...}} oder {"data":[{...}, ...]}
-        if "data" in payload:
-            data = payload["data"]
-            if isinstance(data, list):
-                return data
-            if isinstance(data, dict):
-                if "tuples" in data and isinstance(data["tuples"], list):
-                    return [data]
-                if "data" in data and isinstance(data["data"], list):
-                    return data["data"]
-                return [data]
-            return []
-        # Fallbacks
-        if "tuples" in payload and isinstance(payload["tuples"], list):
-            return [payload]
-        for _, v in payload.items():
-            if isinstance(v, list) and v and isinstance(v[0], (list, tuple)):
-                return [{"tuples": v}]
-        return []
-    return []
-
-
-def _iter_section_tuples(section: dict) -> Iterable[list]:
-    tuples = section.get("tuples", [])
-    if isinstance(tuples, list):
-        for t in tuples:
-            if isinstance(t, (list, tuple)) and len(t) >= 2:
-                yield t
+def delete_range(uuid: str, from_ms: int, to_ms: int) -> None:
+    """Löscht existierende Werte im Bereich (inklusive)."""
+    if not vz_client.delete_range(uuid, from_ms, to_ms, timeout=20):
+        raise RuntimeError(f"DELETE failed {uuid} [{from_ms}..{to_ms}]")
 
 
 # =========================
 # 1) Letzten Wechsel „1 → !=1“ finden (Wert in Spalte 1)
 # =========================
-def _raw_val_from_tuple(t: list) -> Optional[float]:
-    """
-    Liest die **zweite** Spalte (Index 1) als **rohen numerischen Wert** (float).
-    Akzeptiert Zahlen/Strings (z.B. "5", "1.0"). Bei Fehlern -> None.
-    """
-    if not isinstance(t, (list, tuple)) or len(t) < 2:
-        return None
-    v = t[1]
-    try:
-        if isinstance(v, str):
-            v = v.strip().replace(",", ".")
-        f = float(v)
-        if not math.isfinite(f):
-            return None
-        return f
-    except Exception:
-        return None
-
-
-def _values_equal(a: Any, b: Any, tol: float = 1e-9) -> bool:
-    """Vergleicht zwei Werte numerisch (tolerant)."""
-    try:
-        return math.isclose(float(a), float(b), rel_tol=0.0, abs_tol=tol)
-    except Exception:
-        return a == b
-
-
 def find_last_ts_equal(uuid: str, target_value: Union[int, float], lookback_min: int) -> Optional[int]:
     """
     Liefert den Zeitstempel (ms, UTC) des **letzten Wechsels von target_value (z.B. 1) zu !=target_value**
     innerhalb des Lookback-Fensters. Wert wird aus Spalte 1 der Tupel gelesen: [ts, value, (quality)].
-    WICHTIG: Es wird **der rohe Wert** verwendet (KEINE Binarisierung) und es wird immer mit einem
-    expliziten **[from,to]**-Fenster (Millisekunden) abgefragt, um Downsampling/Aggregation zu vermeiden.
+    WICHTIG: Es wird **der rohe Wert** verwendet (KEINE Binarisierung). Gelesen werden nur die Tupel seit
+    dem letzten Lauf (Checkpoint in vz_transitions.STATE_DIR); ohne gültigen Checkpoint wird das Fenster
+    stündlich verdichtet gescannt und nur die Stunden mit Zustandswechsel roh nachgeladen.
     """
-    # Explizites Fenster [now - lookback, now] in ms
-    now_ms = int(_utc_now().timestamp() * 1000)
-    from_ms = now_ms - lookback_min * 60_000
-
-    # Abfrage mit from/to
-    payload = get_vals_between(uuid, str(from_ms), str(now_ms))
-    sections = _normalize_sections(payload)
-    if not sections:
-        _d("[DEBUG] find_last_ts_equal: keine sections im Payload")
-        return None
-
-    # (ts, raw_val)
-    samples: List[Tuple[int, float]] = []
-    for section in sections:
-        for t in _iter_section_tuples(section):
-            try:
-                ts_ms = int(t[0])
-            except Exception:
-                continue
-            val_raw = _raw_val_from_tuple(t)
-            if val_raw is None:
-                continue
-            # nur Punkte im Fenster
-            if from_ms <= ts_ms <= now_ms:
-                samples.append((ts_ms, val_raw))
-
-    if not samples:
-        _d("[DEBUG] find_last_ts_equal: keine verwertbaren (ts,val)-Paare")
-        return None
-
-    samples.sort(key=lambda x: x[0])
-
-    # Optionales Debug: kurze Statistik
-    if DEBUG:
-        first_ts, first_val = samples[0]
-        last_ts_s, last_val_s = samples[-1]
-        _d(f"[DEBUG] Punkte: {len(samples)}  von {fmt_ts(first_ts)} (v={first_val}) bis {fmt_ts(last_ts_s)} (v={last_val_s})")
-
-    # Aufeinanderfolgende Duplikate komprimieren (nur echte Wertwechsel behalten)
-    compact: List[Tuple[int, float]] = []
-    for ts, v in samples:
-        if not compact or not _values_equal(v, compact[-1][1]):
-            compact.append((ts, v))
-
-    if DEBUG:
-        _d(f"[DEBUG] komprimierte Wechselpunkte: {len(compact)}")
-        _d("[DEBUG] letzte 5 Zustände: " + ", ".join(f"{fmt_ts(ts)}=>{v}" for ts, v in compact[-5:]))
-
-    # Den letzten Übergang target_value -> !=target_value suchen
-    last_change_ts: Optional[int] = None
-    for i in range(1, len(compact)):
-        prev_val = compact[i - 1][1]
-        cur_val = compact[i][1]
-        if _values_equal(prev_val, target_value) and not _values_equal(cur_val, target_value):
-            last_change_ts = compact[i][0]  # Zeitpunkt, ab dem der neue (≠target) Wert gilt
+    last_change_ts = vz_transitions.last_transition_since(uuid, float(target_value), lookback_min, timeout=15)
+    _d(f"[DEBUG] Wechselerkennung {uuid} lookback={lookback_min}min (Checkpoint: {vz_transitions.STATE_DIR})")
 
     if last_change_ts is None:
         _d("[DEBUG] kein (target)->(!=target) Wechsel im Fenster gefunden")
@@ -280,21 +151,8 @@ def energy_kwh_from_power_between(uuid: str, from_ts_ms: int, to: str = "now") -
         except Exception:
             pass
 
-    # Tuples sammeln (ts, value)
-    if isinstance(data, dict):
-        tuples = data.get("tuples", [])
-    elif isinstance(data, list):
-        tuples = []
-        for section in data:
-            tuples.extend(section.get("tuples", []))
-    else:
-        tuples = []
-
-    tuples = [t for t in tuples if isinstance(t, (list, tuple)) and len(t) >= 2]
-    try:
-        tuples.sort(key=lambda t: int(t[0]))
-    except Exception:
-        pass
+    # Tupel als Spalten (ts, value), nach ts sortiert
+    cols = vz_columns.decode(payload).finite()
 
     # 2) average * dt
     if isinstance(data_obj, dict) and all(k in data_obj for k in ("average", "from", "to")):
@@ -306,16 +164,8 @@ def energy_kwh_from_power_between(uuid: str, from_ts_ms: int, to: str = "now") -
             pass
 
     # 3) Trapezregel
-    if len(tuples) >= 2:
-        energy_Wh = 0.0
-        prev_ts, prev_p = None, None
-        for tup in tuples:
-            ts_ms = int(tup[0]); p_w = float(tup[1])
-            if prev_ts is not None:
-                dt_h = (ts_ms - prev_ts) / 3_600_000.0
-                energy_Wh += 0.5 * (prev_p + p_w) * dt_h
-            prev_ts, prev_p = ts_ms, p_w
-        return energy_Wh / 1000.0
+    if cols.size >= 2:
+        return cols.trapz_wh() / 1000.0
 
     return 0.0
 
@@ -336,50 +186,22 @@ def next_5_local(now_local: datetime) -> datetime:
     return tomorrow.replace(hour=5, minute=0, second=0, microsecond=0)
 
 
-def get_price_series_minutely(from_local: datetime, to_local: datetime) -> List[Tuple[int, float]]:
+def get_price_series_minutely(from_local: datetime, to_local: datetime) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Liefert [(ts_ms_utc, price), …] im Minutentakt durch Vorwärts-Halten
+    Liefert (ts_ms_utc, price) als Arrays im Minutentakt durch Vorwärts-Halten
     der letzten bekannten Preisprobe (geeignet für 15-min Slots).
     """
-    tz = ch_tz()
     from_utc = from_local.astimezone(timezone.utc)
     to_utc = to_local.astimezone(timezone.utc)
-
-    payload = get_vals_between(UUIDS["Price"], str(int(from_utc.timestamp() * 1000)), str(int(to_utc.timestamp() * 1000)))
-    sections = _normalize_sections(payload)
-
-    # Raw tuples zusammenführen
-    raw: List[Tuple[int, float]] = []
-    for s in sections:
-        for t in _iter_section_tuples(s):
-            try:
-                ts = int(t[0])
-                val = float(t[1])
-                raw.append((ts, val))
-            except Exception:
-                continue
-    raw.sort(key=lambda x: x[0])
-
     start_ms = int(from_utc.timestamp() * 1000)
     end_ms = int(to_utc.timestamp() * 1000)
-    minute = 60_000
-
-    # Fallback: wenn keine Daten → Grid mit Preis 0.0
-    if not raw:
-        return [(ts, 0.0) for ts in range(start_ms, end_ms, minute)]
-
-    # Minutengitter; letzten bekannten Preis „halten“
-    series: List[Tuple[int, float]] = []
-    idx = 0
-    current_val = raw[0][1]
 
-    for ts in range(start_ms, end_ms, minute):
-        while idx + 1 < len(raw) and raw[idx + 1][0] <= ts:
-            idx += 1
-            current_val = raw[idx][1]
-        series.append((ts, current_val))
+    payload = get_vals_between(UUIDS["Price"], str(start_ms), str(end_ms))
+    cols = vz_columns.decode(payload).finite()
 
-    return series
+    # Minutengitter; letzten bekannten Preis „halten“ (ohne Daten: Preis 0.0)
+    grid = np.arange(start_ms, end_ms, 60_000, dtype=np.int64)
+    return grid, cols.hold(grid)
 
 
 # =========================
@@ -393,18 +215,16 @@ def plan_and_write(from_local: datetime, to_local: datetime, minutes_needed: int
     - Gibt Stundenmittel (lokale Stunden) zur Kontrolle aus
     """
     tz = ch_tz()
-    prices = get_price_series_minutely(from_local, to_local)
+    ts_grid, prices = get_price_series_minutely(from_local, to_local)
 
     # Minutenliste [ (ts_ms, price) ]
     total_minutes = int((to_local - from_local).total_seconds() // 60)
     minutes_needed = max(0, min(minutes_needed, total_minutes))
 
-    # Günstigste Minuten wählen
+    # Günstigste Minuten wählen (Preis, bei Gleichstand früher)
+    chosen = np.zeros(ts_grid.size, dtype=bool)
     if minutes_needed > 0:
-        sorted_by_price = sorted(prices, key=lambda x: (x[1], x[0]))
-        chosen_set = set(ts for ts, _ in sorted_by_price[:minutes_needed])
-    else:
-        chosen_set = set()
+        chosen[np.lexsort((ts_grid, prices))[:minutes_needed]] = True
 
     # Bereich vorab löschen (saubere Planung)
     from_ms = int(from_local.astimezone(timezone.utc).timestamp() * 1000)
@@ -414,32 +234,21 @@ def plan_and_write(from_local: datetime, to_local: datetime, minutes_needed: int
     except Exception as e:
         print(f"Warnung: Konnte alten Freigabe-Bereich nicht löschen: {e}")
 
-    # Schreiben (minütlich)
-    written = 0
-    for ts_ms, _price in prices:
-        val = 1 if ts_ms in chosen_set else 0
-        try:
-            post_point(UUIDS["Freigabe_EMob"], ts_ms, val)
-            written += 1
-        except Exception as e:
-            print(f"Warnung: POST @ {ts_ms} fehlgeschlagen: {e}")
+    # Schreiben (minütlich, gebündelt – Einzel-POST nur als Fallback im Client)
+    points = list(zip(ts_grid.tolist(), chosen.astype(int).tolist()))
+    written = post_series(UUIDS["Freigabe_EMob"], points)
+    if written < len(points):
+        print(f"Warnung: nur {written}/{len(points)} Minuten geschrieben")
 
-    print(f"Freigabe geschrieben (Minuten): {written} – davon aktiv: {len(chosen_set)}")
+    print(f"Freigabe geschrieben (Minuten): {written} – davon aktiv: {int(chosen.sum())}")
 
     # Stundenmittel (lokale Stunden) berechnen & ausgeben
-    hourly: Dict[datetime, Tuple[int, int]] = {}
-    for ts_ms, _price in prices:
-        val = 1 if ts_ms in chosen_set else 0
-        dt_loc = datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc).astimezone(tz)
-        hour_key = dt_loc.replace(minute=0, second=0, microsecond=0)
-        s, c = hourly.get(hour_key, (0, 0))
-        hourly[hour_key] = (s + val, c + 1)
+    hours, avg = vz_columns.Columns(ts_grid, chosen.astype(float), np.ones(ts_grid.size, np.int32)).hourly("avg")
 
     print("\n=== Stundenmittel Freigabe_EMob (lokal) ===")
-    for h in sorted(hourly.keys()):
-        s, c = hourly[h]
-        avg = s / c if c else 0.0
-        print(f"{h.strftime('%Y-%m-%d %H:%M %Z')}  ->  {avg:.3f}")
+    for h_ms, a in zip(hours.tolist(), avg.tolist()):
+        h = datetime.fromtimestamp(h_ms / 1000.0, tz=timezone.utc).astimezone(tz)
+        print(f"{h.strftime('%Y-%m-%d %H:%M %Z')}  ->  {a:.3f}")
 
 
 # =========================
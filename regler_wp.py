@@ -1,17 +1,18 @@
-import requests
 import json
 import pprint
 import datetime
 import logging
+import os
 import pytz
-import time
 from pymodbus.client.sync import ModbusTcpClient
 from collections import deque
+from vz_client import Channel, read_snapshot, write_vals
+from modbus_map import ISG, ModbusIOError
+from modbus_poller import read
+from modbus_shadow import Shadow
 
 #######################################################################################################
 # Format URLs
-VZ_GET_URL = "http://192.168.178.49/middleware.php/data/{}.json?from={}"
-VZ_POST_URL = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
 SUNSET_URL = 'https://api.sunrise-sunset.org/json?lat=47.386479&lng=8.252473&formatted=0' 
 
 ########################################################################################################
@@ -55,6 +56,27 @@ UUID = {
 
 # WP Freigabe, ladestation, WP Verbrauch löschen ==> Reserven
 
+# Eingänge pro Durchlauf (werden gesammelt als ein Snapshot gelesen)
+INPUTS = [
+    Channel("T_outdoor", UUID["T_outdoor"], "-0min"),
+    Channel("T_outdoor_24h", UUID["T_outdoor"], "-1440min", tuples=1),  # nur average gebraucht
+    Channel("Freigabe_normalbetrieb", UUID["Freigabe_normalbetrieb"], "-0min"),
+    Channel("PV_Produktion_30", UUID["PV_Produktion"], "-30min"),
+    Channel("Freigabe_WP", UUID["Freigabe_WP"], "-0min"),
+    Channel("T_Raum_EG", UUID["T_Raum_EG"], "-15min", "now"),
+    Channel("T_Raum_OG", UUID["T_Raum_OG"], "-60min", "now"),
+    Channel("t_Verzoegerung_Tag", UUID["t_Verzoegerung_Tag"], "-0min"),
+    Channel("t_Sperrung_Tag", UUID["t_Sperrung_Tag"], "-0min"),
+    Channel("T_Absenk_F", UUID["T_Absenk_F"], "-0min"),
+    Channel("WW_Temp_mitte", UUID["WW_Temp_mitte"], "-1min"),
+    Channel("Freigabe_Solar", UUID["Freigabe_Solar"], "0 min"),
+    Channel("Freigabe_Stromtarif", UUID["Freigabe_Stromtarif"], "0 min"),
+    Channel("PV_Produktion_15", UUID["PV_Produktion"], "-15min"),
+    Channel("T_Puffer_unten", UUID["T_Puffer_unten"], "-20min"),
+    Channel("S_FREIGABE_KÜHLEN", UUID["S_FREIGABE_KÜHLEN"], "-1min"),
+    Channel("T_Raum_OG_24h", UUID["T_Raum_OG"], "-1440min", tuples=1),  # nur average gebraucht
+]
+
 # Parameter Freigabe Heizbetrieb
 FREIGABE_NORMAL_TEMP = 14.5
 FREIGABE_NORMAL_TEMP_HYST = 15
@@ -109,37 +131,18 @@ at_freigabe_kuehlen = 15.0
 at_sperre_kuehlen = 25.0
 
 
-REGISTER = {
-    "Komfort_HK1": 1501,
-    "Eco_HK1": 1502,
-    "Steigung_HK1": 1503,
-    "Komfort_HK2": 1504,
-    "Eco_HK2": 1505,
-    "Steigung_HK2": 1506, 
-    "Betriebsart": 1500,
-    "WW_Eco": 1510,
-    "RT_IST_OG": 587,
-    "RT_SOLL_KK2": 1604
-}
+# Geschriebene Holding-Register der ISG (Adressen in modbus_map.ISG); nur bei Änderung schreiben
+SOLLWERTE = ["Betriebsart", "Komfort_HK1", "Eco_HK1", "Steigung_HK1", "Komfort_HK2",
+             "Eco_HK2", "Steigung_HK2", "WW_Eco", "RT_SOLL_KK2"]
 
-IP_ISG = "192.168.178.36"
+IP_ISG = os.environ.get("ISG_HOST", "192.168.178.36")
+PORT_ISG = int(os.environ.get("ISG_PORT", "502"))
 
-CLIENT = ModbusTcpClient(IP_ISG)
-CLIENT.connect()
+# Verbindung erst beim ersten direkten Zugriff (Schreiben oder kein Modbus-Poller)
+CLIENT = ModbusTcpClient(IP_ISG, port=PORT_ISG)
 
 ###########################################################################################################
 
-def get_vals(uuid, duration="-0min"):
-    # Daten von vz lesen. 
-    req = requests.get(VZ_GET_URL.format(uuid, duration))
-    return req.json()
-
-def write_vals(uuid, val):
-    # Daten auf vz schreiben.
-    poststring = VZ_POST_URL.format(uuid, val)
-    #logging.info("Poststring {}".format(poststring))
-    postreq = requests.post(poststring)
-    #logging.info("Ok? {}".format(postreq.ok))
 
 def main():
     logging.basicConfig(level=logging.INFO)
@@ -150,18 +153,21 @@ def main():
     logging.info("Swiss time: {}".format(now))
     logging.info("*****************************")
 
+    # Alle VZ-Eingänge in einem Snapshot lesen
+    snap = read_snapshot(INPUTS)
+
     #######################################################################################################
     logging.info(f"---------- Prüfung Freigabe / Sperrung Heizgrenze ----------") 
     # Abfrage aktuelle Aussentemperatur
-    t_now = get_vals(UUID["T_outdoor"])["data"]["tuples"][0][1]
+    t_now = snap.first("T_outdoor")
     #t_now = 0
     
     # Abfragen 24h Aussentemperatur und ggf. Freigabe Heizgrenze
-    t_roll_avg_24 = get_vals(UUID["T_outdoor"], duration="-1440min")["data"]["average"]
+    t_roll_avg_24 = snap.average("T_outdoor_24h")
     #t_roll_avg_24 = 0
 
     #Abfragen aktueller Zustand Freigabe Normalbetrieb (Heizgrenze)
-    akt_freigabe_normal = get_vals(UUID["Freigabe_normalbetrieb"], duration="-0min")["data"]["average"]
+    akt_freigabe_normal = snap.average("Freigabe_normalbetrieb")
 
     b_freigabe_normal = 0
     if akt_freigabe_normal == True: 
@@ -187,7 +193,7 @@ def main():
     #b_sperrung_wp = 0
     
     #Abfragen aktuelle Energiebilanz zur Prüfung Freigabe Sonderbetrieb
-    power_balance = get_vals(UUID["PV_Produktion"], duration="-30min")["data"]["average"]
+    power_balance = snap.average("PV_Produktion_30")
     p_net = power_balance 
     #logging.info("PV-Produktion Einschaltschwelle (15min): {}".format(p_net))
     
@@ -197,7 +203,7 @@ def main():
     logging.info("Freigabe_Leistung: {}".format(p_freigabe_now))
   
     #Abfragen aktuelle Freigabe auf Grund Solarüberschuss
-    akt_freigabe_wp = get_vals(UUID["Freigabe_WP"], duration="-0min")["data"]["average"]
+    akt_freigabe_wp = snap.average("Freigabe_WP")
 
     if akt_freigabe_wp == 1:
         if p_net < 10:
@@ -229,19 +235,17 @@ def main():
     T_OG_MAX = 0
     
     #Abfragen aktuelle Raumtemperaturen EG & OG
-    RT_akt_EG = get_vals(UUID["T_Raum_EG"], # Frage aktuelle Raumtemperatur ab. 
-                      duration="-15min&to=now")["data"]["average"] 
+    RT_akt_EG = snap.average("T_Raum_EG") # Aktuelle Raumtemperatur
     
-    RT_akt_OG = get_vals(UUID["T_Raum_OG"], # Frage aktuelle Raumtemperatur ab. 
-                      duration="-60min&to=now")["data"]["average"] 
+    RT_akt_OG = snap.average("T_Raum_OG") # Aktuelle Raumtemperatur
     
     logging.info("Aktuelle Raumtemp EG: {}".format(RT_akt_EG))
     logging.info("Aktueller Raumtemp OG: {}".format(RT_akt_OG))
     
     # Definition Betriebsfreigaben
-    akt_freigabe_verz_Tag = get_vals(UUID["t_Verzoegerung_Tag"], duration="-0min")["data"]["average"]
-    akt_sperrung_Tag = get_vals(UUID["t_Sperrung_Tag"], duration="-0min")["data"]["average"]
-    akt_abesenk = get_vals(UUID["T_Absenk_F"], duration="-0min")["data"]["average"]
+    akt_freigabe_verz_Tag = snap.average("t_Verzoegerung_Tag")
+    akt_sperrung_Tag = snap.average("t_Sperrung_Tag")
+    akt_abesenk = snap.average("T_Absenk_F")
 
     # Aktuelle Sperrung Absenkbetrien Temp zu hoch
     if akt_freigabe_verz_Tag == 1:  
@@ -328,8 +332,10 @@ def main():
     Ww_start = datetime.time(hour=int(ww_start.hour), minute=int((ww_start.hour - int(ww_start.hour))*60)) # Freigabezeit Warmwasser
     Ww_stop = datetime.time(hour=int(ww_stop.hour), minute=int((ww_stop.hour - int(ww_stop.hour))*60)) # Freigabezeit Warmwasser 
         
-    ww_temp = get_vals(UUID["WW_Temp_mitte"], duration="-1min")["data"]["average"]
-    betriebszustand = CLIENT.read_holding_registers(1500, count=1, unit= 1).getRegister(0)
+    ww_temp = snap.average("WW_Temp_mitte")
+    isg_set = Shadow(CLIENT, ISG, SOLLWERTE)
+    isg_set.refresh()  # aktueller Stand der Sollwerte (2 Blockzugriffe)
+    betriebszustand = isg_set.value("Betriebsart")
 
     logging.info("Aktuelle WW-Speichertemp mitte: {}".format(ww_temp))
 
@@ -379,13 +385,13 @@ def main():
     #####################################################################
     logging.info(f"---------- Prüfung Freigabe Solar- & Temperaturoptimiert ----------")
 
-    freigabe_solar = get_vals(UUID["Freigabe_Solar"], duration="0 min")["data"]["average"]
+    freigabe_solar = snap.average("Freigabe_Solar")
     logging.info("Freigabe Solar- & Temperaturoptimiert: {}".format(freigabe_solar))
     
     #####################################################################
     logging.info(f"---------- Prüfung Freigabe Stromtarif ----------")
 
-    freigabe_tarif = get_vals(UUID["Freigabe_Stromtarif"], duration="0 min")["data"]["average"]
+    freigabe_tarif = snap.average("Freigabe_Stromtarif")
     logging.info("Freigabe Stromtarif: {}".format(freigabe_tarif))
     
     ######################################################################
@@ -393,7 +399,7 @@ def main():
     steigung_soll = 0
     
     #Abfragen aktuelle Stromproduktion PV-Anlage
-    power_sol = get_vals(UUID["PV_Produktion"], duration="-15min")["data"]["average"]
+    power_sol = snap.average("PV_Produktion_15")
     
     p_sol = power_sol - p_freigabe_now
 
@@ -405,8 +411,8 @@ def main():
     else:
         steigung_soll = steigung_min
 
-    CLIENT.write_register(REGISTER["Steigung_HK1"], steigung_soll)
-    CLIENT.write_register(REGISTER["Steigung_HK2"], steigung_soll)
+    isg_set.write("Steigung_HK1", steigung_soll)
+    isg_set.write("Steigung_HK2", steigung_soll)
     write_vals(UUID["Steigung_HK"], steigung_soll) 
 
     logging.info("Überschussleistung: {}".format(p_sol))
@@ -417,12 +423,13 @@ def main():
     logging.info(f"----------------Kühlfunktion--------------------")
 
     freigabe_kühlen = 1
-    t_puffer_unten = get_vals(UUID["T_Puffer_unten"], duration="-20min")["data"]["average"]
-    s_freigabe_kühlen = get_vals(UUID["S_FREIGABE_KÜHLEN"], duration="-1min")["data"]["average"]
-    rt_ist_hk_2 = (CLIENT.read_input_registers(REGISTER["RT_IST_OG"], count=1, unit=1).getRegister(0))/10
-    rt_soll_hk_2 = (CLIENT.read_holding_registers(REGISTER["RT_SOLL_KK2"], count=1, unit= 1).getRegister(0))/10 
-    rt_ist_hk_2_puffer = float(get_vals(UUID["T_Raum_OG"], duration="-1440min")["data"]["average"])
-    t_taupunkt = (CLIENT.read_input_registers(590, count=1, unit=1).getRegister(0))/10
+    t_puffer_unten = snap.average("T_Puffer_unten")
+    s_freigabe_kühlen = snap.average("S_FREIGABE_KÜHLEN")
+    isg = read(CLIENT, ISG, ["RT_IST_OG", "Taupunkt"])
+    rt_ist_hk_2 = isg["RT_IST_OG"]
+    rt_soll_hk_2 = isg_set.value("RT_SOLL_KK2")
+    rt_ist_hk_2_puffer = float(snap.average("T_Raum_OG_24h"))
+    t_taupunkt = isg["Taupunkt"]
 
     
     if rt_ist_hk_2 > 30:
@@ -434,15 +441,15 @@ def main():
         freigabe_kühlen = 0
     elif t_puffer_unten <= 17 or t_roll_avg_24 < 20 or b_freigabe_wp or rt_ist_hk_2 < 23:
         freigabe_kühlen = 0
-        CLIENT.write_register(REGISTER["RT_SOLL_KK2"], 280)
+        isg_set.write("RT_SOLL_KK2", 280)
 
     elif t_puffer_unten > 17.5 and t_roll_avg_24 > 20 and b_freigabe_wp and rt_ist_hk_2 > 23:
         freigabe_kühlen = 1
-        CLIENT.write_register(REGISTER["RT_SOLL_KK2"], 230)
+        isg_set.write("RT_SOLL_KK2", 230)
 
     #else:
     #    freigabe_kühlen = 0
-    #    CLIENT.write_register(REGISTER["RT_SOLL_KK2"], 280)
+    #    isg_set.write("RT_SOLL_KK2", 280)
     
    
     write_vals(UUID["S_FREIGABE_KÜHLEN"], (freigabe_kühlen))
@@ -471,56 +478,64 @@ def main():
          
     if ww_time and Ww_ein:
         logging.info(f"WW-Betrieb") 
-        CLIENT.write_register(REGISTER["Betriebsart"], int(5))
-        time.sleep(5)
-        CLIENT.write_register(REGISTER["WW_Eco"], ww_soll*10) 
+        # WW-Sollwert erst, wenn die ISG den Warmwasserbetrieb übernommen hat; das Register
+        # liest sofort 5 zurück, umgeschaltet ist erst nach einigen Sekunden (wie bisher 5 s)
+        if isg_set.write("Betriebsart", int(5)):
+            isg_set.confirm("Betriebsart", 5, settle=5.0)
+        isg_set.write("WW_Eco", ww_soll*10) 
 
     #Freigabe Kühlbetrieb
     elif freigabe_kühlen: #Freigabe Kühlbetrieb
         logging.info(f"Kühlbetrieb")
-        CLIENT.write_register(REGISTER["Betriebsart"], int(2)) # Muss auf Programmbetrieb sein, sonst wird Kühlbetrieb nicht aktiv.
+        isg_set.write("Betriebsart", int(2)) # Muss auf Programmbetrieb sein, sonst wird Kühlbetrieb nicht aktiv.
 
     #Freigabe Sonderbetrieb wenn Heizgrenze erreicht, ausreichend PV-Leistung vorhanden und Freigabe vor Solar- & Temperauroptimum erreicht
     elif (b_freigabe_normal and b_freigabe_wp and freigabe_solar and T_OG_MAX):
         logging.info(f"Komfortbetrieb")
-        CLIENT.write_register(REGISTER["Betriebsart"], int(3))
-        CLIENT.write_register(REGISTER["Komfort_HK1"], int(HK1_max*10))    
-        CLIENT.write_register(REGISTER["Komfort_HK2"], int(HK2_max*10))  
-        CLIENT.write_register(REGISTER["WW_Eco"], 100)
+        isg_set.write("Betriebsart", int(3))
+        isg_set.write("Komfort_HK1", int(HK1_max*10))    
+        isg_set.write("Komfort_HK2", int(HK2_max*10))  
+        isg_set.write("WW_Eco", 100)
                
     #Freigabe Absenkbetrieb wenn Heizperiode aktiv und min RT unterschritten und Tarif freigegeben
     elif (b_freigabe_normal and (T_Freigabe_min == 0) and freigabe_tarif): 
         logging.info(f" Absenkbetrieb") 
-        CLIENT.write_register(REGISTER["Betriebsart"], int(2)) # Muss auf Programmbetrieb sein, sonst wird Silent-Mode in Nacht nicht aktiv.
-        CLIENT.write_register(REGISTER["Eco_HK2"], int(HK2_min*10))   
-        CLIENT.write_register(REGISTER["Eco_HK1"], int(HK1_min*10))
-        CLIENT.write_register(REGISTER["WW_Eco"], 100)
+        isg_set.write("Betriebsart", int(2)) # Muss auf Programmbetrieb sein, sonst wird Silent-Mode in Nacht nicht aktiv.
+        isg_set.write("Eco_HK2", int(HK2_min*10))   
+        isg_set.write("Eco_HK1", int(HK1_min*10))
+        isg_set.write("WW_Eco", 100)
 
     #Freigabe Absenkbetrieb wenn Heizperiode aktiv und RT EG < 21°C
     elif (b_freigabe_normal and RT_akt_EG < 21): 
         logging.info(f" Absenkbetrieb") 
-        CLIENT.write_register(REGISTER["Betriebsart"], int(2)) # Muss auf Programmbetrieb sein, sonst wird Silent-Mode in Nacht nicht aktiv.
-        CLIENT.write_register(REGISTER["Eco_HK2"], int(HK2_min*10))   
-        CLIENT.write_register(REGISTER["Eco_HK1"], int(HK1_min*10))
-        CLIENT.write_register(REGISTER["WW_Eco"], 100)
+        isg_set.write("Betriebsart", int(2)) # Muss auf Programmbetrieb sein, sonst wird Silent-Mode in Nacht nicht aktiv.
+        isg_set.write("Eco_HK2", int(HK2_min*10))   
+        isg_set.write("Eco_HK1", int(HK1_min*10))
+        isg_set.write("WW_Eco", 100)
 
    #Anlage in Bereitschaft schalten wenn Raumtemperatur EG über 21.2°C und nicht ausreichend PV Leistung vorhanden.
     elif ((freigabe_solar == 0) and (freigabe_tarif == 0) or T_Freigabe_min): #T_Freigabe_min b_freigabe_wp == 0
         logging.info(f"Bereitschaftsbetrieb") 
-        CLIENT.write_register(REGISTER["Betriebsart"], int(1))
-        CLIENT.write_register(REGISTER["WW_Eco"], 100)
+        isg_set.write("Betriebsart", int(1))
+        isg_set.write("WW_Eco", 100)
     
     else:
         if betriebszustand == 5:
-            CLIENT.write_register(REGISTER["Betriebsart"], int(1))
-            CLIENT.write_register(REGISTER["WW_Eco"], 100)
+            isg_set.write("Betriebsart", int(1))
+            isg_set.write("WW_Eco", 100)
             logging.info(f"Deaktivieren WW-Betrieb")    
         else:
             logging.info(f"Beibehalten aktuelle Betriebsart") 
 
     CLIENT.close()
+    logging.info("ISG-Sollwerte: {} geschrieben, {} unverändert".format(isg_set.written, isg_set.skipped))
         
     logging.info("********************************")
     
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except ModbusIOError as e:
+        # Metriken (vz_metrics) und Write-behind-Queue werden trotzdem beim Beenden geschrieben
+        logging.error("ISG nicht erreichbar: %s", e)
+        raise SystemExit(1)
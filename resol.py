@@ -2,6 +2,7 @@ import requests
 import json
 import logging
 import pprint
+from vz_client import write_vals
 
 IP_RESOL = "192.168.178.22"
 RESOL_URL = "http://{}/dlx/download/live?sessionAuthUsername=admin&sessionAuthPassword=admin".format(
@@ -30,9 +31,6 @@ UUID = {
 }
 
 
-URL_VZ = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
-
-
 def main():
     print(RESOL_URL)
     req = requests.get(RESOL_URL)
@@ -41,9 +39,7 @@ def main():
     for k, v in RESOL_DATA.items():
         d = decoded_data["headersets"][0]["packets"][0]["field_values"][v]["value"]
         print("{}: {}".format(k,d))
-        poststring = URL_VZ.format(UUID[k], d)
-        postreq = requests.post(poststring)
-        print(postreq.ok)
+        print(write_vals(UUID[k], d))
     
 
 if __name__ == "__main__":
@@ -1,17 +1,16 @@
-import requests
 import json
 import pprint
 import datetime
 import logging
+import os
 import pytz
 import time
-import struct
-from pymodbus.client.sync import ModbusTcpClient
-
-#######################################################################################################
-# Format URLs
-VZ_GET_URL = "http://192.168.178.49/middleware.php/data/{}.json?from={}"
-VZ_POST_URL = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
+import asyncio
+from vz_client import get_vals
+from modbus_map import SEL, ModbusIOError
+from modbus_poller import sample_async
+from modbus_async import AsyncModbus
+from vz_deadband import Deadband, Rule
 
 #######################################################################################################
 # Configuration
@@ -27,102 +26,80 @@ UUID = {
     "P_Netzbezug": 	"8d8af7c0-8c8a-11f0-9d28-a9c875202312"
 }
 
-modbus_host = "192.168.178.40"
-modbus_port = 1502
-unit_id = 1
-reg_pv= 0
-reg_bil = 10
-reg_wp = 20
-###########################################################################################################
+modbus_host = os.environ.get("SEL_HOST", "192.168.178.40")
+modbus_port = int(os.environ.get("SEL_PORT", "1502"))
 
-def get_vals(uuid, duration="-0min"):
-    # Daten von vz lesen. 
-    req = requests.get(VZ_GET_URL.format(uuid, duration))
-    return req.json()
+# Report-by-Exception: unveränderte Werte (v.a. 0 W in der Nacht) nur alle 5 min senden,
+# damit die -15min-Fenster in regler_wp / tarif_costs immer Punkte enthalten
+DEADBAND_DEFAULT = Rule(abs=0.0, heartbeat=300.0)
+###########################################################################################################
 
-def write_vals(uuid, val):
-    # Daten auf vz schreiben.
-    poststring = VZ_POST_URL.format(uuid, val)
-    #logging.info("Poststring {}".format(poststring))
-    postreq = requests.post(poststring)
-    #logging.info("Ok? {}".format(postreq.ok))
    
-def main():  
-    
-    # Create a Modbus TCP client
-    client = ModbusTcpClient(modbus_host, port=modbus_port)
+async def read_sel():
+    # Vom Modbus-Poller, sonst direkt: die drei Blöcke parallel (Plan, Typ und Skalierung aus modbus_map.SEL)
+    async with AsyncModbus(modbus_host, port=modbus_port, unit=SEL.unit) as client:
+        return await sample_async(client, SEL, max_age=5)
 
-    # Connect to the Modbus device
-    client.connect()
-
-    try:
-        # Read the registers as a block
-        res_pv = client.read_input_registers(reg_pv, count=2, unit=unit_id)
-        res_bil = client.read_input_registers(reg_bil, count=2, unit=unit_id)
-        res_wp = client.read_input_registers(reg_wp, count=2, unit=unit_id)
 
-        # Extract the values from the response
-        val_pv = res_pv.registers
-        val_bil = res_bil.registers
-        val_wp = res_wp.registers
+def main():  
+    
+    sample = asyncio.run(read_sel())
+    vals = sample.values
+    ts_ms = sample.ts_ms  # alle Werte mit dem Messzeitpunkt schreiben
 
-        # Combine the two registers into a single byte string
-        byte_string_pv = struct.pack('>HH', val_pv[0], val_pv[1])
-        byte_string_bil = struct.pack('>HH', val_bil[0], val_bil[1])
-        byte_string_wp = struct.pack('>HH', val_wp[0], val_wp[1])
+    parsed_val_pv = int(vals["P_PV"])
+    if parsed_val_pv <= 0:
+        parsed_val_pv = 0
+    else:
+        parsed_val_pv = parsed_val_pv        
+    parsed_val_bil = int(vals["P_Bilanz"])
+    parsed_val_wp = int(vals["P_WP"])
+    val_home = parsed_val_bil+parsed_val_pv
+    if parsed_val_pv <= 0:
+        val_eiv = 0
+    elif parsed_val_bil > 0:
+        val_eiv = parsed_val_pv
+    else:
+        val_eiv = val_home
         
-        # Unpack the byte string as a signed integer (big-endian)
-        parsed_val_pv = int((struct.unpack('>i', byte_string_pv)[0])/100*-1)
-        if parsed_val_pv <= 0:
-            parsed_val_pv = 0
-        else:
-            parsed_val_pv = parsed_val_pv        
-        parsed_val_bil = int((struct.unpack('>i', byte_string_bil)[0])/100)
-        parsed_val_wp = int((struct.unpack('>i', byte_string_wp)[0])/100)
-        val_home = parsed_val_bil+parsed_val_pv
-        if parsed_val_pv <= 0:
-            val_eiv = 0
-        elif parsed_val_bil > 0:
-            val_eiv = parsed_val_pv
-        else:
-            val_eiv = val_home
-            
-        # Print the parsed integer
-        print(f"Parsed Integer PV: {parsed_val_pv}")
-        print(f"Parsed Integer Bil: {parsed_val_bil}")
-        print(f"Parsed Integer WP: {parsed_val_wp}")
-        print(f"Value Home: {val_home}")
-        print(f"Value EIV: {val_eiv}")
-
-    finally:
-        # Close the Modbus connection
-        client.close()
+    # Print the parsed integer
+    print(f"Parsed Integer PV: {parsed_val_pv}")
+    print(f"Parsed Integer Bil: {parsed_val_bil}")
+    print(f"Parsed Integer WP: {parsed_val_wp}")
+    print(f"Value Home: {val_home}")
+    print(f"Value EIV: {val_eiv}")
     
+    db = Deadband(default=DEADBAND_DEFAULT)
+
     akt_betriebszustand = get_vals(UUID["Betriebszustand"], duration="-0min")["data"]["average"]
 
     if akt_betriebszustand == 5:
-        write_vals(UUID["P_Warmepumpe_WW"], parsed_val_wp)
-        write_vals(UUID["P_Warmepumpe_RW"], 0)
+        db.put(UUID["P_Warmepumpe_WW"], parsed_val_wp, ts_ms)
+        db.put(UUID["P_Warmepumpe_RW"], 0, ts_ms)
     else:
-        write_vals(UUID["P_Warmepumpe_RW"], parsed_val_wp)
-        write_vals(UUID["P_Warmepumpe_WW"], 0)
+        db.put(UUID["P_Warmepumpe_RW"], parsed_val_wp, ts_ms)
+        db.put(UUID["P_Warmepumpe_WW"], 0, ts_ms)
 
     if parsed_val_bil > 0:
-        write_vals(UUID["P_Netzbezug"], parsed_val_bil)
+        db.put(UUID["P_Netzbezug"], parsed_val_bil, ts_ms)
     else:
-        write_vals(UUID["P_Netzbezug"], "0") 
+        db.put(UUID["P_Netzbezug"], "0", ts_ms) 
     
-    write_vals(UUID["P_Home_Bilanz"], parsed_val_bil)
-    write_vals(UUID["P_Home_Verbrauch"], val_home)
-    write_vals(UUID["P_PV_Anlage"], parsed_val_pv)
-    write_vals(UUID["P_Warmepumpe"], parsed_val_wp)    
-    write_vals(UUID["P_EIV"], val_eiv) 
+    db.put(UUID["P_Home_Bilanz"], parsed_val_bil, ts_ms)
+    db.put(UUID["P_Home_Verbrauch"], val_home, ts_ms)
+    db.put(UUID["P_PV_Anlage"], parsed_val_pv, ts_ms)
+    db.put(UUID["P_Warmepumpe"], parsed_val_wp, ts_ms)    
+    db.put(UUID["P_EIV"], val_eiv, ts_ms) 
     
 
     
      
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except (ModbusIOError, asyncio.TimeoutError) as e:
+        logging.error("SEL nicht erreichbar: %s", e)
+        raise SystemExit(1)
     
 
 
@@ -10,7 +10,7 @@ sondern (wie gewünscht) um den Faktor 1000 skaliert und in **W** geschrieben.
 - Quelle (lesen):  UUID_P_IRR_FORECAST  (Globalstrahlung in W/m², Stundenende als ts_ms)
 - Ziel  (schreiben):UUID_PV_FORECAST_OUT (PV-Forecast in **W**)
 - Raster: exakt 48 Stunden ab Ende der aktuellen Stunde (Europe/Zurich)
-- Vor dem Schreiben: vorhandene Werte im 48h-Bereich auf der Ziel-UUID löschen
+- Schreiben: 48h-Bereich auf der Ziel-UUID mit dem Bestand abgleichen (nur Änderungen)
 - Konsole: je Stunde lokale Zeit, ts_ms, IRR (W/m²), T_amb (°C), P_PV (**W**)
 
 Umgebungsvariablen (optional):
@@ -23,13 +23,17 @@ Umgebungsvariablen (optional):
   DRY_RUN=1                  → nur ausgeben, nichts löschen/schreiben
   DEBUG=1                    → Debug-Logs
 
-Voraussetzung: pip install requests
+Voraussetzung: pip install requests numpy
 """
 
 import os
 import math
 import sys
+import numpy as np
 import requests
+
+import vz_client
+import vz_columns
 from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta, timezone
 
@@ -61,6 +65,7 @@ LON = float(os.environ.get("LON", "8.2500"))
 USER_AGENT = "pv-forecast-from-vz/1.2"
 TIMEOUT = 25
 DRY_RUN = os.environ.get("DRY_RUN", "0") == "1"
+SYNC_TOL_W = float(os.environ.get("SYNC_TOL_W", "1.0"))  # Änderungen darunter werden nicht neu geschrieben
 
 # PV-Modell
 CONFIG = {
@@ -95,47 +100,28 @@ def next_48h_grid_ms() -> List[int]:
     return grid
 
 # --------------------- Volkszähler I/O ---------------------
-def vz_get_tuples(uuid: str, from_ms: int, to_ms: int) -> List[Tuple[int, float, int]]:
-    """Liest Rohdaten-Tupel [ts_ms, value, count] für UUID im Zeitfenster."""
-    url = f"{VZ_BASE_URL}/data/{uuid}.json"
-    params = {"from": str(from_ms), "to": str(to_ms)}
-    r = requests.get(url, params=params, timeout=TIMEOUT, headers={"User-Agent": USER_AGENT})
-    r.raise_for_status()
-    data = r.json().get("data", {})
-    tuples = data.get("tuples") or []
-    out: List[Tuple[int, float, int]] = []
-    for t in tuples:
-        try:
-            ts = int(t[0])
-            val = float(t[1])
-            qual = int(t[2]) if len(t) > 2 else 1
-            out.append((ts, val, qual))
-        except Exception:
-            continue
-    out.sort(key=lambda x: x[0])
-    return out
-
-def vz_delete_range(uuid: str, from_ms: int, to_ms: int) -> None:
-    """Löscht Werte im Bereich [from_ms, to_ms] auf UUID (erfordert DELETE-Rechte)."""
-    url = f"{VZ_BASE_URL}/data/{uuid}.json"
-    params = {"operation": "delete", "from": str(from_ms), "to": str(to_ms)}
-    if DRY_RUN:
-        print(f"DRY_RUN: DELETE {url} {params}")
-        return
-    r = requests.get(url, params=params, timeout=TIMEOUT, headers={"User-Agent": USER_AGENT})
-    if not r.ok:
-        raise RuntimeError(f"Volkszähler-DELETE fehlgeschlagen ({uuid}): HTTP {r.status_code} – {r.text}")
-
-def vz_write_point(uuid: str, ts_ms: int, value: float) -> None:
-    """Schreibt einen Punkt (**W**) auf UUID (operation=add, ts in ms UTC)."""
-    url = f"{VZ_BASE_URL}/data/{uuid}.json"
-    params = {"operation": "add", "ts": str(ts_ms), "value": f"{float(value):.3f}"}
+VZ = vz_client.VZClient(VZ_BASE_URL, timeout=TIMEOUT, user_agent=USER_AGENT)
+
+def vz_get_columns(uuid: str, from_ms: int, to_ms: int) -> vz_columns.Columns:
+    """Liest Rohdaten für UUID im Zeitfenster als Spalten (ts_ms, value, count)."""
+    return vz_columns.get_columns(VZ, uuid, from_ms, to_ms)
+
+def vz_sync_series(uuid: str, points: List[Tuple[int, float]], from_ms: int, to_ms: int) -> int:
+    """
+    Gleicht [(ts_ms, W), …] im Fenster [from_ms, to_ms] mit dem Bestand ab (erfordert
+    DELETE-Rechte); nur geänderte Stunden werden gelöscht/geschrieben.
+    Rückgabe: Anzahl Punkte im Fenster.
+    """
     if DRY_RUN:
-        print(f"DRY_RUN: POST {url} {params}")
-        return
-    r = requests.post(url, params=params, timeout=TIMEOUT, headers={"User-Agent": USER_AGENT})
-    if not r.ok:
-        raise RuntimeError(f"Volkszähler-POST fehlgeschlagen ({uuid}): HTTP {r.status_code} – {r.text}")
+        print(f"DRY_RUN: Sync {uuid} from={from_ms} to={to_ms} ({len(points)} Punkte)")
+        return 0
+    try:
+        res = VZ.sync_series(uuid, [(ts, round(float(v), 3)) for ts, v in points], from_ms, to_ms,
+                             tolerance=SYNC_TOL_W)
+    except IOError as e:
+        raise RuntimeError(f"Volkszähler-Sync fehlgeschlagen ({uuid}): {e}")
+    print(f"Sync {uuid}: {res.written} geschrieben, {res.deleted} gelöscht, {res.unchanged} unverändert")
+    return res.written + res.unchanged
 
 # --------------------- Sonnenstand & PV-Modell ---------------------
 def solar_position(dt_local: datetime, lat_deg: float, lon_deg: float) -> Dict[str, float]:
@@ -226,31 +212,27 @@ def main() -> int:
         start_ms, end_ms = ts_grid[0], ts_grid[-1]
 
         # 2) IRR W/m² & T_amb °C aus VZ lesen (für das gleiche Fenster)
-        irr_tuples = vz_get_tuples(UUID_P_IRR, start_ms, end_ms)
-        if not irr_tuples:
+        irr_cols = vz_get_columns(UUID_P_IRR, start_ms, end_ms)
+        if not irr_cols.size:
             print("Keine IRR-Werte im gewünschten 48h-Fenster gefunden.", file=sys.stderr)
             return 2
-        irr_map: Dict[int, float] = {ts: val for ts, val, _ in irr_tuples}
+        irr_grid = irr_cols.at(ts_grid, default=0.0)     # fehlende IRR → 0.0
 
-        t_map: Dict[int, float] = {}
         try:
-            t_tuples = vz_get_tuples(UUID_T_OUTDOOR, start_ms, end_ms)
-            t_map = {ts: val for ts, val, _ in t_tuples}
+            amb_grid = vz_get_columns(UUID_T_OUTDOOR, start_ms, end_ms).at(ts_grid, default=15.0)  # fehlende T → 15.0 °C
         except Exception as e:
             print(f"Hinweis: Konnte T_amb nicht laden ({e}) – verwende Fallback 15.0 °C.")
+            amb_grid = np.full(len(ts_grid), 15.0)
 
         # 3) Berechnung exakt für die 48 Zeitpunkte des Gitters
         tz = _tz()
         preview: List[Tuple[str, int, float, float, float]] = []  # local_str, ts_ms, IRR, T_amb, P_W
 
-        for ts_ms in ts_grid:
+        for ts_ms, irr_wm2, amb_c in zip(ts_grid, irr_grid.tolist(), amb_grid.tolist()):
             dt_utc = datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc)
             # Mittelpunktszeit (für Sonnenstand)
             dt_mid_local = (dt_utc - timedelta(minutes=30)).astimezone(tz)
 
-            irr_wm2 = float(irr_map.get(ts_ms, 0.0))     # fehlende IRR → 0.0
-            amb_c   = float(t_map.get(ts_ms, 15.0))      # fehlende T   → 15.0 °C
-
             sun = solar_position(dt_mid_local, LAT, LON)
 
             total_kw = 0.0
@@ -284,20 +266,12 @@ def main() -> int:
         for local_str, ts_ms, irr, amb, p_w in preview:
             print(f"{local_str} | {ts_ms} | {irr:.0f} | {amb:.1f} | {p_w:.1f}")
 
-        # 5) Zielbereich löschen und schreiben (W)
-        print(f"\nLösche vorhandene PV-Forecast-Werte (W) auf {UUID_PV_OUT}: {start_ms} … {end_ms}")
-        vz_delete_range(UUID_PV_OUT, start_ms, end_ms)
-
-        print(f"Schreibe {len(preview)} Stundenpunkte (**W**) nach Volkszähler…")
-        written = 0
-        for _local, ts_ms, _irr, _amb, p_w in preview:
-            try:
-                vz_write_point(UUID_PV_OUT, ts_ms, p_w)
-                written += 1
-            except Exception as e:
-                print(f"Warnung: Schreiben @ ts_ms={ts_ms} fehlgeschlagen: {e}", file=sys.stderr)
+        # 5) Zielbereich mit Bestand abgleichen (W)
+        print(f"\nGleiche {len(preview)} Stundenpunkte (**W**) auf {UUID_PV_OUT} ab: {start_ms} … {end_ms}")
+        written = vz_sync_series(UUID_PV_OUT, [(ts_ms, p_w) for _local, ts_ms, _irr, _amb, p_w in preview],
+                                 start_ms, end_ms)
 
-        print(f"\nFertig – geschrieben: P_PV_forecast (W) = {written} Punkte auf {UUID_PV_OUT}.")
+        print(f"\nFertig – synchronisiert: P_PV_forecast (W) = {written} Punkte auf {UUID_PV_OUT}.")
         if DRY_RUN:
             print("(DRY_RUN aktiv – es wurde nichts in die DB geschrieben.)")
         return 0
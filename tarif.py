@@ -16,9 +16,12 @@ import sys
 import csv
 import logging
 from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
 from dateutil import tz
 import requests
 
+import vz_client
+
 # ===== Konfiguration =====
 BASE_URL = os.environ.get("ESIT_BASE_URL", "https://esit.code-fabrik.ch")
 API_PATH = "/api/v1/metering_code"
@@ -44,6 +47,7 @@ VZ_BASE_URL = os.environ.get("VZ_BASE_URL", "http://192.168.178.49/middleware.ph
 VZ_UUID_PRICE = os.environ.get("VZ_UUID_PRICE", "a1547420-8c87-11f0-ab9a-bd73b64c1942")  # Ziel-UUID
 HTTP_TIMEOUT = 20
 DRY_RUN = os.environ.get("DRY_RUN", "0") == "1"
+SYNC_TOL_RP = 1e-4  # Rp/kWh; Preise mit kleinerer Änderung bleiben stehen
 USER_AGENT = "esit-prices-to-vz/1.0"
 
 # CSV
@@ -56,31 +60,24 @@ logging.basicConfig(
 )
 
 # ---------------- Volkszähler-Helfer ----------------
-def vz_delete_range(uuid: str, from_ts_ms: int, to_ts_ms: int) -> None:
-    """Zeitbereich [from..to] auf UUID löschen (verhindert Duplikate)."""
-    url = f"{VZ_BASE_URL}/data/{uuid}.json"
-    params = {"operation": "delete", "from": str(from_ts_ms), "to": str(to_ts_ms)}
-    if DRY_RUN:
-        logging.info("DRY_RUN: VZ DELETE %s %s", url, params)
-        return
-    r = requests.get(url, params=params, timeout=HTTP_TIMEOUT, headers={"User-Agent": USER_AGENT})
-    if not r.ok:
-        raise RuntimeError(f"Volkszähler-DELETE fehlgeschlagen ({uuid}): HTTP {r.status_code} – {r.text}")
-
-def vz_write_point(uuid: str, ts_ms_utc: int, value_float: float) -> None:
-    """Punkt (ts in ms UTC, value mit Punktnotation) auf UUID schreiben."""
-    url = f"{VZ_BASE_URL}/data/{uuid}.json"
-    params = {
-        "operation": "add",
-        "ts": str(ts_ms_utc),
-        "value": f"{float(value_float):.6f}",
-    }
+VZ = vz_client.VZClient(VZ_BASE_URL, timeout=HTTP_TIMEOUT, user_agent=USER_AGENT)
+
+def vz_sync_series(uuid: str, points: List[Tuple[int, float]], from_ts_ms: int, to_ts_ms: int) -> int:
+    """
+    Reihe [(ts_ms_utc, value), …] im Bereich [from..to] mit dem Bestand abgleichen:
+    nur geänderte Slots löschen/schreiben (keine Duplikate). Rückgabe: Punkte im Bereich.
+    """
     if DRY_RUN:
-        logging.info("DRY_RUN: VZ POST %s %s", url, params)
-        return
-    r = requests.post(url, params=params, timeout=HTTP_TIMEOUT, headers={"User-Agent": USER_AGENT})
-    if not r.ok:
-        raise RuntimeError(f"Volkszähler-POST fehlgeschlagen ({uuid}): HTTP {r.status_code} – {r.text}")
+        logging.info("DRY_RUN: VZ Sync %s from=%s to=%s (%d Punkte)", uuid, from_ts_ms, to_ts_ms, len(points))
+        return 0
+    try:
+        res = VZ.sync_series(uuid, [(ts, round(float(v), 6)) for ts, v in points], from_ts_ms, to_ts_ms,
+                             tolerance=SYNC_TOL_RP)
+    except IOError as e:
+        raise RuntimeError(f"Volkszähler-Sync fehlgeschlagen ({uuid}): {e}")
+    logging.info("VZ Sync %s: %d geschrieben, %d gelöscht, %d unverändert",
+                 uuid, res.written, res.deleted, res.unchanged)
+    return res.written + res.unchanged
 
 # ---------------- ESIT/CSV-Logik ----------------
 def floor_to_quarter(dt: datetime) -> datetime:
@@ -245,33 +242,30 @@ def main():
         print(f"⚠️ CSV konnte nicht gespeichert werden: {e}", file=sys.stderr)
 
     # ---- NEU: Alle Slots in Rp/kWh an Volkszähler schreiben (mit ts=Slot-START) ----
-    # Vorbereitung Zeitbereich zum Löschen
+    # Zeitbereich für den Abgleich
     first_start_ms = to_utc_ms(rows[0][1])
     last_end_ms    = to_utc_ms(rows[-1][2])
 
-    print(f"\nLösche bestehenden Bereich auf {VZ_UUID_PRICE}: {first_start_ms} … {last_end_ms}")
-    try:
-        vz_delete_range(VZ_UUID_PRICE, first_start_ms, last_end_ms)
-    except Exception as e:
-        print(f"⚠️ DELETE fehlgeschlagen: {e}", file=sys.stderr)
-
-    print(f"\nSchreibe {len(rows)} 15-Min-Punkte nach Volkszähler (UUID {VZ_UUID_PRICE})…")
+    print(f"\nGleiche {len(rows)} 15-Min-Punkte mit Volkszähler ab (UUID {VZ_UUID_PRICE}): "
+          f"{first_start_ms} … {last_end_ms}")
     print("Zeit (lokal) | ts_ms_utc | Preis (Rp/kWh)")
 
-    written = 0
+    points = []
     for price_chf, st_local, _en_local in rows:
         ts_ms = to_utc_ms(st_local)                 # Slot-Start als Zeitstempel
         price_rp = price_chf * 100.0                # CHF/kWh → Rp/kWh
         # Konsole zur Kontrolle
         print(f"{st_local.strftime('%Y-%m-%d %H:%M:%S %Z')} | {ts_ms} | {price_rp:.3f}")
-        # Schreiben
-        try:
-            vz_write_point(VZ_UUID_PRICE, ts_ms, price_rp)
-            written += 1
-        except Exception as e:
-            print(f"Warnung: Schreiben @ ts_ms={ts_ms} fehlgeschlagen: {e}", file=sys.stderr)
-
-    print(f"\nFertig – geschrieben: {written}/{len(rows)} Punkte auf {VZ_UUID_PRICE}.")
+        points.append((ts_ms, price_rp))
+
+    # Abgleichen (nur geänderte Slots werden gelöscht/geschrieben)
+    try:
+        written = vz_sync_series(VZ_UUID_PRICE, points, first_start_ms, last_end_ms)
+    except Exception as e:
+        print(f"⚠️ Sync fehlgeschlagen: {e}", file=sys.stderr)
+        written = 0
+
+    print(f"\nFertig – synchronisiert: {written}/{len(rows)} Punkte auf {VZ_UUID_PRICE}.")
     if DRY_RUN:
         print("(DRY_RUN aktiv – es wurde nichts in die DB geschrieben.)")
 
@@ -1,4 +1,3 @@
-import requests
 import json
 import pprint
 import datetime
@@ -6,11 +5,10 @@ import logging
 import pytz
 import time
 from datetime import datetime, timedelta
+from vz_client import get_vals, write_vals
 
 #######################################################################################################
 # Format URLs
-VZ_GET_URL = "http://192.168.178.49/middleware.php/data/{}.json?from={}"
-VZ_POST_URL = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
 SUNSET_URL = 'https://api.sunrise-sunset.org/json?lat=47.386479&lng=8.252473&formatted=0' 
 
 ########################################################################################################
@@ -40,23 +38,9 @@ UUID = {
 
 ###########################################################################################################
 
-def get_vals(uuid, duration="-0min"):
-    # Daten von vz lesen. 
-    req = requests.get(VZ_GET_URL.format(uuid, duration))
-    return req.json()
-
-def write_vals(uuid, val):
-    # Daten auf vz schreiben.
-    poststring = VZ_POST_URL.format(uuid, val)
-    #logging.info("Poststring {}".format(poststring))
-    postreq = requests.post(poststring)
-    #logging.info("Ok? {}".format(postreq.ok))
 
 def get_data(uuid, duration="-15min"):
-    url = VZ_GET_URL.format(uuid, duration)
-    r = requests.get(url)
-    r.raise_for_status()
-    return r.json()
+    return get_vals(uuid, duration)
 
 
 def main():
@@ -1,20 +1,17 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 import time
-import requests
 import json
 import pprint
 import datetime
-import logging
 import sys
+from vz_queue import put_vals
 
 ##############################################################
 # Mit diesem Script werden die an das raspberri pi angeschlossenen Temperatursensoren ausgelesen und die Daten auf vz geladen
 
 ##############################################################
 
-VZ_POST_URL = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
-
 UUID = {
     "Puffer_mitte": "6832c0e0-6523-11ee-9722-2d954a0be504",
     "Puffer_unten": "50dfa7a0-6523-11ee-abd2-81d57ce6290d",
@@ -38,12 +35,6 @@ Offset_RT = 0.1
 
 ##############################################################
 
-def write_vals(uuid, val):
-    poststring = VZ_POST_URL.format(uuid, val)
-    logging.info("Poststring {}".format(poststring))
-    postreq = requests.post(poststring)
-    logging.info("Ok? {}".format(postreq.ok))
-
 def readTempSensor(sensorName) :
     """Aus dem Systembus lese ich die Temperatur der DS18B20 aus."""
     f = open(sensorName, 'r')
@@ -75,13 +66,13 @@ temp_5 =  str(readTempLines(sensor5)[0]+1.4)
 temp_6 =  str(readTempLines(sensor6)[0]+1.4) 
 temp_7 =  str(readTempLines(sensor7)[0]+Offset_RT) 
 
-write_vals(UUID["Puffer_mitte"], temp_1)
-write_vals(UUID["Puffer_unten"], temp_2)
-write_vals(UUID["BWW_mitte"], temp_3)
-write_vals(UUID["BWW_oben"], temp_4)
-write_vals(UUID["HG_VL"], temp_5)
-write_vals(UUID["HG_RL"], temp_6)
-write_vals(UUID["T_Raum"], temp_7)
+put_vals(UUID["Puffer_mitte"], temp_1)
+put_vals(UUID["Puffer_unten"], temp_2)
+put_vals(UUID["BWW_mitte"], temp_3)
+put_vals(UUID["BWW_oben"], temp_4)
+put_vals(UUID["HG_VL"], temp_5)
+put_vals(UUID["HG_RL"], temp_6)
+put_vals(UUID["T_Raum"], temp_7)
 
 print (temp_1)
 print (temp_2)
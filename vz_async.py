@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Asynchroner Volkszähler-Client (aiohttp) für asyncio-basierte Regler.
+
+Gleiche API wie vz_client.VZClient, aber als Coroutinen:
+- get_vals / get_between / get_tuples / read_snapshot laufen parallel (gather)
+- write_vals / write_many / delete_range
+- spawn(coro): Telemetrie "fire-and-forget" nach den Aktor-Schreibzugriffen;
+  drain() bzw. das Verlassen des Kontexts wartet auf alle offenen Tasks
+
+Verwendung:
+  async with AsyncVZClient() as vz:
+      snap = await vz.read_snapshot(INPUTS)
+      ...
+      vz.spawn(vz.write_vals(UUID["I_opt"], i_opt))
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterable, List, Optional, Set, Tuple
+
+import aiohttp
+
+import vz_metrics
+from vz_cache import ReadCache, default_cache, duration_key
+from vz_client import (BULK_CHUNK, POOL_SIZE, TIMEOUT, USER_AGENT, VZ_BASE_URL,
+                       Channel, Point, Snapshot, Value, Window)
+
+
+class AsyncVZClient:
+    """Volkszähler-Middleware über eine aiohttp-Session mit Connection-Pool."""
+
+    def __init__(self, base_url: str = VZ_BASE_URL, timeout: float = TIMEOUT,
+                 pool_size: int = POOL_SIZE, user_agent: str = USER_AGENT,
+                 cache: Optional[ReadCache] = None) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cache = cache if cache is not None else (default_cache() if base_url == VZ_BASE_URL else None)
+        self.pool_size = pool_size
+        self.user_agent = user_agent
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "AsyncVZClient":
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": self.user_agent, "Accept": "application/json"},
+        )
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await self.drain()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _url(self, uuid: str) -> str:
+        return f"{self.base_url}/data/{uuid}.json"
+
+    # -------------------------- Hintergrund-Tasks -----------------------------
+    def spawn(self, coro: Awaitable[Any]) -> asyncio.Task:
+        """Startet eine Coroutine im Hintergrund; Fehler werden nur geloggt."""
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("VZ Hintergrund-Task fehlgeschlagen: %s", task.exception())
+
+    async def drain(self) -> None:
+        """Wartet auf alle mit spawn() gestarteten Tasks."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    @contextlib.asynccontextmanager
+    async def _request(self, method: str, url: str, params: Any = None,
+                       **kwargs: Any) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Einziger Weg zur Middleware; misst Latenz, Bytes und Fehler (vz_metrics)."""
+        op, channel = vz_metrics.op_for(method, params), vz_metrics.channel_for(url)
+        sent = len(json.dumps(kwargs["json"])) if "json" in kwargs else 0
+        t0 = time.monotonic()
+        status, received = 0, 0
+        try:
+            async with self.session.request(method, url, params=params, **kwargs) as r:
+                yield r
+                status = r.status
+                received = len(await r.read())  # bereits gelesener Body ist gepuffert
+        finally:
+            vz_metrics.observe(op, channel, time.monotonic() - t0, sent, received,
+                               error=not 0 < status < 400)
+
+    # -------------------------- Lesen -----------------------------------------
+    async def _get_json(self, url: str, params: Any = None) -> Dict[str, Any]:
+        async with self._request("GET", url, params=params) as r:
+            r.raise_for_status()
+            return await r.json(content_type=None)
+
+    async def get_vals(self, uuid: str, duration: str = "-0min") -> Dict[str, Any]:
+        """Wie vz_client.get_vals: 'duration' wird unverändert in die URL eingesetzt."""
+        if self.cache is not None:
+            hit = self.cache.get(uuid, duration_key(duration))
+            if hit is not None:
+                return {"data": hit}
+        body = await self._fetch_vals(uuid, duration)
+        if self.cache is not None and isinstance(body.get("data"), dict):
+            self.cache.put(uuid, duration_key(duration), body["data"])
+        return body
+
+    async def _fetch_vals(self, uuid: str, duration: str) -> Dict[str, Any]:
+        return await self._get_json(f"{self._url(uuid)}?from={duration}")
+
+    async def get_between(self, uuid: str, frm: str, to: str = "now") -> Dict[str, Any]:
+        return await self._get_json(self._url(uuid), params={"from": str(frm), "to": str(to)})
+
+    async def get_tuples(self, uuid: str, from_ms: int, to_ms: int) -> List[Tuple[int, float, int]]:
+        data = (await self.get_between(uuid, str(int(from_ms)), str(int(to_ms)))).get("data", {})
+        tuples = (data.get("tuples") or []) if isinstance(data, dict) else []
+        out: List[Tuple[int, float, int]] = []
+        for t in tuples:
+            try:
+                out.append((int(t[0]), float(t[1]), int(t[2]) if len(t) > 2 else 1))
+            except Exception:
+                continue
+        out.sort(key=lambda x: x[0])
+        return out
+
+    async def get_multi(self, uuids: List[str], frm: str, to: Optional[str] = None,
+                        tuples: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        params: List[Tuple[str, str]] = [("uuid[]", u) for u in uuids] + [("from", frm)]
+        if to is not None:
+            params.append(("to", to))
+        if tuples is not None:
+            params.append(("tuples", str(int(tuples))))
+        data = (await self._get_json(f"{self.base_url}/data.json", params=params)).get("data", [])
+        sections = data if isinstance(data, list) else [data]
+        return {s["uuid"]: s for s in sections if isinstance(s, dict) and "uuid" in s}
+
+    async def _get_section(self, ch: Channel) -> Dict[str, Any]:
+        duration = ch.duration
+        return (await self._fetch_vals(ch.uuid, duration))["data"]
+
+    async def _read_window(self, window: Window,
+                           channels: List[Channel]) -> Dict[str, Dict[str, Any]]:
+        if len(channels) == 1:
+            return {channels[0].name: await self._get_section(channels[0])}
+        uuids = list(dict.fromkeys(c.uuid for c in channels))
+        try:
+            by_uuid = await self.get_multi(uuids, window[0], window[1], tuples=window[2])
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logging.warning("VZ Multi-Request fehlgeschlagen (%s): %s – Fallback Einzelabfrage", window, e)
+            by_uuid = {}
+        out: Dict[str, Dict[str, Any]] = {}
+        for c in channels:
+            out[c.name] = by_uuid[c.uuid] if c.uuid in by_uuid else await self._get_section(c)
+        return out
+
+    async def read_snapshot(self, channels: Iterable[Channel]) -> Snapshot:
+        """Alle Lesefenster parallel; pro Fenster ein Multi-UUID-Request, Cache-Treffer vorab."""
+        sections: Dict[str, Dict[str, Any]] = {}
+        windows: Dict[Window, List[Channel]] = {}
+        for ch in channels:
+            hit = self.cache.get(ch.uuid, duration_key(ch.duration)) if self.cache is not None else None
+            if hit is not None:
+                sections[ch.name] = hit
+            else:
+                windows.setdefault(ch.window, []).append(ch)
+        parts = await asyncio.gather(*(self._read_window(w, chs) for w, chs in windows.items()))
+        for chs, part in zip(windows.values(), parts):
+            sections.update(part)
+            if self.cache is not None:
+                for ch in chs:
+                    self.cache.put(ch.uuid, duration_key(ch.duration), part[ch.name])
+        return Snapshot(sections)
+
+    # -------------------------- Schreiben / Löschen ----------------------------
+    async def write_vals(self, uuid: str, value: Value, ts_ms: Optional[int] = None) -> bool:
+        params = {"operation": "add", "value": str(value)}
+        if ts_ms is not None:
+            params["ts"] = str(int(ts_ms))
+        async with self._request("POST", self._url(uuid), params=params) as r:
+            if r.status >= 400:
+                logging.error("VZ POST fehlgeschlagen (%s): HTTP %s", uuid, r.status)
+            return r.status < 400
+
+    async def write_many(self, uuid: str, points: Iterable[Point], chunk_size: int = BULK_CHUNK) -> int:
+        tuples = [[int(ts), v if isinstance(v, (int, float)) else float(v)] for ts, v in points]
+        written = 0
+        for i in range(0, len(tuples), chunk_size):
+            chunk = tuples[i:i + chunk_size]
+            try:
+                async with self._request("POST", self._url(uuid), params={"operation": "add"}, json=chunk) as r:
+                    if r.status < 400:
+                        written += len(chunk)
+                        continue
+                    logging.warning("VZ Bulk-POST fehlgeschlagen (%s): HTTP %s – Fallback Einzel-POST",
+                                    uuid, r.status)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning("VZ Bulk-POST fehlgeschlagen (%s): %s – Fallback Einzel-POST", uuid, e)
+            results = await asyncio.gather(*(self.write_vals(uuid, v, ts) for ts, v in chunk),
+                                           return_exceptions=True)
+            written += sum(1 for ok in results if ok is True)
+        return written
+
+    async def delete_range(self, uuid: str, from_ms: int, to_ms: int) -> bool:
+        params = {"operation": "delete", "from": str(int(from_ms)), "to": str(int(to_ms))}
+        async with self._request("GET", self._url(uuid), params=params) as r:
+            if r.status >= 400:
+                logging.error("VZ DELETE fehlgeschlagen (%s): HTTP %s", uuid, r.status)
+            return r.status < 400
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Prozessübergreifender Lese-Cache für häufig gelesene Volkszähler-Kanäle.
+
+- SQLite-Datei im RAM (/dev/shm), von allen Skripten gemeinsam genutzt
+- Schlüssel (uuid, Fenster); "-30min" und "-30min&to=now" sind dasselbe Fenster,
+  weitere Parameter (z.B. tuples=1) gehören zum Fenster
+- TTL pro Kanal (TTLS); Kanäle ohne TTL werden nicht gecacht
+- Fehler im Cache führen nie zum Abbruch, sondern zu einem normalen Request
+
+Eingebunden in vz_client.VZClient (get_vals, read_snapshot) und
+vz_async.AsyncVZClient; die Default-Instanz von vz_client nutzt ihn automatisch.
+
+Umgebungsvariablen (optional):
+  VZ_CACHE   (default: /dev/shm/vz_cache.sqlite; leer = Cache aus)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# ============================== CONFIG ========================================
+_SHM = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+CACHE_PATH = os.environ.get("VZ_CACHE", os.path.join(_SHM, "vz_cache.sqlite"))
+PRUNE_AGE = 3600.0  # s, ältere Einträge werden beim Schreiben entfernt
+
+# TTL in s pro Kanal (Kanäle, die von mehreren Skripten pro Minute gelesen werden)
+TTLS: Dict[str, float] = {
+    "0ece9080-6732-11ee-92bb-d5c31bcb9442": 30.0,  # PV_Produktion (regler_wp, keba_tcp)
+    "756356f0-9396-11f0-a24e-add622cac6cb": 60.0,  # Freigabe_EMob (keba_tcp, tarif_costs)
+}
+
+
+def duration_key(duration: str) -> str:
+    """
+    Normalisiertes Fenster aus einer get_vals-Angabe wie "-30min&to=now&tuples=1":
+    'to=now' entfällt (Default der Middleware), weitere Parameter sortiert.
+    """
+    frm, *rest = duration.split("&")
+    return "&".join([frm] + sorted(p for p in rest if p and p != "to=now"))
+
+
+class ReadCache:
+    """Read-through-Cache der 'data'-Sektion pro (uuid, Fenster)."""
+
+    def __init__(self, path: str = CACHE_PATH, ttls: Optional[Dict[str, float]] = None) -> None:
+        self.path = path
+        self.ttls = TTLS if ttls is None else ttls
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def ttl(self, uuid: str) -> float:
+        return self.ttls.get(uuid, 0.0)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=1, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                               "uuid TEXT, win TEXT, fetched REAL, body TEXT, PRIMARY KEY (uuid, win))")
+        return self._conn
+
+    def get(self, uuid: str, win: str) -> Optional[Dict[str, Any]]:
+        ttl = self.ttl(uuid)
+        if ttl <= 0:
+            return None
+        try:
+            with self._lock:
+                row = self._db().execute("SELECT fetched, body FROM cache WHERE uuid = ? AND win = ?",
+                                         (uuid, win)).fetchone()
+        except sqlite3.Error as e:
+            logging.warning("VZ Cache nicht lesbar (%s): %s", self.path, e)
+            return None
+        if row is None or time.time() - row[0] > ttl:
+            return None
+        return json.loads(row[1])
+
+    def put(self, uuid: str, win: str, section: Dict[str, Any]) -> None:
+        if self.ttl(uuid) <= 0:
+            return
+        now = time.time()
+        try:
+            with self._lock, self._db() as db:
+                db.execute("INSERT OR REPLACE INTO cache (uuid, win, fetched, body) VALUES (?, ?, ?, ?)",
+                           (uuid, win, now, json.dumps(section)))
+                db.execute("DELETE FROM cache WHERE fetched < ?", (now - PRUNE_AGE,))
+        except sqlite3.Error as e:
+            logging.warning("VZ Cache nicht schreibbar (%s): %s", self.path, e)
+
+
+def default_cache() -> Optional[ReadCache]:
+    """Cache für die Default-Instanzen; None wenn über VZ_CACHE="" abgeschaltet."""
+    return ReadCache() if CACHE_PATH else None
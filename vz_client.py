@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Gemeinsamer Volkszähler-Client für alle Skripte.
+
+- Eine keep-alive requests.Session pro Prozess (Connection-Pool) statt
+  requests.get/post mit neuer TCP-Verbindung pro Aufruf
+- Timeout pro Aufruf (Default TIMEOUT, pro Aufruf überschreibbar)
+- Eine API für Lesen (get_vals / get_tuples), Schreiben (write_vals) und
+  Bereich löschen (delete_range)
+- Bulk-Schreiben ganzer Reihen (write_many): ein JSON-Request pro Kanal und
+  Chunk statt ein POST pro Punkt; Einzel-POST nur noch als Fallback
+- Snapshot aller Eingänge eines Reglers (read_snapshot): Kanäle mit gleichem
+  Fenster in einem Multi-UUID-Request (data.json?uuid[]=…), Fenster parallel
+- Serverseitige Verdichtung (group / tuples) und find_last_transition für
+  lange Rückblicke auf Zustandskanäle
+- Forecast-Reihen abgleichen statt neu schreiben (sync_series): nur geänderte
+  oder wegfallende Zeitstempel werden gelöscht bzw. geschrieben
+- Optionaler prozessübergreifender Lese-Cache (vz_cache) für get_vals und
+  read_snapshot; die Default-Instanz nutzt ihn für die Kanäle in vz_cache.TTLS
+- Latenz, Bytes und Fehler pro Kanal/Operation/Skript werden erfasst und beim
+  Prozessende als Prometheus-Textfile exportiert (vz_metrics)
+
+Verwendung:
+  from vz_client import get_vals, write_vals
+  t_now = get_vals(UUID["T_outdoor"])["data"]["tuples"][0][1]
+  write_vals(UUID["WW_Ein"], 1)
+
+Für eine andere Middleware (z.B. vz.wiuhelmtell.ch) eine eigene Instanz anlegen:
+  VZ = VZClient("http://vz.wiuhelmtell.ch/middleware.php")
+
+Umgebungsvariablen (optional):
+  VZ_BASE_URL   (default: http://192.168.178.49/middleware.php)
+  VZ_TIMEOUT    (default: 10 s)
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import vz_metrics
+from vz_cache import ReadCache, default_cache, duration_key
+
+# ============================== CONFIG ========================================
+VZ_BASE_URL = os.environ.get("VZ_BASE_URL", "http://192.168.178.49/middleware.php")
+TIMEOUT = float(os.environ.get("VZ_TIMEOUT", "10"))
+POOL_SIZE = 4
+BULK_CHUNK = 500  # Tupel pro JSON-Request
+USER_AGENT = "vz-client/1.0"
+
+Value = Union[int, float, str]
+Timeout = Optional[float]
+Point = Tuple[int, Value]  # (ts_ms UTC, value)
+
+
+class Channel(NamedTuple):
+    """
+    Eingangskanal: Name im Snapshot, UUID und Lesefenster (from/to wie Middleware).
+    tuples=N lässt die Middleware auf N Tupel verdichten (z.B. 1, wenn nur average
+    bzw. consumption gebraucht wird).
+    """
+    name: str
+    uuid: str
+    frm: str = "-0min"
+    to: Optional[str] = None
+    tuples: Optional[int] = None
+
+    @property
+    def window(self) -> "Window":
+        return (self.frm, self.to, self.tuples)
+
+    @property
+    def duration(self) -> str:
+        """Fenster im get_vals-Format ("-15min&to=now&tuples=1")."""
+        d = self.frm if self.to is None else f"{self.frm}&to={self.to}"
+        return d if self.tuples is None else f"{d}&tuples={int(self.tuples)}"
+
+
+Window = Tuple[str, Optional[str], Optional[int]]  # (from, to, tuples)
+
+
+class SyncResult(NamedTuple):
+    """Ergebnis von sync_series."""
+    written: int
+    deleted: int
+    unchanged: int
+
+
+class Snapshot:
+    """Ergebnis von read_snapshot: 'data'-Sektion der Middleware je Kanalname."""
+
+    def __init__(self, sections: Dict[str, Dict[str, Any]]) -> None:
+        self.sections = sections
+
+    def __getitem__(self, name: str) -> Dict[str, Any]:
+        return self.sections[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections
+
+    def average(self, name: str) -> Optional[float]:
+        return self.sections[name].get("average")
+
+    def consumption(self, name: str) -> Optional[float]:
+        return self.sections[name].get("consumption")
+
+    def tuples(self, name: str) -> List[list]:
+        return self.sections[name].get("tuples") or []
+
+    def first(self, name: str) -> Any:
+        """Wert des ersten Tupels (z.B. aktueller Wert bei from=-0min)."""
+        return self.tuples(name)[0][1]
+
+
+# ============================== CLIENT ========================================
+class VZClient:
+    """Volkszähler-Middleware über eine gepoolte keep-alive Session."""
+
+    def __init__(self, base_url: str = VZ_BASE_URL, timeout: float = TIMEOUT,
+                 pool_size: int = POOL_SIZE, user_agent: str = USER_AGENT,
+                 cache: Optional[ReadCache] = None) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": user_agent, "Accept": "application/json"})
+
+    def _url(self, uuid: str) -> str:
+        return f"{self.base_url}/data/{uuid}.json"
+
+    def _request(self, method: str, url: str, params: Optional[Dict[str, str]] = None,
+                 timeout: Timeout = None, **kwargs: Any) -> requests.Response:
+        """Einziger Weg zur Middleware; misst Latenz, Bytes und Fehler (vz_metrics)."""
+        op, channel = vz_metrics.op_for(method, params), vz_metrics.channel_for(url)
+        t0 = time.monotonic()
+        try:
+            r = self.session.request(method, url, params=params,
+                                     timeout=timeout or self.timeout, **kwargs)
+        except requests.RequestException:
+            vz_metrics.observe(op, channel, time.monotonic() - t0, error=True)
+            raise
+        body = r.request.body if r.request is not None else None
+        vz_metrics.observe(op, channel, time.monotonic() - t0, len(body or b""), len(r.content or b""),
+                           error=not r.ok)
+        return r
+
+    # -------------------------- Lesen -----------------------------------------
+    def get_vals(self, uuid: str, duration: str = "-0min", timeout: Timeout = None) -> Dict[str, Any]:
+        """
+        Liest einen Kanal ab 'duration' (JSON der Middleware).
+        'duration' wird unverändert in die URL eingesetzt, damit bestehende
+        Angaben wie "-15min&to=now" oder "now&to=+900min" weiter funktionieren.
+        Bei einem Cache-Treffer wird nur {"data": …} zurückgegeben.
+        """
+        if self.cache is not None:
+            hit = self.cache.get(uuid, duration_key(duration))
+            if hit is not None:
+                return {"data": hit}
+        body = self._fetch_vals(uuid, duration, timeout=timeout)
+        if self.cache is not None and isinstance(body.get("data"), dict):
+            self.cache.put(uuid, duration_key(duration), body["data"])
+        return body
+
+    def _fetch_vals(self, uuid: str, duration: str, timeout: Timeout = None) -> Dict[str, Any]:
+        r = self._request("GET", f"{self._url(uuid)}?from={duration}", timeout=timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def get_between(self, uuid: str, frm: str, to: str = "now", timeout: Timeout = None,
+                    group: Optional[str] = None, tuples: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Liest einen Kanal im Fenster [from, to] (Dauer, 'now' oder ms UTC).
+        Serverseitige Verdichtung: group ("minute", "hour", "day", …) liefert ein
+        Tupel pro Intervall, tuples=N höchstens N Tupel.
+        """
+        params = {"from": str(frm), "to": str(to)}
+        if group is not None:
+            params["group"] = group
+        if tuples is not None:
+            params["tuples"] = str(int(tuples))
+        r = self._request("GET", self._url(uuid), params=params, timeout=timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def get_tuples(self, uuid: str, from_ms: int, to_ms: int, timeout: Timeout = None,
+                   group: Optional[str] = None, tuples: Optional[int] = None) -> List[Tuple[int, float, int]]:
+        """Tupel [(ts_ms, value, count)] im Fenster (roh oder verdichtet), nach ts sortiert."""
+        data = self.get_between(uuid, str(int(from_ms)), str(int(to_ms)), timeout=timeout,
+                                group=group, tuples=tuples).get("data", {})
+        tuples = (data.get("tuples") or []) if isinstance(data, dict) else []
+        out: List[Tuple[int, float, int]] = []
+        for t in tuples:
+            try:
+                ts = int(t[0]); val = float(t[1]); qual = int(t[2]) if len(t) > 2 else 1
+                out.append((ts, val, qual))
+            except Exception:
+                continue
+        out.sort(key=lambda x: x[0])
+        return out
+
+    def get_multi(self, uuids: List[str], frm: str, to: Optional[str] = None,
+                  timeout: Timeout = None, tuples: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """Mehrere Kanäle mit gleichem Fenster in einem Request; Rückgabe {uuid: data-Sektion}."""
+        params: List[Tuple[str, str]] = [("uuid[]", u) for u in uuids] + [("from", frm)]
+        if to is not None:
+            params.append(("to", to))
+        if tuples is not None:
+            params.append(("tuples", str(int(tuples))))
+        r = self._request("GET", f"{self.base_url}/data.json", params=params, timeout=timeout)
+        r.raise_for_status()
+        data = r.json().get("data", [])
+        sections = data if isinstance(data, list) else [data]
+        return {s["uuid"]: s for s in sections if isinstance(s, dict) and "uuid" in s}
+
+    def _get_section(self, ch: Channel, timeout: Timeout = None) -> Dict[str, Any]:
+        duration = ch.duration
+        return self._fetch_vals(ch.uuid, duration, timeout=timeout)["data"]
+
+    def _read_window(self, window: Window, channels: List[Channel],
+                     timeout: Timeout = None) -> Dict[str, Dict[str, Any]]:
+        if len(channels) == 1:
+            return {channels[0].name: self._get_section(channels[0], timeout=timeout)}
+        uuids = list(dict.fromkeys(c.uuid for c in channels))
+        try:
+            by_uuid = self.get_multi(uuids, window[0], window[1], timeout=timeout, tuples=window[2])
+        except (requests.RequestException, ValueError) as e:
+            logging.warning("VZ Multi-Request fehlgeschlagen (%s): %s – Fallback Einzelabfrage", window, e)
+            by_uuid = {}
+        # Kanäle, die im Multi-Request fehlen, einzeln nachladen
+        return {c.name: by_uuid[c.uuid] if c.uuid in by_uuid else self._get_section(c, timeout=timeout)
+                for c in channels}
+
+    def read_snapshot(self, channels: Iterable[Channel], timeout: Timeout = None) -> Snapshot:
+        """
+        Liest alle Eingänge eines Reglers: ein Multi-UUID-Request pro Lesefenster,
+        die Fenster parallel über den Connection-Pool. Kanäle mit gültigem
+        Cache-Eintrag werden nicht abgefragt.
+        """
+        sections: Dict[str, Dict[str, Any]] = {}
+        windows: Dict[Window, List[Channel]] = {}
+        for ch in channels:
+            hit = self.cache.get(ch.uuid, duration_key(ch.duration)) if self.cache is not None else None
+            if hit is not None:
+                sections[ch.name] = hit
+            else:
+                windows.setdefault(ch.window, []).append(ch)
+        if not windows:
+            return Snapshot(sections)
+        with ThreadPoolExecutor(max_workers=min(len(windows), POOL_SIZE)) as ex:
+            futures = {w: ex.submit(self._read_window, w, chs, timeout) for w, chs in windows.items()}
+            for w, f in futures.items():
+                fetched = f.result()
+                sections.update(fetched)
+                if self.cache is not None:
+                    for ch in windows[w]:
+                        self.cache.put(ch.uuid, duration_key(ch.duration), fetched[ch.name])
+        return Snapshot(sections)
+
+    # -------------------------- Schreiben / Löschen ----------------------------
+    def write_vals(self, uuid: str, value: Value, ts_ms: Optional[int] = None,
+                   timeout: Timeout = None) -> bool:
+        """Schreibt einen Wert (operation=add); ohne ts_ms gilt die Serverzeit."""
+        params = {"operation": "add", "value": str(value)}
+        if ts_ms is not None:
+            params["ts"] = str(int(ts_ms))
+        r = self._request("POST", self._url(uuid), params=params, timeout=timeout)
+        if not r.ok:
+            logging.error("VZ POST fehlgeschlagen (%s): HTTP %s – %s", uuid, r.status_code, r.text[:200])
+        return r.ok
+
+    def write_many(self, uuid: str, points: Iterable[Point], chunk_size: int = BULK_CHUNK,
+                   timeout: Timeout = None, fallback: bool = True) -> int:
+        """
+        Schreibt eine Reihe [(ts_ms, value), …] als JSON-Body [[ts, value], …],
+        ein Request pro Chunk. Schlägt ein Chunk fehl, werden seine Punkte einzeln
+        geschrieben (Fallback, abschaltbar). Rückgabe: Anzahl geschriebener Punkte.
+        """
+        tuples = [[int(ts), v if isinstance(v, (int, float)) else float(v)] for ts, v in points]
+        written = 0
+        for i in range(0, len(tuples), chunk_size):
+            chunk = tuples[i:i + chunk_size]
+            try:
+                r = self._request("POST", self._url(uuid), params={"operation": "add"},
+                                  json=chunk, timeout=timeout)
+                if r.ok:
+                    written += len(chunk)
+                    continue
+                logging.warning("VZ Bulk-POST fehlgeschlagen (%s): HTTP %s", uuid, r.status_code)
+            except requests.RequestException as e:
+                logging.warning("VZ Bulk-POST fehlgeschlagen (%s): %s", uuid, e)
+            if not fallback:
+                break
+            logging.info("VZ Fallback Einzel-POST (%s): %d Punkte", uuid, len(chunk))
+            for ts, v in chunk:
+                try:
+                    if self.write_vals(uuid, v, ts, timeout=timeout):
+                        written += 1
+                except requests.RequestException as e:
+                    logging.error("VZ POST fehlgeschlagen (%s@%s): %s", uuid, ts, e)
+        return written
+
+    def delete_range(self, uuid: str, from_ms: int, to_ms: int, timeout: Timeout = None) -> bool:
+        """Löscht Werte im Bereich [from_ms, to_ms] (inklusive)."""
+        params = {"operation": "delete", "from": str(int(from_ms)), "to": str(int(to_ms))}
+        r = self._request("GET", self._url(uuid), params=params, timeout=timeout)
+        if not r.ok:
+            logging.error("VZ DELETE fehlgeschlagen (%s): HTTP %s – %s", uuid, r.status_code, r.text[:200])
+        return r.ok
+
+    def find_last_transition(self, uuid: str, from_value: float, from_ms: int, to_ms: int,
+                             group: str = "hour", tol: float = 1e-9, timeout: Timeout = None) -> Optional[int]:
+        """
+        Zeitstempel (ms) des letzten Wechsels from_value → anderer Wert in [from_ms, to_ms],
+        ohne das ganze Fenster roh zu laden: zuerst ein Tupel pro Intervall (group),
+        dann nur für Intervalle mit Aktivität (Mittelwert ändert sich gegenüber dem
+        Vorintervall oder ist gemischt) die Rohdaten, vom jüngsten rückwärts, bis der
+        Wechsel gefunden ist. Gedacht für Zustandskanäle mit ganzzahligen Werten.
+        """
+        coarse = self.get_tuples(uuid, from_ms, to_ms, timeout=timeout, group=group)
+        for i in range(len(coarse) - 1, -1, -1):
+            if i > 0 and abs(coarse[i][1] - coarse[i - 1][1]) <= tol and abs(coarse[i][1] - round(coarse[i][1])) <= tol:
+                continue  # konstantes Intervall, gleicher Wert wie davor
+            lo = coarse[i - 1][0] if i > 0 else from_ms
+            raw = self.get_tuples(uuid, lo, coarse[i][0], timeout=timeout)
+            ts = last_transition([(t, v) for t, v, _ in raw], from_value, tol)
+            if ts is not None:
+                return ts
+        return None
+
+    def sync_series(self, uuid: str, points: Iterable[Tuple[int, float]], from_ms: int, to_ms: int,
+                    tolerance: float = 1e-6, timeout: Timeout = None) -> SyncResult:
+        """
+        Bringt den Kanal im Fenster [from_ms, to_ms] auf 'points' [(ts_ms, value), …]:
+        vorhandene Tupel lesen, Werte mit |Δ| <= tolerance stehen lassen, geänderte
+        und wegfallende Zeitstempel löschen (zusammenhängende Läufe als ein Bereich),
+        dann nur neue/geänderte Punkte per write_many schreiben.
+        Kann der Bestand nicht gelesen werden: ganzes Fenster löschen und neu schreiben.
+        """
+        new = {int(ts): float(v) for ts, v in points}
+        try:
+            # Fenster um 1 ms erweitert lesen, damit Punkte genau auf den Grenzen sicher dabei sind
+            existing = {ts: v for ts, v, _ in self.get_tuples(uuid, from_ms - 1, to_ms + 1, timeout=timeout)
+                        if from_ms <= ts <= to_ms}
+        except (requests.RequestException, ValueError) as e:
+            logging.warning("VZ Sync: Bestand nicht lesbar (%s): %s – Fenster wird neu geschrieben", uuid, e)
+            if not self.delete_range(uuid, from_ms, to_ms, timeout=timeout):
+                raise IOError(f"VZ DELETE fehlgeschlagen ({uuid})")
+            return SyncResult(self.write_many(uuid, sorted(new.items()), timeout=timeout), 0, 0)
+
+        keep = {ts for ts, v in existing.items() if ts in new and abs(new[ts] - v) <= tolerance}
+        to_write = [(ts, v) for ts, v in sorted(new.items()) if ts not in keep]
+
+        # Zu löschende Zeitstempel zu Läufen ohne dazwischenliegende behaltene Punkte zusammenfassen
+        runs: List[Tuple[int, int]] = []
+        run_open = False
+        for ts in sorted(existing):
+            if ts in keep:
+                run_open = False
+            elif run_open:
+                runs[-1] = (runs[-1][0], ts)
+            else:
+                runs.append((ts, ts))
+                run_open = True
+        for a, b in runs:
+            if not self.delete_range(uuid, a, b, timeout=timeout):
+                raise IOError(f"VZ DELETE fehlgeschlagen ({uuid})")
+
+        written = self.write_many(uuid, to_write, timeout=timeout) if to_write else 0
+        deleted = len(existing) - len(keep)
+        logging.info("VZ Sync %s: %d geschrieben, %d gelöscht, %d unverändert", uuid, written, deleted, len(keep))
+        return SyncResult(written, deleted, len(keep))
+
+
+def last_transition(samples: Iterable[Tuple[int, float]], from_value: float, tol: float = 1e-9) -> Optional[int]:
+    """Letzter Zeitpunkt in [(ts, value)] (nach ts sortiert), ab dem from_value nicht mehr gilt."""
+    last: Optional[int] = None
+    prev: Optional[float] = None
+    for ts, v in samples:
+        if prev is not None and abs(prev - from_value) <= tol and abs(v - from_value) > tol:
+            last = ts
+        prev = v
+    return last
+
+
+# ============================== DEFAULT-INSTANZ ===============================
+_client: Optional[VZClient] = None
+
+
+def client() -> VZClient:
+    """Prozessweite Instanz für VZ_BASE_URL (wird beim ersten Aufruf angelegt)."""
+    global _client
+    if _client is None:
+        _client = VZClient(cache=default_cache())
+    return _client
+
+
+def get_vals(uuid: str, duration: str = "-0min", timeout: Timeout = None) -> Dict[str, Any]:
+    return client().get_vals(uuid, duration, timeout=timeout)
+
+
+def get_between(uuid: str, frm: str, to: str = "now", timeout: Timeout = None,
+                group: Optional[str] = None, tuples: Optional[int] = None) -> Dict[str, Any]:
+    return client().get_between(uuid, frm, to, timeout=timeout, group=group, tuples=tuples)
+
+
+def get_tuples(uuid: str, from_ms: int, to_ms: int, timeout: Timeout = None,
+               group: Optional[str] = None, tuples: Optional[int] = None) -> List[Tuple[int, float, int]]:
+    return client().get_tuples(uuid, from_ms, to_ms, timeout=timeout, group=group, tuples=tuples)
+
+
+def find_last_transition(uuid: str, from_value: float, from_ms: int, to_ms: int,
+                         group: str = "hour", tol: float = 1e-9, timeout: Timeout = None) -> Optional[int]:
+    return client().find_last_transition(uuid, from_value, from_ms, to_ms, group, tol, timeout=timeout)
+
+
+def read_snapshot(channels: Iterable[Channel], timeout: Timeout = None) -> Snapshot:
+    return client().read_snapshot(channels, timeout=timeout)
+
+
+def write_vals(uuid: str, value: Value, ts_ms: Optional[int] = None, timeout: Timeout = None) -> bool:
+    return client().write_vals(uuid, value, ts_ms, timeout=timeout)
+
+
+def write_many(uuid: str, points: Iterable[Point], chunk_size: int = BULK_CHUNK, timeout: Timeout = None,
+               fallback: bool = True) -> int:
+    return client().write_many(uuid, points, chunk_size, timeout=timeout, fallback=fallback)
+
+
+def delete_range(uuid: str, from_ms: int, to_ms: int, timeout: Timeout = None) -> bool:
+    return client().delete_range(uuid, from_ms, to_ms, timeout=timeout)
+
+
+def sync_series(uuid: str, points: Iterable[Tuple[int, float]], from_ms: int, to_ms: int,
+                tolerance: float = 1e-6, timeout: Timeout = None) -> SyncResult:
+    return client().sync_series(uuid, points, from_ms, to_ms, tolerance, timeout=timeout)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Spaltenweise Darstellung von Volkszähler-Tupeln als NumPy-Arrays.
+
+- decode(payload) macht aus einer Middleware-Antwort (eine oder mehrere
+  Sektionen, [ts, value, count]) direkt zusammenhängende Arrays
+  ts (int64, ms UTC), value (float64), count (int32), nach ts sortiert
+- Sortieren, Filtern, Fensterzuschnitt, Nachschlagen auf einem Zeitgitter,
+  Vorwärts-Halten, Stundenbuckets und Trapez-Integration vektorisiert
+- vz_client bleibt ohne NumPy; dieses Modul setzt auf dessen Roh-JSON auf
+
+Verwendung:
+  from vz_columns import get_columns
+  cols = get_columns(VZ, UUID_P_IRR, start_ms, end_ms)
+  irr = cols.at(ts_grid, default=0.0)
+"""
+
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import vz_client
+from vz_client import Timeout
+
+HOUR_MS = 3_600_000
+
+
+class Columns(NamedTuple):
+    ts: np.ndarray     # int64, ms UTC
+    value: np.ndarray  # float64 (NaN für fehlende Werte)
+    count: np.ndarray  # int32, Anzahl Rohwerte pro Tupel
+
+    @property
+    def size(self) -> int:
+        return int(self.ts.size)
+
+    def _take(self, idx: Any) -> "Columns":
+        return Columns(self.ts[idx], self.value[idx], self.count[idx])
+
+    def sorted(self) -> "Columns":
+        """Stabil nach ts sortiert."""
+        if self.size < 2 or bool(np.all(self.ts[1:] >= self.ts[:-1])):
+            return self
+        return self._take(np.argsort(self.ts, kind="stable"))
+
+    def finite(self) -> "Columns":
+        """Nur Tupel mit gültigem Wert."""
+        return self._take(np.isfinite(self.value))
+
+    def clip(self, from_ms: int, to_ms: int) -> "Columns":
+        """Fenster [from_ms, to_ms] (inklusive); erwartet sortierte Spalten."""
+        lo = np.searchsorted(self.ts, from_ms, side="left")
+        hi = np.searchsorted(self.ts, to_ms, side="right")
+        return self._take(slice(lo, hi))
+
+    def at(self, grid: Iterable[int], default: float = np.nan) -> np.ndarray:
+        """Werte genau auf den Zeitstempeln von grid, sonst default (letzter Wert bei Duplikaten)."""
+        grid_a = np.asarray(list(grid), dtype=np.int64)
+        out = np.full(grid_a.shape, default, dtype=np.float64)
+        if not self.size:
+            return out
+        idx = np.searchsorted(self.ts, grid_a, side="right") - 1
+        ok = idx >= 0
+        ok[ok] = self.ts[idx[ok]] == grid_a[ok]
+        out[ok] = self.value[idx[ok]]
+        return out
+
+    def hold(self, grid: Iterable[int]) -> np.ndarray:
+        """Letzter bekannter Wert <= ts für jeden Gitterpunkt; vor dem ersten Tupel der erste Wert."""
+        grid_a = np.asarray(list(grid), dtype=np.int64)
+        if not self.size:
+            return np.zeros(grid_a.shape, dtype=np.float64)
+        idx = np.searchsorted(self.ts, grid_a, side="right") - 1
+        return self.value[np.clip(idx, 0, None)]
+
+    def hourly(self, agg: str = "last") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Stundenbuckets (Stundenbeginn in ms UTC) und Wert je Stunde; agg "last" oder "avg".
+        Für Zeitzonen mit ganzstündigem UTC-Offset (Europe/Zurich) identisch mit lokalen Stunden.
+        """
+        hours = self.ts - self.ts % HOUR_MS
+        keys, first, inv = np.unique(hours, return_index=True, return_inverse=True)
+        if agg == "avg":
+            sums = np.bincount(inv, weights=self.value, minlength=keys.size)
+            return keys, sums / np.bincount(inv, minlength=keys.size)
+        last = np.append(first[1:], hours.size) - 1
+        return keys, self.value[last]
+
+    def trapz_wh(self) -> float:
+        """Energie [Wh] aus Leistungstupeln [W] per Trapezregel."""
+        if self.size < 2:
+            return 0.0
+        dt_h = np.diff(self.ts) / float(HOUR_MS)
+        return float(np.sum(0.5 * (self.value[1:] + self.value[:-1]) * dt_h))
+
+
+def empty() -> Columns:
+    return Columns(np.empty(0, np.int64), np.empty(0, np.float64), np.empty(0, np.int32))
+
+
+def sections(payload: Any) -> List[dict]:
+    """
+    Liste der Sektionen mit mindestens 'tuples' aus einer Middleware-Antwort
+    ({"data": {...}}, {"data": [{...}, …]} oder direkt eine Tupelliste).
+    """
+    if isinstance(payload, list):
+        if payload and isinstance(payload[0], (list, tuple)):
+            return [{"tuples": payload}]
+        return [s for s in payload if isinstance(s, dict)]
+    if not isinstance(payload, dict):
+        return []
+    if "data" in payload:
+        data = payload["data"]
+        if isinstance(data, list):
+            return [s for s in data if isinstance(s, dict)]
+        if isinstance(data, dict):
+            if "tuples" not in data and isinstance(data.get("data"), list):
+                return data["data"]
+            return [data]
+        return []
+    if isinstance(payload.get("tuples"), list):
+        return [payload]
+    for v in payload.values():
+        if isinstance(v, list) and v and isinstance(v[0], (list, tuple)):
+            return [{"tuples": v}]
+    return []
+
+
+def _num(v: Any) -> float:
+    """Zahl aus einem Tupelfeld ("1,5" und Strings mit Leerzeichen erlaubt); NaN wenn unlesbar."""
+    try:
+        if isinstance(v, str):
+            v = v.strip().replace(",", ".")
+        return float(v)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _decode_tuples(tuples: Any) -> Columns:
+    if not isinstance(tuples, list) or not tuples:
+        return empty()
+    try:
+        arr = np.array(tuples, dtype=np.float64)
+    except (TypeError, ValueError):
+        arr = None  # uneinheitliche Zeilen oder Strings: einzeln auf 3 Spalten bringen
+    if arr is None or arr.ndim != 2 or arr.shape[1] < 2:
+        rows = [(_num(t[0]), _num(t[1]), _num(t[2]) if len(t) > 2 else 1.0) for t in tuples
+                if isinstance(t, (list, tuple)) and len(t) >= 2]
+        if not rows:
+            return empty()
+        arr = np.array(rows, dtype=np.float64)
+    # Tupel ohne gültigen Zeitstempel oder Wert verwerfen
+    arr = arr[np.isfinite(arr[:, 0]) & np.isfinite(arr[:, 1])]
+    count = arr[:, 2] if arr.shape[1] > 2 else np.ones(arr.shape[0])
+    return Columns(arr[:, 0].astype(np.int64), arr[:, 1],
+                   np.nan_to_num(count, nan=1.0).astype(np.int32))
+
+
+def decode(payload: Any) -> Columns:
+    """Alle Sektionen einer Antwort zu einem nach ts sortierten Spaltensatz."""
+    parts = [_decode_tuples(s.get("tuples")) for s in sections(payload)]
+    parts = [p for p in parts if p.size]
+    if not parts:
+        return empty()
+    if len(parts) == 1:
+        return parts[0].sorted()
+    return Columns(*(np.concatenate(c) for c in zip(*parts))).sorted()
+
+
+def get_columns(vz: Optional[vz_client.VZClient], uuid: str, from_ms: int, to_ms: int,
+                timeout: Timeout = None, group: Optional[str] = None) -> Columns:
+    """Wie VZClient.get_tuples, aber als Spalten; nur Tupel mit gültigem Wert."""
+    vz = vz or vz_client.client()
+    payload = vz.get_between(uuid, str(int(from_ms)), str(int(to_ms)), timeout=timeout, group=group)
+    return decode(payload).finite()
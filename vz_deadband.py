@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Report-by-Exception für Telemetrie-Sammler (WP_data, sel).
+
+- Pro Kanal eine Regel: Totband |Δ| > max(abs, rel·|zuletzt gesendet|) und
+  maximaler Abstand zwischen zwei gesendeten Punkten (heartbeat)
+- Unterdrückte Werte werden nicht verworfen, sondern als "gehaltener" Punkt
+  gemerkt: kommt die nächste Änderung, wird zuerst der letzte gehaltene Punkt
+  gesendet, damit Stufen in der Reihe an der richtigen Stelle liegen
+- Zuletzt gesendeter und gehaltener Punkt liegen in einer lokalen SQLite-
+  Datei, damit der Zustand über die einzelnen Cron-Läufe erhalten bleibt
+- Gesendet wird über die Write-behind-Queue (vz_queue.put_vals)
+
+Verwendung:
+  from vz_deadband import Deadband, Rule
+  DB = Deadband({UUID["T_SOLL_HK1"]: Rule(abs=0.0)}, default=Rule(abs=0.15))
+  DB.put(UUID["T_SOLL_HK1"], T_vl_hk1_soll)
+
+Umgebungsvariablen (optional):
+  VZ_DEADBAND   (default: ~/.cache/vz/deadband.sqlite)
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, NamedTuple, Optional
+
+from vz_client import Value
+from vz_queue import put_vals
+
+# ============================== CONFIG ========================================
+STATE_PATH = os.path.expanduser(os.environ.get("VZ_DEADBAND", "~/.cache/vz/deadband.sqlite"))
+HEARTBEAT = 900.0  # s, spätestens dann wird auch ein unveränderter Wert gesendet
+
+
+class Rule(NamedTuple):
+    """Totband absolut (Einheit des Kanals) und relativ (Anteil), Heartbeat in s."""
+    abs: float = 0.0
+    rel: float = 0.0
+    heartbeat: float = HEARTBEAT
+
+
+class Deadband:
+    """Entscheidet pro Punkt, ob er gesendet wird, und merkt sich den Stand."""
+
+    def __init__(self, rules: Optional[Dict[str, Rule]] = None, default: Rule = Rule(),
+                 path: str = STATE_PATH) -> None:
+        self.rules = rules or {}
+        self.default = default
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def rule(self, uuid: str) -> Rule:
+        return self.rules.get(uuid, self.default)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=10)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS deadband ("
+                               "uuid TEXT PRIMARY KEY, sent_ts INTEGER, sent_value REAL, "
+                               "held_ts INTEGER, held_value REAL)")
+        return self._conn
+
+    def _hold(self, uuid: str, ts_ms: int, v: float) -> bool:
+        """True wenn der Punkt unterdrückt wird; sendet ggf. den gehaltenen Punkt vor einer Änderung."""
+        db = self._db()
+        row = db.execute("SELECT sent_ts, sent_value, held_ts, held_value FROM deadband WHERE uuid = ?",
+                         (uuid,)).fetchone()
+        if row is None:
+            return False
+        r = self.rule(uuid)
+        sent_ts, sent_v, held_ts, held_v = row
+        changed = abs(v - sent_v) > max(r.abs, r.rel * abs(sent_v))
+        if not changed and ts_ms - sent_ts < r.heartbeat * 1000:
+            with db:
+                db.execute("UPDATE deadband SET held_ts = ?, held_value = ? WHERE uuid = ?", (ts_ms, v, uuid))
+            return True
+        if changed and held_ts is not None and held_ts > sent_ts:
+            # Stufe erhalten: letzten unterdrückten Wert vor der Änderung nachreichen
+            put_vals(uuid, held_v, held_ts)
+        return False
+
+    def put(self, uuid: str, value: Value, ts_ms: Optional[int] = None) -> bool:
+        """Sendet value, wenn außerhalb des Totbands oder der Heartbeat fällig ist; True wenn gesendet."""
+        if ts_ms is None:
+            ts_ms = int(time.time() * 1000)
+        try:
+            v = float(value)
+        except (TypeError, ValueError):
+            put_vals(uuid, value, ts_ms)  # nicht numerisch: immer senden
+            return True
+
+        # Ohne Zustand lieber jeden Punkt senden als Werte zu verlieren
+        try:
+            if self._hold(uuid, ts_ms, v):
+                return False
+        except sqlite3.Error as e:
+            logging.warning("Deadband-Zustand nicht lesbar (%s): %s", self.path, e)
+        put_vals(uuid, value, ts_ms)
+        try:
+            with self._db() as db:
+                db.execute("INSERT OR REPLACE INTO deadband (uuid, sent_ts, sent_value, held_ts, held_value) "
+                           "VALUES (?, ?, ?, NULL, NULL)", (uuid, ts_ms, v))
+        except sqlite3.Error as e:
+            logging.warning("Deadband-Zustand nicht schreibbar (%s): %s", self.path, e)
+        return True
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lokaler Ersatz für die Volkszähler-Middleware (Benchmarks und Tests ohne Haus).
+
+- Lesen:   GET  /middleware.php/data/{uuid}.json?from=…&to=…[&group=…][&tuples=N]
+           GET  /middleware.php/data.json?uuid[]=…&uuid[]=…&from=…
+- Schreiben: POST …/data/{uuid}.json?operation=add&value=…[&ts=…]
+             oder Bulk mit JSON-Body [[ts, value], …]
+- Löschen: GET/POST …/data/{uuid}.json?operation=delete&from=…&to=…
+- from/to wie die Middleware: ms UTC, "now", relative Angaben ("-15min",
+  "+900min", "-1440 min", "0min", "-2h", "-1day"); Antwort mit tuples
+  [ts, value, count], average (zeitgewichtet), consumption (Wh), min, max, rows
+- Ein Zeitstempel pro Kanal ist eindeutig: doppelte Punkte → HTTP 400
+- Speicher: SQLite-Datei oder ":memory:"
+- Einstellbare Latenz (Mittelwert + Jitter) und Fehlerrate (HTTP 500)
+
+Verwendung:
+  python3 vz_fake_middleware.py --port 8080 --latency 40 --error-rate 0.01
+  VZ_BASE_URL=http://127.0.0.1:8080/middleware.php python3 regler_wp.py
+"""
+
+import argparse
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# ============================== CONFIG ========================================
+HOST = "127.0.0.1"
+PORT = 8080
+PREFIX = "/middleware.php"
+
+UNITS_MS = {
+    "s": 1_000, "sec": 1_000, "second": 1_000, "seconds": 1_000,
+    "min": 60_000, "minute": 60_000, "minutes": 60_000,
+    "h": 3_600_000, "hour": 3_600_000, "hours": 3_600_000,
+    "d": 86_400_000, "day": 86_400_000, "days": 86_400_000,
+    "w": 604_800_000, "week": 604_800_000, "weeks": 604_800_000,
+}
+GROUPS_MS = {"minute": 60_000, "hour": 3_600_000, "day": 86_400_000, "week": 604_800_000}
+
+Row = Tuple[int, float]  # (ts_ms, value)
+
+_REL = re.compile(r"^([+-]?\d+(?:\.\d+)?)\s*([a-z]+)$")
+
+
+class BadRequest(Exception):
+    pass
+
+
+def parse_time(spec: Optional[str], now_ms: int) -> int:
+    """Zeitangabe der Middleware → ms UTC."""
+    if spec is None or spec == "" or spec == "now":
+        return now_ms
+    spec = spec.strip().lower()
+    if re.fullmatch(r"\d{10,}", spec):
+        return int(spec)
+    m = _REL.match(spec)
+    if m and m.group(2) in UNITS_MS:
+        return now_ms + int(float(m.group(1)) * UNITS_MS[m.group(2)])
+    raise BadRequest(f"Ungültige Zeitangabe: {spec!r}")
+
+
+class Store:
+    """Kanaldaten in SQLite; ein Wert pro (uuid, ts)."""
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS data (uuid TEXT, ts INTEGER, value REAL, "
+                          "PRIMARY KEY (uuid, ts))")
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def add(self, uuid: str, rows: List[Row]) -> int:
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany("INSERT INTO data (uuid, ts, value) VALUES (?, ?, ?)",
+                                      [(uuid, int(ts), float(v)) for ts, v in rows])
+        except sqlite3.IntegrityError:
+            raise BadRequest("Duplicate entry (uuid, timestamp)")
+        return len(rows)
+
+    def delete(self, uuid: str, from_ms: int, to_ms: int) -> int:
+        with self.lock, self.conn:
+            return self.conn.execute("DELETE FROM data WHERE uuid = ? AND ts >= ? AND ts <= ?",
+                                     (uuid, from_ms, to_ms)).rowcount
+
+    def window(self, uuid: str, from_ms: int, to_ms: int) -> Tuple[Optional[Row], List[Row]]:
+        """Letzter Punkt vor from (Intervallbeginn) und alle Punkte in [from, to]."""
+        with self.lock:
+            prev = self.conn.execute("SELECT ts, value FROM data WHERE uuid = ? AND ts < ? "
+                                     "ORDER BY ts DESC LIMIT 1", (uuid, from_ms)).fetchone()
+            rows = self.conn.execute("SELECT ts, value FROM data WHERE uuid = ? AND ts >= ? AND ts <= ? "
+                                     "ORDER BY ts", (uuid, from_ms, to_ms)).fetchall()
+        return prev, rows
+
+
+def _pack(rows: List[Row], size: int) -> List[List[Any]]:
+    """Aufeinanderfolgende Punkte zu Gruppen: [letzter ts, Mittelwert, Anzahl]."""
+    out = []
+    for i in range(0, len(rows), size):
+        part = rows[i:i + size]
+        out.append([part[-1][0], sum(v for _, v in part) / len(part), len(part)])
+    return out
+
+
+def section(store: Store, uuid: str, from_ms: int, to_ms: int,
+            group: Optional[str] = None, tuples: Optional[int] = None) -> Dict[str, Any]:
+    prev, rows = store.window(uuid, from_ms, to_ms)
+    if not rows and prev is not None:
+        # Leeres Fenster (z.B. "-0min"): wie die Middleware den letzten Wert liefern
+        rows, prev = [prev], None
+
+    # Zeitgewichtet: ein Tupel gilt für das Intervall seit dem vorherigen Punkt
+    weighted, span = 0.0, 0
+    last_ts = prev[0] if prev is not None else None
+    for ts, v in rows:
+        if last_ts is not None:
+            weighted += v * (ts - last_ts)
+            span += ts - last_ts
+        last_ts = ts
+    values = [v for _, v in rows]
+    average = weighted / span if span else (sum(values) / len(values) if values else 0.0)
+
+    if group is not None:
+        if group not in GROUPS_MS:
+            raise BadRequest(f"Ungültige Gruppierung: {group!r}")
+        buckets: Dict[int, List[Row]] = {}
+        for ts, v in rows:
+            buckets.setdefault((ts - 1) // GROUPS_MS[group], []).append((ts, v))
+        out = [_pack(b, len(b))[0] for _, b in sorted(buckets.items())]
+    else:
+        out = [[ts, v, 1] for ts, v in rows]
+    if tuples is not None and tuples > 0 and len(out) > tuples:
+        size = -(-len(out) // tuples)
+        flat = [(t[0], t[1]) for t in out]
+        out = _pack(flat, size)
+
+    return {
+        "uuid": uuid,
+        "from": prev[0] if prev is not None else (rows[0][0] if rows else from_ms),
+        "to": rows[-1][0] if rows else to_ms,
+        "min": min(rows, key=lambda r: r[1]) if rows else None,
+        "max": max(rows, key=lambda r: r[1]) if rows else None,
+        "average": average,
+        "consumption": weighted / 3_600_000.0,
+        "rows": len(rows),
+        "tuples": out,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: "FakeMiddleware"
+    protocol_version = "HTTP/1.1"  # keep-alive wie der echte Webserver
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _reply(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        self._handle()
+
+    def do_POST(self) -> None:
+        self._handle()
+
+    def _handle(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = self.rfile.read(length) if length else b""
+        srv = self.server
+        if srv.latency_ms > 0 or srv.jitter_ms > 0:
+            time.sleep(max(0.0, random.gauss(srv.latency_ms, srv.jitter_ms)) / 1000.0)
+        if srv.error_rate > 0 and random.random() < srv.error_rate:
+            self._reply(500, {"version": "0.3", "exception": {"type": "Injected", "message": "simulierter Fehler"}})
+            return
+        try:
+            self._reply(200, {"version": "0.3", **self._dispatch(payload)})
+        except BadRequest as e:
+            self._reply(400, {"version": "0.3", "exception": {"type": "BadRequest", "message": str(e)}})
+
+    def _dispatch(self, payload: bytes) -> Dict[str, Any]:
+        url = urlsplit(self.path)
+        q = {k: v for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        one = {k: v[-1] for k, v in q.items()}
+        path = url.path[len(PREFIX):] if url.path.startswith(PREFIX) else url.path
+        now_ms = int(time.time() * 1000)
+        store = self.server.store
+        op = one.get("operation", "")
+        try:
+            tuples = int(one["tuples"]) if "tuples" in one else None
+        except ValueError:
+            raise BadRequest("tuples muss eine Zahl sein")
+
+        if path == "/data.json":
+            frm, to = parse_time(one.get("from"), now_ms), parse_time(one.get("to"), now_ms)
+            return {"data": [section(store, u, frm, to, one.get("group"), tuples) for u in q.get("uuid[]", [])]}
+
+        m = re.fullmatch(r"/data/([0-9a-zA-Z-]+)\.json", path)
+        if not m:
+            raise BadRequest(f"Unbekannter Pfad: {url.path}")
+        uuid = m.group(1)
+
+        if op == "add":
+            if payload:
+                try:
+                    rows = [(int(t[0]), float(t[1])) for t in json.loads(payload)]
+                except (ValueError, TypeError, IndexError):
+                    raise BadRequest("Ungültiger JSON-Body")
+            else:
+                try:
+                    rows = [(int(one.get("ts") or now_ms), float(one["value"]))]
+                except (KeyError, ValueError):
+                    raise BadRequest("value fehlt oder ist ungültig")
+            return {"rows": store.add(uuid, rows)}
+        if op == "delete":
+            frm, to = parse_time(one.get("from"), now_ms), parse_time(one.get("to"), now_ms)
+            return {"rows": store.delete(uuid, frm, to)}
+
+        frm, to = parse_time(one.get("from"), now_ms), parse_time(one.get("to"), now_ms)
+        return {"data": section(store, uuid, frm, to, one.get("group"), tuples)}
+
+
+class FakeMiddleware(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = HOST, port: int = PORT, db: str = ":memory:",
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 verbose: bool = False) -> None:
+        super().__init__((host, port), Handler)
+        self.store = Store(db)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.verbose = verbose
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{PREFIX}"
+
+    def start(self) -> threading.Thread:
+        """Im Hintergrund starten (für Benchmarks im selben Prozess)."""
+        t = threading.Thread(target=self.serve_forever, name="vz-fake", daemon=True)
+        t.start()
+        return t
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Lokaler Ersatz für die Volkszähler-Middleware.")
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--db", default=":memory:", help="SQLite-Datei oder :memory:")
+    ap.add_argument("--latency", type=float, default=0.0, help="mittlere Latenz pro Request [ms]")
+    ap.add_argument("--jitter", type=float, default=0.0, help="Standardabweichung der Latenz [ms]")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Anteil Requests mit HTTP 500 (0…1)")
+    ap.add_argument("--seed", type=int, default=None, help="Zufallsstartwert für reproduzierbare Läufe")
+    ap.add_argument("-v", "--verbose", action="store_true", help="Requests protokollieren")
+    args = ap.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    srv = FakeMiddleware(args.host, args.port, args.db, args.latency, args.jitter, args.error_rate, args.verbose)
+    print(f"VZ-Ersatz läuft: VZ_BASE_URL={srv.base_url}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
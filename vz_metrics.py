@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Latenz- und Volumen-Metriken der Volkszähler-Requests und Modbus-Transaktionen.
+
+- Pro (Skript, Operation read/add/delete, Kanal): Latenz-Histogramm,
+  Anzahl Requests, Fehler, gesendete und empfangene Bytes
+- Erfasst wird in vz_client.VZClient._request und vz_async.AsyncVZClient._request,
+  also auch für die Write-behind-Queue
+- Modbus (modbus_map.call / read / read_async, modbus_shadow): pro (Gerät,
+  Block bzw. Schreibregister) dieselben Werte, getrennt nach Exception-Antworten
+  des Geräts (errors) und ausbleibenden Antworten (timeouts); Bytes als
+  Modbus-TCP-ADU
+- Beim Prozessende (atexit) wird der Lauf zum kumulierten Stand des Skripts
+  addiert (STATE_DIR) und als Prometheus-Textfile für den node-exporter
+  geschrieben (vz_<skript>.prom, modbus_<skript>.prom); optional zusätzlich
+  eine JSON-Zusammenfassung des Laufs. Dauerläufer rufen flush() periodisch auf
+
+Umgebungsvariablen (optional):
+  VZ_METRICS_DIR    Textfile-Verzeichnis des node-exporters
+                    (default: /var/lib/prometheus/node-exporter, falls vorhanden)
+  VZ_METRICS_JSON   Verzeichnis für die JSON-Zusammenfassung pro Lauf (default: aus)
+  VZ_METRICS_STATE  (default: ~/.cache/vz/metrics)
+"""
+
+import atexit
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# ============================== CONFIG ========================================
+TEXTFILE_DIR = os.environ.get("VZ_METRICS_DIR", "/var/lib/prometheus/node-exporter")
+JSON_DIR = os.environ.get("VZ_METRICS_JSON", "")
+STATE_DIR = os.path.expanduser(os.environ.get("VZ_METRICS_STATE", "~/.cache/vz/metrics"))
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # s
+
+SCRIPT = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+
+Key = Tuple[str, str]  # (op, channel); Modbus: (Gerät, Block)
+
+# Art → (Metrik-Präfix, Label-Namen, Beschreibung, [(Feld, Zähler-Suffix, Beschreibung)])
+KINDS: Dict[str, Tuple[str, Tuple[str, str], str, Tuple[Tuple[str, str, str], ...]]] = {
+    "vz": ("vz_request", ("op", "channel"), "Dauer der Volkszaehler-Requests.", (
+        ("errors", "errors_total", "Fehlgeschlagene Requests (Exception oder HTTP >= 400)."),
+        ("bytes_out", "bytes_sent_total", "Gesendete Bytes (Request-Body)."),
+        ("bytes_in", "bytes_received_total", "Empfangene Bytes (Response-Body)."),
+    )),
+    "modbus": ("modbus_request", ("device", "block"), "Dauer der Modbus-Transaktionen.", (
+        ("errors", "errors_total", "Exception-Antworten des Geraets."),
+        ("timeouts", "timeouts_total", "Requests ohne Antwort (Timeout oder Verbindungsfehler)."),
+        ("bytes_out", "bytes_sent_total", "Gesendete Bytes (Modbus-TCP-ADU)."),
+        ("bytes_in", "bytes_received_total", "Empfangene Bytes (Modbus-TCP-ADU)."),
+    )),
+}
+
+_URL_UUID = re.compile(r"/data/([^/?]+)\.json")
+
+
+def op_for(method: str, params: Any) -> str:
+    """read / add / delete aus Methode und 'operation'-Parameter der Middleware."""
+    operation = ""
+    if isinstance(params, dict):
+        operation = str(params.get("operation", ""))
+    if operation in ("add", "delete"):
+        return operation
+    return "add" if method.upper() == "POST" else "read"
+
+
+def channel_for(url: str) -> str:
+    """UUID aus .../data/{uuid}.json, 'multi' für data.json?uuid[]=…"""
+    m = _URL_UUID.search(url)
+    return m.group(1) if m else "multi"
+
+
+def _new_series() -> Dict[str, Any]:
+    return {"count": 0, "errors": 0, "timeouts": 0, "bytes_out": 0, "bytes_in": 0, "seconds": 0.0,
+            "buckets": [0] * len(BUCKETS)}
+
+
+class Metrics:
+    """Threadsichere Sammlung der Messwerte eines Prozesses."""
+
+    def __init__(self) -> None:
+        self._series: Dict[Key, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, op: str, channel: str, seconds: float, bytes_out: int = 0,
+                bytes_in: int = 0, error: bool = False, timeout: bool = False) -> None:
+        with self._lock:
+            s = self._series.setdefault((op, channel), _new_series())
+            s["count"] += 1
+            s["errors"] += int(error)
+            s["timeouts"] += int(timeout)
+            s["bytes_out"] += int(bytes_out)
+            s["bytes_in"] += int(bytes_in)
+            s["seconds"] += seconds
+            for i, le in enumerate(BUCKETS):
+                if seconds <= le:
+                    s["buckets"][i] += 1
+
+    def snapshot(self) -> Dict[Key, Dict[str, Any]]:
+        with self._lock:
+            return {k: dict(v, buckets=list(v["buckets"])) for k, v in self._series.items()}
+
+    def drain(self) -> Dict[Key, Dict[str, Any]]:
+        """Wie snapshot(), danach leeren (für periodischen Export)."""
+        with self._lock:
+            run, self._series = self._series, {}
+        return run
+
+
+def merge(total: Dict[Key, Dict[str, Any]], run: Dict[Key, Dict[str, Any]]) -> None:
+    for key, s in run.items():
+        t = total.setdefault(key, _new_series())
+        for f in ("count", "errors", "timeouts", "bytes_out", "bytes_in", "seconds"):
+            t[f] += s[f]
+        t["buckets"] = [a + b for a, b in zip(t["buckets"], s["buckets"])]
+
+
+def render_prometheus(series: Dict[Key, Dict[str, Any]], script: str = SCRIPT, kind: str = "vz") -> str:
+    """Textfile-Format des node-exporters (kumulierte Zähler, Histogramm in Sekunden)."""
+    prefix, (l1, l2), help_hist, counters = KINDS[kind]
+    out: List[str] = [
+        f"# HELP {prefix}_duration_seconds {help_hist}",
+        f"# TYPE {prefix}_duration_seconds histogram",
+    ]
+    items = sorted(series.items())
+    for (a, b), s in items:
+        lbl = f'script="{script}",{l1}="{a}",{l2}="{b}"'
+        for le, n in zip(BUCKETS, s["buckets"]):
+            out.append(f'{prefix}_duration_seconds_bucket{{{lbl},le="{le:g}"}} {n}')
+        out.append(f'{prefix}_duration_seconds_bucket{{{lbl},le="+Inf"}} {s["count"]}')
+        out.append(f"{prefix}_duration_seconds_sum{{{lbl}}} {s['seconds']:.6f}")
+        out.append(f"{prefix}_duration_seconds_count{{{lbl}}} {s['count']}")
+    for field, suffix, help_ in counters:
+        name = f"{prefix}_{suffix}"
+        out.append(f"# HELP {name} {help_}")
+        out.append(f"# TYPE {name} counter")
+        for (a, b), s in items:
+            out.append(f'{name}{{script="{script}",{l1}="{a}",{l2}="{b}"}} {s[field]}')
+    return "\n".join(out) + "\n"
+
+
+def _write_atomic(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def _to_json(series: Dict[Key, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [dict(s, op=op, channel=ch) for (op, ch), s in sorted(series.items())]
+
+
+def _from_json(rows: List[Dict[str, Any]]) -> Dict[Key, Dict[str, Any]]:
+    out: Dict[Key, Dict[str, Any]] = {}
+    for r in rows:
+        s = _new_series()
+        s.update({k: r[k] for k in s if k in r})
+        if len(s["buckets"]) != len(BUCKETS):
+            continue  # andere Bucket-Grenzen: alten Stand verwerfen
+        out[(r["op"], r["channel"])] = s
+    return out
+
+
+def export(m: Optional["Metrics"] = None, script: str = SCRIPT, kind: str = "vz") -> None:
+    """Lauf zum kumulierten Stand addieren, Textfile und optional JSON schreiben."""
+    run = (m or _INSTANCES[kind]).drain()
+    if not run:
+        return
+    state_path = os.path.join(STATE_DIR, f"{script}.json" if kind == "vz" else f"{kind}_{script}.json")
+    total: Dict[Key, Dict[str, Any]] = {}
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            total = _from_json(json.load(f))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning("VZ Metriken: Stand unlesbar (%s): %s – beginne neu", state_path, e)
+    merge(total, run)
+    try:
+        _write_atomic(state_path, json.dumps(_to_json(total)))
+        if TEXTFILE_DIR and os.path.isdir(TEXTFILE_DIR):
+            _write_atomic(os.path.join(TEXTFILE_DIR, f"{kind}_{script}.prom"),
+                          render_prometheus(total, script, kind))
+        if JSON_DIR:
+            _write_atomic(os.path.join(JSON_DIR, f"{kind}_{script}.json"),
+                          json.dumps({"script": script, "series": _to_json(run)}, indent=1))
+    except OSError as e:
+        logging.warning("VZ Metriken nicht schreibbar: %s", e)
+
+
+def flush(script: str = SCRIPT) -> None:
+    """Alle Arten exportieren; Dauerläufer (Poller, Regelschleife) rufen das periodisch auf."""
+    for kind in KINDS:
+        export(script=script, kind=kind)
+
+
+# ============================== DEFAULT-INSTANZ ===============================
+metrics = Metrics()
+modbus = Metrics()
+_INSTANCES: Dict[str, Metrics] = {"vz": metrics, "modbus": modbus}
+# Beim Import registriert, damit der Export nach dem Flush der Write-behind-Queue läuft (atexit: LIFO)
+atexit.register(flush)
+
+
+def observe(op: str, channel: str, seconds: float, bytes_out: int = 0,
+            bytes_in: int = 0, error: bool = False) -> None:
+    metrics.observe(op, channel, seconds, bytes_out, bytes_in, error)
+
+
+def observe_modbus(device: str, block: str, seconds: float, bytes_out: int = 0,
+                   bytes_in: int = 0, error: bool = False, timeout: bool = False) -> None:
+    modbus.observe(device, block, seconds, bytes_out, bytes_in, error, timeout)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Write-behind-Queue für Volkszähler-Telemetrie.
+
+- put_vals(uuid, value) kehrt sofort zurück; der Zeitstempel wird beim
+  Einreihen gesetzt (oder explizit übergeben), nicht erst beim Senden
+- Ein Hintergrund-Thread sammelt die Punkte und schreibt sie pro Kanal als
+  Bulk-Request (vz_client.write_many)
+- Was nicht gesendet werden kann, landet im lokalen SQLite-Spool und wird
+  beim nächsten Flush zuerst und in Einfügereihenfolge nachgeliefert. Beim
+  Nachliefern werden die gespoolten Zeitstempel pro Kanal vorher gelöscht,
+  damit ein bereits angekommener Punkt (Timeout nach dem Schreiben) den
+  Bulk-Request nicht dauerhaft blockiert; Punkte anderer Skripte dazwischen
+  bleiben stehen. Ein Lock verhindert paralleles Nachliefern durch mehrere
+  Skripte
+- Beim Prozessende wird höchstens FLUSH_TIMEOUT s gewartet; Reste gehen in
+  den Spool
+
+Verwendung:
+  from vz_queue import put_vals
+  put_vals(UUID["P_PV_Anlage"], parsed_val_pv)
+
+Umgebungsvariablen (optional):
+  VZ_SPOOL          (default: ~/.cache/vz/spool.sqlite)
+  VZ_FLUSH_TIMEOUT  (default: 5 s)
+"""
+
+import atexit
+import fcntl
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+import vz_client
+from vz_client import BULK_CHUNK, Value
+
+# ============================== CONFIG ========================================
+SPOOL_PATH = os.path.expanduser(os.environ.get("VZ_SPOOL", "~/.cache/vz/spool.sqlite"))
+FLUSH_TIMEOUT = float(os.environ.get("VZ_FLUSH_TIMEOUT", "5"))
+FLUSH_INTERVAL = 0.5  # s, Sammelzeit für einen Batch
+SEND_TIMEOUT = 5.0    # s, Timeout pro Bulk-Request
+RETRY_INTERVAL = 30.0 # s, Wartezeit nach fehlgeschlagenem Nachliefern
+
+Item = Tuple[str, int, Value]  # (uuid, ts_ms, value)
+
+
+class Spool:
+    """Append-only-Spool in SQLite; Reihenfolge über die autoincrement-ID."""
+
+    def __init__(self, path: str = SPOOL_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=10)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS spool ("
+                          "id INTEGER PRIMARY KEY AUTOINCREMENT, uuid TEXT, ts INTEGER, value REAL)")
+        self.conn.commit()
+        self._lock_file = open(path + ".lock", "a")
+
+    def try_lock(self) -> bool:
+        """Exklusives Nachliefern über Prozessgrenzen (nicht blockierend)."""
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def unlock(self) -> None:
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def append(self, items: List[Item]) -> None:
+        with self.conn:
+            self.conn.executemany("INSERT INTO spool (uuid, ts, value) VALUES (?, ?, ?)",
+                                  [(u, int(ts), float(v)) for u, ts, v in items])
+
+    def head(self, limit: int) -> List[Tuple[int, str, int, float]]:
+        return self.conn.execute("SELECT id, uuid, ts, value FROM spool ORDER BY id LIMIT ?",
+                                 (limit,)).fetchall()
+
+    def remove(self, ids: List[int]) -> None:
+        with self.conn:
+            self.conn.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in ids])
+
+    def close(self) -> None:
+        self.conn.close()
+        self._lock_file.close()
+
+
+class WriteQueue:
+    """Nimmt Punkte ohne Blockieren an und schreibt sie im Hintergrund."""
+
+    def __init__(self, vz: Optional[vz_client.VZClient] = None, spool_path: str = SPOOL_PATH,
+                 flush_interval: float = FLUSH_INTERVAL, chunk_size: int = BULK_CHUNK) -> None:
+        self.vz = vz or vz_client.client()
+        self.spool_path = spool_path
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+        self._q: "queue.Queue[Item]" = queue.Queue()
+        self._stop = threading.Event()
+        self._deadline: Optional[float] = None
+        self._next_retry = 0.0
+        self._thread = threading.Thread(target=self._run, name="vz-queue", daemon=True)
+        self._thread.start()
+
+    def put(self, uuid: str, value: Value, ts_ms: Optional[int] = None) -> None:
+        if ts_ms is None:
+            ts_ms = int(time.time() * 1000)
+        self._q.put_nowait((uuid, int(ts_ms), value))
+
+    def close(self, timeout: float = FLUSH_TIMEOUT) -> None:
+        """Restliche Punkte senden; nach 'timeout' s wird nur noch gespoolt."""
+        self._deadline = time.monotonic() + timeout
+        self._stop.set()
+        self._thread.join(timeout + SEND_TIMEOUT)
+
+    # -------------------------- Hintergrund-Thread ----------------------------
+    def _expired(self) -> bool:
+        return self._deadline is not None and time.monotonic() > self._deadline
+
+    def _take(self) -> List[Item]:
+        items: List[Item] = []
+        try:
+            items.append(self._q.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return items
+        while True:
+            try:
+                items.append(self._q.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _send(self, items: List[Item], replace: bool = False) -> List[int]:
+        """
+        Sendet pro Kanal in Reihenfolge; Rückgabe: Indizes der nicht gesendeten Punkte.
+        replace=True löscht vorher die Zeitstempel der Punkte (idempotentes Nachliefern).
+        """
+        by_uuid: Dict[str, List[int]] = OrderedDict()
+        for i, (uuid, _, _) in enumerate(items):
+            by_uuid.setdefault(uuid, []).append(i)
+        failed: List[int] = []
+        for uuid, idx in by_uuid.items():
+            sent = 0
+            if not self._expired():
+                try:
+                    if replace:
+                        self._delete_spooled(uuid, [items[i][1] for i in idx])
+                    sent = self.vz.write_many(uuid, [(items[i][1], items[i][2]) for i in idx],
+                                              self.chunk_size, timeout=SEND_TIMEOUT, fallback=False)
+                except Exception as e:
+                    logging.warning("VZ Queue: Senden fehlgeschlagen (%s): %s", uuid, e)
+            failed.extend(idx[sent:])
+        return sorted(failed)
+
+    def _delete_spooled(self, uuid: str, ts: List[int]) -> None:
+        """
+        Löscht nur die gespoolten Zeitstempel, die schon im Kanal stehen; aufeinanderfolgende
+        werden zu einem Bereich zusammengefasst (wie VZClient.sync_series). Punkte, die andere
+        Skripte in der Zwischenzeit geschrieben haben, trennen die Bereiche und bleiben stehen.
+        """
+        spooled = set(ts)
+        lo, hi = min(spooled), max(spooled)
+        runs: List[Tuple[int, int]]
+        try:
+            # Fenster um 1 ms erweitert lesen, damit Punkte genau auf den Grenzen sicher dabei sind
+            existing = [t for t, _, _ in self.vz.get_tuples(uuid, lo - 1, hi + 1, timeout=SEND_TIMEOUT)
+                        if lo <= t <= hi]
+        except (requests.RequestException, ValueError) as e:
+            logging.warning("VZ Queue: Bestand nicht lesbar (%s): %s – Zeitstempel einzeln löschen", uuid, e)
+            runs = [(t, t) for t in sorted(spooled)]
+        else:
+            runs = []
+            run_open = False
+            for t in existing:
+                if t not in spooled:
+                    run_open = False
+                elif run_open:
+                    runs[-1] = (runs[-1][0], t)
+                else:
+                    runs.append((t, t))
+                    run_open = True
+        for a, b in runs:
+            if not self.vz.delete_range(uuid, a, b, timeout=SEND_TIMEOUT):
+                raise IOError("delete_range fehlgeschlagen")
+
+    def _replay(self, spool: Spool) -> bool:
+        """Spool in Einfügereihenfolge nachliefern; False wenn noch Reste übrig sind."""
+        if time.monotonic() < self._next_retry:
+            return False
+        if not spool.try_lock():
+            return not spool.head(1)
+        self._next_retry = time.monotonic() + RETRY_INTERVAL
+        try:
+            while not self._expired():
+                rows = spool.head(self.chunk_size)
+                if not rows:
+                    self._next_retry = 0.0
+                    return True
+                failed = set(self._send([(u, ts, v) for _, u, ts, v in rows], replace=True))
+                spool.remove([r[0] for i, r in enumerate(rows) if i not in failed])
+                logging.info("VZ Queue: %d Punkte aus dem Spool nachgeliefert", len(rows) - len(failed))
+                if failed:
+                    return False
+            return False
+        finally:
+            spool.unlock()
+
+    def _run(self) -> None:
+        spool = Spool(self.spool_path)
+        backlog = not self._replay(spool)
+        while True:
+            stopping = self._stop.is_set()
+            items = self._take()
+            if items and backlog:
+                # Reihenfolge wahren: solange der Spool nicht leer ist, hinten anhängen
+                spool.append(items)
+                backlog = not self._replay(spool)
+            elif items:
+                failed = self._send(items)
+                if failed:
+                    spool.append([items[i] for i in failed])
+                    backlog = True
+            elif backlog and not self._expired():
+                backlog = not self._replay(spool)
+            if stopping and self._q.empty():
+                break
+        spool.close()
+
+
+# ============================== DEFAULT-INSTANZ ===============================
+_queue: Optional[WriteQueue] = None
+_lock = threading.Lock()
+
+
+def write_queue() -> WriteQueue:
+    """Prozessweite Queue; Flush beim Prozessende über atexit."""
+    global _queue
+    with _lock:
+        if _queue is None:
+            _queue = WriteQueue()
+            atexit.register(_queue.close)
+    return _queue
+
+
+def put_vals(uuid: str, value: Value, ts_ms: Optional[int] = None) -> None:
+    write_queue().put(uuid, value, ts_ms)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Inkrementelle Erkennung des letzten Zustandswechsels auf einem VZ-Kanal.
+
+- Checkpoint pro (Kanal, Ausgangswert) als JSON-Datei in STATE_DIR:
+  zuletzt verarbeiteter Zeitstempel, Wert dort und letzter gefundener Wechsel
+- Jeder Lauf liest nur die Rohdaten seit dem Checkpoint (O(neue Daten));
+  ein Vollscan (vz_client.find_last_transition) nur ohne Checkpoint oder wenn
+  dieser älter als das Lookback-Fenster ist
+- Die jüngsten SETTLE_MIN Minuten werden ausgewertet, aber nicht in den
+  Checkpoint übernommen: dort können über die Write-behind-Queue (vz_queue)
+  noch Punkte nachkommen
+
+Verwendung:
+  from vz_transitions import last_transition_since
+  ts = last_transition_since(UUIDS["Cable_State"], 1, lookback_min=4320)
+
+Umgebungsvariablen (optional):
+  VZ_STATE_DIR   (default: ~/.cache/vz/state)
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+import vz_client
+from vz_client import Timeout, last_transition
+
+# ============================== CONFIG ========================================
+STATE_DIR = os.path.expanduser(os.environ.get("VZ_STATE_DIR", "~/.cache/vz/state"))
+SETTLE_MIN = 2     # min, so lange wird das Ende der Reihe noch nicht festgeschrieben
+TAIL_MIN = 60      # min, Rohdaten für den Endwert nach einem Vollscan
+
+
+class TransitionCheckpoint:
+    """Persistenter Stand der Wechselerkennung für einen Kanal und Ausgangswert."""
+
+    def __init__(self, uuid: str, from_value: float, state_dir: str = STATE_DIR) -> None:
+        self.uuid = uuid
+        self.from_value = float(from_value)
+        self.path = os.path.join(state_dir, f"transition_{uuid}_{self.from_value:g}.json")
+        self.last_ms: Optional[int] = None         # letzter festgeschriebener Rohpunkt
+        self.last_value: Optional[float] = None    # Wert an last_ms
+        self.transition_ms: Optional[int] = None   # letzter Wechsel from_value → anderer Wert
+
+    def load(self) -> bool:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state: Dict[str, Any] = json.load(f)
+            self.last_ms = int(state["last_ms"])
+            self.last_value = float(state["last_value"])
+            self.transition_ms = None if state.get("transition_ms") is None else int(state["transition_ms"])
+            return True
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning("Checkpoint unlesbar (%s): %s – Vollscan", self.path, e)
+            return False
+
+    def save(self) -> None:
+        state = {"uuid": self.uuid, "from_value": self.from_value, "last_ms": self.last_ms,
+                 "last_value": self.last_value, "transition_ms": self.transition_ms}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.warning("Checkpoint nicht schreibbar (%s): %s", self.path, e)
+
+    def _commit(self, samples: List[Tuple[int, float]], settle_ms: int) -> None:
+        """Übernimmt die Punkte bis settle_ms in den Checkpoint."""
+        settled = [s for s in samples if s[0] <= settle_ms]
+        if not settled:
+            return
+        ts = last_transition(settled, self.from_value)
+        if ts is not None:
+            self.transition_ms = ts
+        self.last_ms, self.last_value = settled[-1]
+
+    def full_scan(self, vz: vz_client.VZClient, from_ms: int, now_ms: int,
+                  timeout: Timeout = None) -> Optional[int]:
+        found = vz.find_last_transition(self.uuid, self.from_value, from_ms, now_ms, timeout=timeout)
+        self.last_ms = self.last_value = None
+        tail_from = max(from_ms, now_ms - TAIL_MIN * 60_000)
+        tail = [(t, v) for t, v, _ in vz.get_tuples(self.uuid, tail_from, now_ms, timeout=timeout)]
+        self._commit(tail, now_ms - SETTLE_MIN * 60_000)
+        self.transition_ms = found
+        # Ohne Endwert kein Checkpoint: beim nächsten Lauf wieder Vollscan
+        if self.last_ms is not None:
+            self.save()
+        return found
+
+    def update(self, vz: vz_client.VZClient, now_ms: int, timeout: Timeout = None) -> Optional[int]:
+        """Rohdaten seit last_ms auswerten; Rückgabe inkl. noch nicht festgeschriebener Punkte."""
+        assert self.last_ms is not None and self.last_value is not None
+        new = [(t, v) for t, v, _ in vz.get_tuples(self.uuid, self.last_ms, now_ms, timeout=timeout)
+               if t > self.last_ms]
+        samples = [(self.last_ms, self.last_value)] + new
+        latest = last_transition(samples, self.from_value)
+        self._commit(samples, now_ms - SETTLE_MIN * 60_000)
+        self.save()
+        return latest if latest is not None else self.transition_ms
+
+
+def last_transition_since(uuid: str, from_value: float, lookback_min: int,
+                          vz: Optional[vz_client.VZClient] = None, state_dir: str = STATE_DIR,
+                          timeout: Timeout = None) -> Optional[int]:
+    """
+    Zeitstempel (ms, UTC) des letzten Wechsels from_value → anderer Wert innerhalb
+    der letzten lookback_min Minuten; None wenn es im Fenster keinen gibt.
+    """
+    vz = vz or vz_client.client()
+    now_ms = int(time.time() * 1000)
+    from_ms = now_ms - lookback_min * 60_000
+    cp = TransitionCheckpoint(uuid, from_value, state_dir)
+
+    if cp.load() and cp.last_ms is not None and cp.last_ms >= from_ms:
+        try:
+            ts = cp.update(vz, now_ms, timeout=timeout)
+            logging.debug("Wechselerkennung %s inkrementell ab %s", uuid, cp.last_ms)
+        except (requests.RequestException, ValueError) as e:
+            logging.warning("Inkrementelles Lesen fehlgeschlagen (%s): %s – Vollscan", uuid, e)
+            ts = cp.full_scan(vz, from_ms, now_ms, timeout=timeout)
+    else:
+        ts = cp.full_scan(vz, from_ms, now_ms, timeout=timeout)
+    return ts if ts is not None and ts >= from_ms else None
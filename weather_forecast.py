@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 """
-SRF Meteo 48h → Volkszähler (Vorschau, dann: Bereich löschen & neu schreiben)
+SRF Meteo 48h → Volkszähler (Vorschau, dann: Bereich mit Bestand abgleichen)
 + Zusatz: 24h-Mittel TTT_C → WP-Strom (kWh) & Heizwärmebedarf (kWh)
 + Zusatz: stündlicher COP (48h) aus TTT_C
 + Zusatz: stündliche max. Aufnahmeleistung der WP (48h) aus TTT_C
@@ -10,6 +10,10 @@ SRF Meteo 48h → Volkszähler (Vorschau, dann: Bereich löschen & neu schreiben
 
 NEU:
 - Startzeitpunkt für VZ-Datenabfragen ist lokale Zeit Europe/Zurich (DST-fest).
+- OAuth-Token wird in ~/.srg-meteo.token (chmod 600) bis kurz vor Ablauf
+  wiederverwendet und nur bei HTTP 401 neu angefordert.
+- Geolocation je (PLZ, Ort) aus ~/.cache/srf-meteo/geolocation.json (TTL
+  SRF_GEO_CACHE_TTL_DAYS, 0 = unbegrenzt): pro Lauf nur noch forecastpoint.
 - Skalierungen:
   • UUID_HP_MAX_POWER         (kW → W, ×1000)
   • UUID_HEAT_DEMAND_KWH      (kWh → Wh, ×1000)
@@ -34,9 +38,14 @@ NEU (dieser Auftrag):
 """
 
 import base64
+import hashlib
+import json
+import math
 import os
 import stat
 import sys
+import tempfile
+import time
 from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta, timezone, time as dtime
 
@@ -45,11 +54,24 @@ try:
 except Exception:
     ZoneInfo = None
 
+import numpy as np
 import requests
 
+import vz_client
+import vz_columns
+
 # ============================== CONFIG ========================================
-API_BASE = "https://api.srgssr.ch/srf-meteo/v2"
-OAUTH_TOKEN_URL = "https://api.srgssr.ch/oauth/v1/accesstoken?grant_type=client_credentials"
+API_BASE = os.environ.get("SRF_API_BASE", "https://api.srgssr.ch/srf-meteo/v2")
+OAUTH_TOKEN_URL = os.environ.get("SRF_OAUTH_URL", "https://api.srgssr.ch/oauth/v1/accesstoken?grant_type=client_credentials")
+
+# Token-Cache (chmod 600, neben ~/.srg-meteo.env): wiederverwenden bis kurz vor Ablauf, neu bei HTTP 401
+TOKEN_CACHE = os.path.expanduser(os.environ.get("SRF_TOKEN_CACHE", "~/.srg-meteo.token"))
+TOKEN_MARGIN_S = 300.0          # so lange vor Ablauf neu anfordern
+TOKEN_DEFAULT_TTL_S = 3600.0    # falls die Antwort kein expires_in enthält
+
+# Geolocation-Cache je (PLZ, Ort): lat/lon/id ändern sich nicht; TTL 0 = unbegrenzt
+GEO_CACHE = os.path.expanduser(os.environ.get("SRF_GEO_CACHE", "~/.cache/srf-meteo/geolocation.json"))
+GEO_CACHE_TTL_S = float(os.environ.get("SRF_GEO_CACHE_TTL_DAYS", "90")) * 86400.0
 
 ZIP = int(os.environ.get("SRF_ZIP", "5607"))
 PLACE_NAME = os.environ.get("SRF_PLACE", "Hägglingen")
@@ -120,10 +142,19 @@ HP_MAX_BOOST_FACTOR = 1.42
 # ===== NEU: Sonnenschein-Schwelle für PV-Prognose (W) =====
 PV_SUN_THRESHOLD_W = float(os.environ.get("PV_SUN_THRESHOLD_W", "500"))
 
+# ===== Abgleich mit Bestand: Änderungen unterhalb der Toleranz werden nicht neu geschrieben =====
+SYNC_TOL_T_C      = float(os.environ.get("SYNC_TOL_T_C",      "0.05"))  # °C
+SYNC_TOL_IRR_WM2  = float(os.environ.get("SYNC_TOL_IRR_WM2",  "1.0"))   # W/m²
+SYNC_TOL_COP      = float(os.environ.get("SYNC_TOL_COP",      "0.005"))
+SYNC_TOL_W        = float(os.environ.get("SYNC_TOL_W",        "1.0"))   # W (HP_MAX, OUT)
+
 # ============================== UTILS =========================================
 class ApiError(RuntimeError):
     pass
 
+class AuthError(ApiError):
+    """HTTP 401: Token abgelaufen oder widerrufen."""
+
 def _debug(msg: str) -> None:
     if os.environ.get("DEBUG"):
         print(f"[DEBUG] {msg}", file=sys.stderr)
@@ -172,7 +203,8 @@ def get_credentials() -> Tuple[str, str]:
     _debug(f"Creds: {mask(client_id)} / {mask(client_secret)}")
     return client_id, client_secret
 
-def get_access_token(client_id: str, client_secret: str) -> str:
+def _request_token(client_id: str, client_secret: str) -> Tuple[str, float]:
+    """Neues Token vom OAuth-Endpunkt: (access_token, Ablauf als time.time())."""
     auth_raw = f"{client_id}:{client_secret}".encode("utf-8")
     auth_b64 = base64.b64encode(auth_raw).decode("ascii")
     headers = {
@@ -181,12 +213,64 @@ def get_access_token(client_id: str, client_secret: str) -> str:
         "User-Agent": USER_AGENT,
         "Cache-Control": "no-cache",
     }
+    t0 = time.time()
     r = requests.post(OAUTH_TOKEN_URL, headers=headers, timeout=TIMEOUT, allow_redirects=True)
     if not r.ok:
         raise ApiError(f"Token-Request fehlgeschlagen: HTTP {r.status_code} – {r.text}")
-    token = (r.json().get("access_token") or "").strip()
+    body = r.json()
+    token = (body.get("access_token") or "").strip()
     if not token:
         raise ApiError(f"Kein gültiges access_token in Antwort: {r.text}")
+    try:
+        ttl = float(body.get("expires_in"))  # Apigee liefert die Sekunden als String
+    except (TypeError, ValueError):
+        ttl = TOKEN_DEFAULT_TTL_S
+    return token, t0 + ttl
+
+def _token_key(client_id: str) -> str:
+    # anderer Client oder Endpunkt (z.B. Replay) → Cache ungültig
+    return hashlib.sha256(f"{OAUTH_TOKEN_URL}|{client_id}".encode("utf-8")).hexdigest()[:16]
+
+def _load_cached_token(client_id: str) -> Optional[str]:
+    try:
+        st = os.stat(TOKEN_CACHE)
+        if stat.S_IMODE(st.st_mode) != 0o600 or st.st_uid != os.getuid():
+            _debug(f"Token-Cache {TOKEN_CACHE} ignoriert: erwartet chmod 600 und eigene UID")
+            return None
+        with open(TOKEN_CACHE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") != _token_key(client_id):
+            return None
+        if float(cached["expires_at"]) - TOKEN_MARGIN_S <= time.time():
+            return None
+        return str(cached["access_token"])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        _debug(f"Token-Cache unlesbar: {e}")
+        return None
+
+def _store_token(client_id: str, token: str, expires_at: float) -> None:
+    d = os.path.dirname(TOKEN_CACHE) or "."
+    try:
+        fd, tmp = tempfile.mkstemp(dir=d, prefix=".srg-meteo-token-")  # mkstemp legt mit 0600 an
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"key": _token_key(client_id), "access_token": token, "expires_at": expires_at}, f)
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, TOKEN_CACHE)
+    except OSError as e:
+        print(f"Warnung: Token-Cache nicht schreibbar ({TOKEN_CACHE}): {e}", file=sys.stderr)
+
+def get_token(client_id: str, client_secret: str, refresh: bool = False) -> str:
+    """Token aus dem Cache, sonst (oder mit refresh=True) neu anfordern und speichern."""
+    if not refresh:
+        token = _load_cached_token(client_id)
+        if token:
+            _debug("Token aus Cache")
+            return token
+    token, expires_at = _request_token(client_id, client_secret)
+    _store_token(client_id, token, expires_at)
+    _debug(f"Neues Token, gültig bis {datetime.fromtimestamp(expires_at).isoformat(timespec='seconds')}")
     return token
 
 def api_get(path: str, token: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
@@ -197,11 +281,62 @@ def api_get(path: str, token: str, params: Optional[Dict[str, Any]] = None) -> D
         "User-Agent": USER_AGENT,
     }
     r = requests.get(url, headers=headers, params=params or {}, timeout=TIMEOUT, allow_redirects=False)
+    if r.status_code == 401:
+        raise AuthError(f"GET {url}: HTTP 401 – {r.text}")
     if not r.ok:
         raise ApiError(f"GET {url} fehlgeschlagen: HTTP {r.status_code} – {r.text}")
     return r.json()
 
-def find_geolocation_by_zip_and_name(token: str, zip_code: int, name: str) -> Tuple[float, float, str]:
+def _geo_key(zip_code: int, name: str) -> str:
+    return f"{int(zip_code)}|{name.strip().lower()}"
+
+def _load_geo_cache() -> Dict[str, Any]:
+    try:
+        with open(GEO_CACHE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        _debug(f"Geolocation-Cache unlesbar: {e}")
+        return {}
+
+def _store_geo_cache(cache: Dict[str, Any]) -> None:
+    d = os.path.dirname(GEO_CACHE) or "."
+    try:
+        os.makedirs(d, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False, indent=1)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, GEO_CACHE)
+    except OSError as e:
+        print(f"Warnung: Geolocation-Cache nicht schreibbar ({GEO_CACHE}): {e}", file=sys.stderr)
+
+def find_geolocation_by_zip_and_name(token: str, zip_code: int, name: str,
+                                     use_cache: bool = True, refresh: bool = False) -> Tuple[float, float, str]:
+    """(lat, lon, geolocation_id) für PLZ und Ort; aus GEO_CACHE, sonst über /geolocationNames.
+
+    refresh=True fragt die API auch bei gültigem Cache-Eintrag und überschreibt ihn.
+    """
+    key = _geo_key(zip_code, name)
+    cache = _load_geo_cache() if use_cache else {}
+    hit = cache.get(key)
+    if isinstance(hit, dict) and not refresh:
+        try:
+            fresh = GEO_CACHE_TTL_S <= 0 or time.time() - float(hit["ts"]) < GEO_CACHE_TTL_S
+            if fresh:
+                _debug(f"Geolocation aus Cache: {hit['id']}")
+                return float(hit["lat"]), float(hit["lon"]), str(hit["id"])
+        except (KeyError, TypeError, ValueError):
+            pass
+    lat, lon, geolocation_id = _lookup_geolocation(token, zip_code, name)
+    if use_cache:
+        cache[key] = {"lat": lat, "lon": lon, "id": geolocation_id, "ts": time.time()}
+        _store_geo_cache(cache)
+    return lat, lon, geolocation_id
+
+def _lookup_geolocation(token: str, zip_code: int, name: str) -> Tuple[float, float, str]:
     res = api_get("/geolocationNames", token, params={"zip": zip_code, "limit": 20})
     items: List[Dict[str, Any]] = []
     if isinstance(res, list):
@@ -236,6 +371,20 @@ def get_hourly_forecast(token: str, geolocation_id: str) -> List[Dict[str, Any]]
         raise ApiError(f"Unerwartetes Forecast-Format: {res}")
     return hours
 
+def fetch_hours(token: str) -> List[Dict[str, Any]]:
+    _lat, _lon, geo_id = find_geolocation_by_zip_and_name(token, ZIP, PLACE_NAME)
+    try:
+        return get_hourly_forecast(token, geo_id)
+    except AuthError:
+        raise
+    except ApiError:
+        # gespeicherte Geolocation evtl. veraltet: einmal neu nachschlagen, Cache überschreiben
+        _lat, _lon, fresh_id = find_geolocation_by_zip_and_name(token, ZIP, PLACE_NAME, refresh=True)
+        if fresh_id == geo_id:
+            raise
+        _debug(f"Geolocation {geo_id} → {fresh_id}, Forecast wird erneut abgefragt")
+        return get_hourly_forecast(token, fresh_id)
+
 def parse_dt(dt_str: str) -> datetime:
     if dt_str.endswith("Z"):
         return datetime.fromisoformat(dt_str.replace("Z", "+00:00")).astimezone(timezone.utc)
@@ -268,42 +417,35 @@ def select_next_48h(hours: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return [r for (_, r) in rows]
 
 # -------------------------- Volkszähler I/O -----------------------------------
-def vz_delete_range(uuid: str, from_ts_ms: int, to_ts_ms: int) -> None:
-    url = f"{VZ_BASE_URL}/data/{uuid}.json"
-    params = {"operation": "delete", "from": str(from_ts_ms), "to": str(to_ts_ms)}
-    if DRY_RUN:
-        print(f"DRY_RUN: DELETE-Range GET {url} params={params}")
-        return
-    r = requests.get(url, params=params, timeout=TIMEOUT)
-    if not r.ok:
-        raise RuntimeError(f"Volkszähler-DELETE fehlgeschlagen ({uuid}): HTTP {r.status_code} – {r.text}")
+VZ = vz_client.VZClient(VZ_BASE_URL, timeout=TIMEOUT, user_agent=USER_AGENT)
 
 def vz_write(uuid: str, value: float, ts_ms: int) -> None:
-    url = f"{VZ_BASE_URL}/data/{uuid}.json"
-    params = {"operation": "add", "ts": str(ts_ms), "value": f"{float(value):.6f}"}
     if DRY_RUN:
-        print(f"DRY_RUN: POST {url} params={params}")
+        print(f"DRY_RUN: POST {uuid} ts={ts_ms} value={float(value):.6f}")
         return
-    r = requests.post(url, params=params, timeout=TIMEOUT)
-    if not r.ok:
-        raise RuntimeError(f"Volkszähler-POST fehlgeschlagen ({uuid}): HTTP {r.status_code} – {r.text}")
-
-def vz_get_tuples(uuid: str, from_ms: int, to_ms: int) -> List[Tuple[int, float, int]]:
-    url = f"{VZ_BASE_URL}/data/{uuid}.json"
-    params = {"from": str(from_ms), "to": str(to_ms)}
-    r = requests.get(url, params=params, timeout=TIMEOUT, headers={"User-Agent": USER_AGENT})
-    r.raise_for_status()
-    data = r.json().get("data", {})
-    tuples = data.get("tuples") or []
-    out: List[Tuple[int, float, int]] = []
-    for t in tuples:
-        try:
-            ts = int(t[0]); val = float(t[1]); qual = int(t[2]) if len(t) > 2 else 1
-            out.append((ts, val, qual))
-        except Exception:
-            continue
-    out.sort(key=lambda x: x[0])
-    return out
+    if not VZ.write_vals(uuid, f"{float(value):.6f}", ts_ms):
+        raise RuntimeError(f"Volkszähler-POST fehlgeschlagen ({uuid})")
+
+def vz_sync_series(uuid: str, points: List[Tuple[int, float]], from_ms: int, to_ms: int,
+                   tolerance: float = 1e-6) -> int:
+    """
+    Gleicht die Reihe im Fenster [from_ms, to_ms] mit dem Bestand ab: nur Zeitstempel,
+    deren Wert sich um mehr als 'tolerance' geändert hat, werden gelöscht/geschrieben.
+    Rückgabe: Anzahl Punkte im Fenster.
+    """
+    if DRY_RUN:
+        print(f"DRY_RUN: Sync {uuid} from={from_ms} to={to_ms} ({len(points)} Punkte)")
+        return 0
+    try:
+        res = VZ.sync_series(uuid, [(ts, round(float(v), 6)) for ts, v in points], from_ms, to_ms,
+                             tolerance=tolerance)
+    except IOError as e:
+        raise RuntimeError(f"Volkszähler-Sync fehlgeschlagen ({uuid}): {e}")
+    print(f"Sync {uuid}: {res.written} geschrieben, {res.deleted} gelöscht, {res.unchanged} unverändert")
+    return res.written + res.unchanged
+
+def vz_get_columns(uuid: str, from_ms: int, to_ms: int) -> vz_columns.Columns:
+    return vz_columns.get_columns(VZ, uuid, from_ms, to_ms)
 
 # ============================== FORMEL-FUNKTIONEN ==============================
 def wp_power_kwh_from_t(t_c: float) -> float:
@@ -377,54 +519,46 @@ def hp_power_during_sun_and_write(ts_grid: List[int], from_ms_localnow: int, to_
     print("\n===== OUT: HP_MAX_POWER nur bei Sonnenschein (PV_Prod > Schwelle), sonst 0 =====")
 
     # Inputs laden (alle in W)
-    pv_prod = vz_get_tuples(UUID_PV_PROD_FORECAST_IN, from_ms_localnow, to_ms)
-    hp_max  = vz_get_tuples(UUID_HP_MAX_POWER,        from_ms_localnow, to_ms)
+    pv_prod = vz_get_columns(UUID_PV_PROD_FORECAST_IN, from_ms_localnow, to_ms).at(ts_grid)
+    hp_max  = vz_get_columns(UUID_HP_MAX_POWER,        from_ms_localnow, to_ms).at(ts_grid)
 
-    pv_map = {ts: v for ts, v, _ in pv_prod}
-    hp_map = {ts: v for ts, v, _ in hp_max}
-
-    # Zielbereich löschen
-    print(f"Lösche Zielbereich {from_ms_localnow} … {to_ms} (UUID {UUID_PV_CAPPED_FORECAST_OUT})")
-    try:
-        vz_delete_range(UUID_PV_CAPPED_FORECAST_OUT, from_ms_localnow, to_ms)
-    except Exception as e:
-        print(f"Warnung: OUT DELETE fehlgeschlagen: {e}", file=sys.stderr)
+    # Sonnenschein-Maske vektorisiert; NaN = kein Wert zum Timestamp
+    sunny = (np.nan_to_num(pv_prod, nan=-np.inf) > PV_SUN_THRESHOLD_W) & np.isfinite(hp_max)
+    out = np.where(sunny, hp_max, 0.0)
 
     print("Zeit lokal | ts_ms | PV_Prod_W | HP_MAX_W | Schwelle | OUT_W")
-    written = 0
-    for ts in ts_grid:
+    points: List[Tuple[int, float]] = []
+    for ts, pv, hp, out_w in zip(ts_grid, pv_prod.tolist(), hp_max.tolist(), out.tolist()):
         dt_local = datetime.fromtimestamp(ts / 1000.0, tz=timezone.utc).astimezone(tz_loc)
         local_str = dt_local.strftime("%Y-%m-%d %H:%M %Z")
 
-        pv = pv_map.get(ts)
-        hp = hp_map.get(ts)
-
-        out_w = 0.0
-        if pv is not None and float(pv) > PV_SUN_THRESHOLD_W and hp is not None:
-            out_w = float(hp)
-        else:
-            out_w = 0.0
-
-        pv_str = "n/a" if pv is None else f"{float(pv):.1f}"
-        hp_str = "n/a" if hp is None else f"{float(hp):.1f}"
+        pv_str = "n/a" if math.isnan(pv) else f"{pv:.1f}"
+        hp_str = "n/a" if math.isnan(hp) else f"{hp:.1f}"
 
         print(f"{local_str} | {ts} | {pv_str} | {hp_str} | >{PV_SUN_THRESHOLD_W:.0f} | {out_w:.1f}")
+        points.append((ts, out_w))
 
-        try:
-            vz_write(UUID_PV_CAPPED_FORECAST_OUT, out_w, ts)
-            written += 1
-        except Exception as e:
-            print(f"Warnung: OUT Schreiben @ ts_ms={ts} fehlgeschlagen: {e}", file=sys.stderr)
+    # Zielbereich abgleichen (nur geänderte Stunden werden geschrieben)
+    try:
+        written = vz_sync_series(UUID_PV_CAPPED_FORECAST_OUT, points, from_ms_localnow, to_ms,
+                                 tolerance=SYNC_TOL_W)
+    except Exception as e:
+        print(f"Warnung: OUT-Sync fehlgeschlagen: {e}", file=sys.stderr)
+        written = 0
 
-    print(f"\nFertig – OUT geschrieben: {written}/{len(ts_grid)} Punkte → {UUID_PV_CAPPED_FORECAST_OUT} (W).")
+    print(f"\nFertig – OUT synchronisiert: {written}/{len(ts_grid)} Punkte → {UUID_PV_CAPPED_FORECAST_OUT} (W).")
 
 # ============================== MAIN ==========================================
 def main() -> int:
     try:
         client_id, client_secret = get_credentials()
-        token = get_access_token(client_id, client_secret)
-        _lat, _lon, geo_id = find_geolocation_by_zip_and_name(token, ZIP, PLACE_NAME)
-        hours = get_hourly_forecast(token, geo_id)
+        token = get_token(client_id, client_secret)
+        try:
+            hours = fetch_hours(token)
+        except AuthError:
+            # gespeichertes Token vorzeitig ungültig: einmal neu anfordern
+            _debug("HTTP 401 – Token wird neu angefordert")
+            hours = fetch_hours(get_token(client_id, client_secret, refresh=True))
         next48 = select_next_48h(hours)
         if not next48:
             print("Keine Forecastdaten für die nächsten 48 h gefunden.", file=sys.stderr)
@@ -474,25 +608,14 @@ def main() -> int:
         start_ts_ms = ts_grid[0]
         end_ts_ms   = ts_grid[-1]
 
-        # TTT_C / IRR in VZ schreiben
-        print(f"\nLösche vorhandene Daten in Volkszähler: {start_ts_ms} … {end_ts_ms} (TTT_C & IRR)")
-        vz_delete_range(UUID_T_OUTDOOR, start_ts_ms, end_ts_ms)
-        vz_delete_range(UUID_P_IRR,     start_ts_ms, end_ts_ms)
-
-        print(f"Schreibe {len(ts_grid)} Stunden (ab nächster voller Stunde, TZ={TZ}) nach Volkszähler…")
-        count_T = count_I = 0
-        for (_, ts_ms, t_val), (_, _, i_val) in zip(preview_T, preview_I):
-            if t_val is not None:
-                try:
-                    vz_write(UUID_T_OUTDOOR, float(t_val), ts_ms); count_T += 1
-                except Exception as e:
-                    print(f"Warnung: TTT_C @ ts_ms={ts_ms} nicht geschrieben: {e}", file=sys.stderr)
-            if i_val is not None:
-                try:
-                    vz_write(UUID_P_IRR, float(i_val), ts_ms); count_I += 1
-                except Exception as e:
-                    print(f"Warnung: IRRADIANCE_WM2 @ ts_ms={ts_ms} nicht geschrieben: {e}", file=sys.stderr)
-        print(f"\nFertig – geschrieben: T_outdoor_forecast={count_T}, P_IRR_forecast={count_I}.")
+        # TTT_C / IRR in VZ abgleichen
+        print(f"\nGleiche {len(ts_grid)} Stunden (ab nächster voller Stunde, TZ={TZ}) mit Volkszähler ab: "
+              f"{start_ts_ms} … {end_ts_ms} (TTT_C & IRR)")
+        count_T = vz_sync_series(UUID_T_OUTDOOR, [(ts_ms, v) for (_, ts_ms, v) in preview_T if v is not None],
+                                 start_ts_ms, end_ts_ms, tolerance=SYNC_TOL_T_C)
+        count_I = vz_sync_series(UUID_P_IRR,     [(ts_ms, v) for (_, ts_ms, v) in preview_I if v is not None],
+                                 start_ts_ms, end_ts_ms, tolerance=SYNC_TOL_IRR_WM2)
+        print(f"\nFertig – synchronisiert: T_outdoor_forecast={count_T}, P_IRR_forecast={count_I}.")
         if DRY_RUN:
             print("(DRY_RUN aktiv – es wurde nichts in die DB geschrieben.)")
 
@@ -527,37 +650,28 @@ def main() -> int:
 
         # COP (48h) – dimensionslos
         print("\n===== COP-Forecast (stündlich, nächste 48h) =====")
-        print(f"Lösche COP-Bereich: {start_ts_ms} … {end_ts_ms} (UUID {UUID_COP_FORECAST})")
-        try:
-            vz_delete_range(UUID_COP_FORECAST, start_ts_ms, end_ts_ms)
-        except Exception as e:
-            print(f"Warnung: COP-DELETE fehlgeschlagen: {e}", file=sys.stderr)
-
-        count_COP = 0
+        cop_points: List[Tuple[int, float]] = []
         for (local_str, ts_ms, t_val) in preview_T:
             if t_val is None:
                 print(f"{local_str} | ts_ms={ts_ms} | COP=n/a (kein T)")
                 continue
             cop = cop_from_t(t_val)
             print(f"{local_str} | ts_ms={ts_ms} | COP={cop:.3f}")
-            try:
-                vz_write(UUID_COP_FORECAST, float(cop), ts_ms); count_COP += 1
-            except Exception as e:
-                print(f"Warnung: COP @ ts_ms={ts_ms} nicht geschrieben: {e}", file=sys.stderr)
-        print(f"\nFertig – COP geschrieben: {count_COP}/{len(preview_T)} Punkte.")
-
-        # WP max Aufnahmeleistung (48h) – kW → schreiben als W
-        print("\n===== Max. Aufnahmeleistung WP – stündlich, nächste 48h =====")
-        print(f"Lösche Bereich: {start_ts_ms} … {end_ts_ms} (UUID {UUID_HP_MAX_POWER})")
+            cop_points.append((ts_ms, cop))
         try:
-            vz_delete_range(UUID_HP_MAX_POWER, start_ts_ms, end_ts_ms)
+            count_COP = vz_sync_series(UUID_COP_FORECAST, cop_points, start_ts_ms, end_ts_ms,
+                                       tolerance=SYNC_TOL_COP)
         except Exception as e:
-            print(f"Warnung: HP_MAX-DELETE fehlgeschlagen: {e}", file=sys.stderr)
+            print(f"Warnung: COP-Sync fehlgeschlagen: {e}", file=sys.stderr)
+            count_COP = 0
+        print(f"\nFertig – COP synchronisiert: {count_COP}/{len(preview_T)} Punkte.")
 
+        # WP max Aufnahmeleistung (48h) – kW → schreiben als W
+        print("\n===== Max. Aufnahmeleistung WP – stündlich, nächste 48h =====")
         print(f"Regeln: Boost {HP_MAX_BOOST_START}–{HP_MAX_BOOST_END} (lokal) ×{HP_MAX_BOOST_FACTOR:.2f}; "
               f"Clamp [{HP_MAX_POWER_W_MIN:.0f}..{HP_MAX_POWER_W_MAX:.0f}] W")
 
-        count_HP_MAX = 0
+        hp_max_points: List[Tuple[int, float]] = []
         for (local_str, ts_ms, t_val) in preview_T:
             if t_val is None:
                 print(f"{local_str} | ts_ms={ts_ms} | Pmax=n/a (kein T)")
@@ -579,13 +693,15 @@ def main() -> int:
                 f"Pscaled={pmax_w_scaled:.1f} W | write={pmax_w_clamped:.1f} W"
             )
 
-            try:
-                vz_write(UUID_HP_MAX_POWER, float(pmax_w_clamped), ts_ms)
-                count_HP_MAX += 1
-            except Exception as e:
-                print(f"Warnung: Pmax @ ts_ms={ts_ms} nicht geschrieben: {e}", file=sys.stderr)
+            hp_max_points.append((ts_ms, pmax_w_clamped))
 
-        print(f"\nFertig – Pmax geschrieben: {count_HP_MAX}/{len(preview_T)} Punkte (W).")
+        try:
+            count_HP_MAX = vz_sync_series(UUID_HP_MAX_POWER, hp_max_points, start_ts_ms, end_ts_ms,
+                                          tolerance=SYNC_TOL_W)
+        except Exception as e:
+            print(f"Warnung: HP_MAX-Sync fehlgeschlagen: {e}", file=sys.stderr)
+            count_HP_MAX = 0
+        print(f"\nFertig – Pmax synchronisiert: {count_HP_MAX}/{len(preview_T)} Punkte (W).")
 
         # OUT: Startzeitpunkt der Abfrage = lokale Jetztzeit (DST-fest)
         from_ms_localnow = local_now_ms_utc()
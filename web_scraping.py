@@ -1,14 +1,9 @@
 import requests
 from bs4 import BeautifulSoup
+from vz_client import get_vals, write_vals
 
 
 
-#######################################################################################################
-# Format URLs
-VZ_GET_URL = "http://192.168.178.49/middleware.php/data/{}.json?from={}"
-VZ_POST_URL = "http://192.168.178.49/middleware.php/data/{}.json?operation=add&value={}"
-########################################################################################################
-
 # UUID Gruppe: 77194160-7b62-11ec-8dce-47993bd55908
 # Lokale IP-Adresse der Wärmepumpe (bitte anpassen)
 url = "http://192.168.178.36/?s=1,1"  
@@ -30,18 +25,6 @@ UUID = {
 #    "ISTDREHZAHL VERDICHTER": "uuid-5",
 #    "SOLLDREHZAHL VERDICHTER": "uuid-6",
 
-def get_vals(uuid, duration="-0min"):
-    # Daten von vz lesen. 
-    req = requests.get(VZ_GET_URL.format(uuid, duration))
-    return req.json()
-
-def write_vals(uuid, value):
-    # Daten auf vz schreiben.
-    poststring = VZ_POST_URL.format(uuid, value)
-    #logging.info("Poststring {}".format(poststring))
-    postreq = requests.post(poststring)
-    #logging.info("Ok? {}".format(postreq.ok))
-
 # Schlüsselwörter und ihre Einheiten
 werte_schluessel = {
     "VERDAMPFERTEMPERATUR": "°C",